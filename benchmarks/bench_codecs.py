@@ -0,0 +1,74 @@
+"""
+Микробенчмарк кодеков: ns на сообщение для encode/decode и размер на проводе.
+Сравнение с pickle, которым пакеты кодировались раньше.
+
+    python -m benchmarks.bench_codecs [-n 100000]
+
+"""
+import argparse
+import pickle
+from timeit import Timer
+
+from common.codecs import CODECS
+from common.codes import ANSWER, BASIC, OK
+from common.package import Request, Response
+from common.request_body import Msg, User
+from common.variables import RequestAction
+
+
+class PickleCodec:
+    """ Только для сравнения - на проводе pickle больше не используется """
+    name = 'pickle'
+
+    encode = staticmethod(pickle.dumps)
+    decode = staticmethod(pickle.loads)
+
+
+def sample_packages():
+    msg = Msg('@bob how are you doing today?', User('alice'))
+    msg.parse_msg()
+    return {
+        'presence': Request(RequestAction.PRESENCE, User('alice')).get_dict(),
+        'message': Request(RequestAction.MESSAGE, msg).get_dict(),
+        'ok': Response(OK).get_dict(),
+        'broadcast': Response(BASIC, str(msg)).get_dict(),
+        'answer': Response(ANSWER, [f'user{i}' for i in range(20)]).get_dict(),
+    }
+
+
+def measure(func, arg, number):
+    timer = Timer(lambda: func(arg))
+    return min(timer.repeat(repeat=3, number=number)) / number * 1e9
+
+
+def run(number):
+    codecs = [PickleCodec()] + list(CODECS.values())
+    rows = []
+    for pkg_name, package in sample_packages().items():
+        for codec in codecs:
+            payload = codec.encode(package)
+            rows.append((
+                pkg_name,
+                codec.name,
+                measure(codec.encode, package, number),
+                measure(codec.decode, payload, number),
+                len(payload),
+            ))
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=100000, help='Iterations per measurement')
+    return parser
+
+
+def main():
+    args = parse_args().parse_args()
+    print(f'{"package":<10} {"codec":<8} {"encode ns":>10} {"decode ns":>10} {"bytes":>6}')
+    for pkg_name, codec_name, enc, dec, size in run(args.number):
+        print(f'{pkg_name:<10} {codec_name:<8} {enc:>10.0f} {dec:>10.0f} {size:>6}')
+
+
+if __name__ == "__main__":
+    main()
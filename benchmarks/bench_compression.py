@@ -0,0 +1,164 @@
+"""
+Сжатие кадров: трафик в байтах и цена в процессорном времени, binary против zbinary.
+
+Трафик синтетический, но по форме как у сервера: запросы MESSAGE (личные, в комнату, всем),
+пересылаемые сообщения, уведомления о подключениях и комнатах, ответы DELIVERED.
+Словарь обучается на одной выборке (--seed 1), измеряется на другой. Обучающая выборка
+собрана из сотни "чатов" со своими словами, именами и комнатами: общего у них только протокол,
+поэтому словарь zlib учит форму пакетов, а не текст конкретной переписки.
+
+    python -m benchmarks.bench_compression [-n 20000] [--fanout 100]
+    python -m benchmarks.bench_compression --train  # новый DICTIONARY для common/zdict.py
+
+"""
+import argparse
+import random
+import time
+import zlib
+
+from common.codecs import BinaryCodec, ZLIB_LEVEL, ZLIB_MEM_LEVEL, ZLIB_WBITS, decode_message, encode_message, get_codec
+from common.codes import BASIC, DELIVERED, QUEUED
+from common.package import Request, Response
+from common.request_body import Msg, MsgRoom, User
+from common.variables import COMPRESS_THRESHOLD, RequestAction
+from common.zdict import DICTIONARY, ZDICT_SIZE, train
+
+LETTERS = 'etaoinshrdlcumwfgypbvk'
+
+
+def word(rnd):
+    return ''.join(rnd.choice(LETTERS) for _ in range(rnd.randint(1, 9)))
+
+
+def traffic(seed, number):
+    """ Словари пакетов в пропорциях типичного обмена """
+    rnd = random.Random(seed)
+    vocabulary = [word(rnd) for _ in range(2000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]  # закон Ципфа
+    names = [word(rnd) + str(rnd.randrange(100)) for _ in range(200)]
+    rooms = ['#' + word(rnd) for _ in range(10)]
+
+    def sentence():
+        return ' '.join(rnd.choices(vocabulary, weights, k=int(rnd.expovariate(1 / 8)) + 1))
+
+    packages = []
+    now = time.time()
+    while len(packages) < number:
+        sender, target = rnd.sample(names, 2)
+        kind = rnd.random()
+        if kind < 0.8:
+            text = rnd.choice((f'@{target} ', rnd.choice(rooms) + ' ', '')) + sentence()
+            msg = MsgRoom(text, User(sender)) if text.startswith('#') else Msg(text, User(sender))
+            msg.parse_msg()
+            packages.append(Request(RequestAction.MESSAGE, msg).get_dict())
+            packages.append(Response(BASIC, str(msg)).get_dict())
+            if not text.startswith('#'):
+                packages.append(Response(rnd.choice((DELIVERED, DELIVERED, DELIVERED, QUEUED))).get_dict())
+        elif kind < 0.9:
+            packages.append(Response(BASIC, f'{sender} {rnd.choice(("connected", "disconnected"))}').get_dict())
+        else:
+            room = rnd.choice(rooms)
+            packages.append(Request(RequestAction.JOIN, room).get_dict())
+            packages.append(Response(BASIC, f'{sender} JOINED to chat - {room}!').get_dict())
+    for package in packages:  # отправленные в течение года, а не за время генерации
+        package['time'] = now + rnd.uniform(0, 365 * 24 * 60 * 60)
+    return packages[:number]
+
+
+def samples(seed, number, chats=1):
+    """ Полезная нагрузка бинарного кодека - то, что сжимает zbinary """
+    codec = BinaryCodec()
+    size = number // chats
+    return [codec.encode(package) for chat in range(chats) for package in traffic(seed * chats + chat, size)]
+
+
+def render(dictionary):
+    """ Литерал для common/zdict.py """
+    lines = ['DICTIONARY = (']
+    for i in range(0, len(dictionary), 64):
+        lines.append(f'    {dictionary[i:i + 64]!r}')
+    lines.append(')')
+    return '\n'.join(lines)
+
+
+def measure(payloads, threshold, zdict, repeat=3):
+    """ (байт после сжатия, мкс на кодирование, мкс на декодирование) """
+    base = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, ZLIB_WBITS, ZLIB_MEM_LEVEL, **({'zdict': zdict} if zdict else {}))
+    out = []
+    best = float('inf')
+    for _ in range(repeat):
+        out = []
+        start = time.perf_counter()
+        for payload in payloads:
+            if len(payload) >= threshold:
+                compressor = base.copy()
+                data = compressor.compress(payload) + compressor.flush()
+                out.append(data if len(data) < len(payload) else payload)
+            else:
+                out.append(payload)
+        best = min(best, time.perf_counter() - start)
+    start = time.perf_counter()
+    for data, payload in zip(out, payloads):
+        if data is not payload:
+            decompressor = zlib.decompressobj(ZLIB_WBITS, **({'zdict': zdict} if zdict else {}))
+            decompressor.decompress(data)
+    decode = time.perf_counter() - start
+    size = sum(len(data) + 1 for data in out)  # + байт флага
+    return size, best / len(payloads) * 1e6, decode / len(payloads) * 1e6
+
+
+def codec_cost(packages, name, repeat=3):
+    """ Полное кодирование / декодирование пакета, мкс """
+    codec = get_codec(name)
+    encode = decode = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        frames = [encode_message(package, codec) for package in packages]
+        encode = min(encode, time.perf_counter() - start)
+        start = time.perf_counter()
+        for frame in frames:
+            decode_message(frame)
+        decode = min(decode, time.perf_counter() - start)
+    return sum(map(len, frames)), encode / len(packages) * 1e6, decode / len(packages) * 1e6
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=20000, help='Packages in the measured sample')
+    parser.add_argument("--fanout", type=int, default=100, help='Recipients of one broadcast')
+    parser.add_argument("--train", action='store_true', help='Print a new DICTIONARY trained on --seed traffic')
+    parser.add_argument("--seed", type=int, default=1, help='Training traffic seed')
+    parser.add_argument("--size", type=int, default=ZDICT_SIZE, help='Dictionary size')
+    return parser
+
+
+def main():
+    args = parse_args().parse_args()
+    if args.train:
+        print(render(train(samples(args.seed, args.number, chats=100), args.size)))
+        return
+    payloads = samples(args.seed + 1000, args.number)
+    raw = sum(len(p) + 1 for p in payloads)
+    print(f'{len(payloads)} payloads, {raw:,} bytes uncompressed, dictionary {len(DICTIONARY)} bytes')
+    print(f'{"dictionary":>10} {"threshold":>9} {"bytes":>10} {"saved":>6} {"encode us":>9} {"decode us":>9}')
+    for zdict, label in ((None, 'none'), (DICTIONARY, 'trained')):
+        for threshold in (0, 32, COMPRESS_THRESHOLD, 128, 256):
+            size, encode, decode = measure(payloads, threshold, zdict)
+            print(f'{label:>10} {threshold:>9} {size:>10,} {1 - size / raw:>6.1%} {encode:>9.2f} {decode:>9.2f}')
+
+    packages = traffic(args.seed + 1000, args.number)
+    print('\nfull codec per package (threshold %d):' % COMPRESS_THRESHOLD)
+    base = None
+    for name in ('binary', 'zbinary'):
+        size, encode, decode = codec_cost(packages, name)
+        base = base or (size, encode)
+        print(f'{name:>8}: {size:>10,} bytes, encode {encode:.2f} us, decode {decode:.2f} us')
+    saved = base[0] - size
+    extra = encode - base[1]
+    print(f'zbinary: -{saved / len(packages):.1f} bytes and +{extra:.2f} us CPU per package on encode; '
+          f'broadcast to {args.fanout}: -{saved / len(packages) * args.fanout:.0f} bytes for the same +{extra:.2f} us '
+          f'(one frame for all recipients)')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+История сообщений: стоимость append() в цикле сервера, пропускная способность group commit
+и задержка запроса history.
+
+    python -m benchmarks.bench_history [-n 200000] [--rooms 100]
+
+Сквозное сравнение под нагрузкой - loadgen против сервера с историей и без:
+
+    python -m benchmarks.loadgen --spawn -c 500 -r 5000
+    python -m src.server --history /tmp/history & python -m benchmarks.loadgen -c 500 -r 5000
+
+"""
+import argparse
+import tempfile
+import time
+
+from benchmarks.harness import percentile
+from src.history import History
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=200000, help='Messages to append')
+    parser.add_argument("--rooms", type=int, default=100, help='Distinct history keys')
+    parser.add_argument("--queries", type=int, default=1000, help='history queries to time')
+    return parser
+
+
+def main():
+    args = parse_args().parse_args()
+    text = 'alice to #room: ' + 'x' * 64
+    with tempfile.TemporaryDirectory() as path:
+        history = History(path)
+        keys = [f'#room{i}' for i in range(args.rooms)]
+
+        start = time.perf_counter()
+        for i in range(args.number):
+            history.append(keys[i % args.rooms], text)
+        appended = time.perf_counter() - start
+        history.flush()
+        committed = time.perf_counter() - start
+        print(f'append      {appended / args.number * 1e9:8.0f} ns/msg (server loop cost)')
+        print(f'committed   {args.number / committed:8.0f} msg/s  ({committed:.3f}s incl. fdatasync)')
+
+        latencies = []
+        for i in range(args.queries):
+            start = time.perf_counter()
+            history.query(keys[i % args.rooms], 50)
+            latencies.append((time.perf_counter() - start) * 1e6)
+        print(f'query(50)   p50={percentile(latencies, 0.5):7.1f}us p99={percentile(latencies, 0.99):7.1f}us')
+
+        history.close()
+        start = time.perf_counter()
+        History(path).close()
+        print(f'recover     {(time.perf_counter() - start) * 1000:8.1f} ms for {args.number} records')
+
+
+if __name__ == "__main__":
+    main()
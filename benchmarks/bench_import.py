@@ -0,0 +1,60 @@
+"""
+Время импорта src.server и src.client по python -X importtime: с проверкой байт-кода метаклассами
+(CHAT_VERIFY=1) и без неё, плюс самые дорогие модули по собственному времени.
+Импорт - часть запуска каждого рабочего процесса и каждого короткоживущего бота.
+
+    python -m benchmarks.bench_import [-n 5] [--top 10]
+
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+MODULES = ('src.server', 'src.client')
+
+
+def importtime(module, verify):
+    """ {модуль: (собственное время, с вложенными), мкс} одного запуска интерпретатора """
+    env = dict(os.environ, CHAT_VERIFY=verify)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)  # без .pyc замер показывал бы компиляцию исходников
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, total, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own), int(total))
+    return times
+
+
+def best(module, verify, number):
+    """ Лучший из number запусков: (собственное время, с вложенными), мкс, и разбивка этого запуска """
+    importtime(module, verify)  # прогрев: записать актуальные .pyc
+    runs = [importtime(module, verify) for _ in range(number)]
+    fastest = min(runs, key=lambda times: times[module][1])
+    return fastest[module], fastest
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=5, help='Interpreter runs per variant, best is reported')
+    parser.add_argument("--top", type=int, default=10, help='Heaviest imports to list')
+    return parser
+
+
+def main():
+    args = parse_args().parse_args()
+    print(f'{"module":>12} {"verify":>6} {"self ms":>8} {"total ms":>9}')
+    for module in MODULES:
+        for verify in ('1', '0'):
+            (own, total), times = best(module, verify, args.number)
+            print(f'{module:>12} {verify:>6} {own / 1000:>8.2f} {total / 1000:>9.2f}')
+        print(f'  heaviest imports of {module} (self ms):')
+        for name, (own, total) in sorted(times.items(), key=lambda item: -item[1][0])[:args.top]:
+            print(f'    {own / 1000:>7.2f}  {name}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Пропускная способность пересылки в зависимости от настроек лога сервера.
+Сценарий тот же, что в bench_pipeline: отправитель конвейером шлёт сообщения в комнату.
+
+    python -m benchmarks.bench_logging [-e select|asyncio] [-n 5000] [--receivers 20]
+
+DEBUG пишет каждый запрос; "sync" - запись в файл в потоке сервера (как до фонового логирования),
+"rate" - лимит записей в секунду (--log-rate), 0 - без ограничения.
+
+"""
+import argparse
+
+from benchmarks.bench_pipeline import relay
+from benchmarks.harness import spawn_server
+
+SCENARIOS = (
+    ('off (ERROR)', ('--log-level', 'ERROR')),
+    ('INFO, queue', ()),
+    ('DEBUG, sync, rate 0', ('--log-level', 'DEBUG', '--log-sync', '--log-rate', '0')),
+    ('DEBUG, queue, rate 0', ('--log-level', 'DEBUG', '--log-rate', '0')),
+    ('DEBUG, queue, json, rate 0', ('--log-level', 'DEBUG', '--log-json', '--log-rate', '0')),
+    ('DEBUG, queue, rate 1000/s', ('--log-level', 'DEBUG')),
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-e", "--engine", type=str, default='select', choices=('select', 'asyncio'))
+    parser.add_argument("-n", "--number", type=int, default=5000, help='Messages to send')
+    parser.add_argument("--receivers", type=int, default=20, help='Room members besides the sender')
+    parser.add_argument("--batch", type=int, default=100, help='Messages per sendall of the sender')
+    return parser
+
+
+def main():
+    args = parse_args().parse_args()
+    for title, server_args in SCENARIOS:
+        with spawn_server(None, args.engine, *server_args) as port:
+            elapsed = relay(port, args.number, args.receivers, args.batch)
+        print(f'{title:<28} {args.number / elapsed:9,.0f} msg/s  {args.number * args.receivers / elapsed:11,.0f} deliveries/s')
+
+
+if __name__ == "__main__":
+    main()
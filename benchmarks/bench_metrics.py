@@ -0,0 +1,80 @@
+"""
+Стоимость записи метрик на горячем пути сервера.
+
+    python -m benchmarks.bench_metrics [-n 1000000]
+
+"""
+import argparse
+import time
+from time import perf_counter_ns
+
+from src.metrics import ServerMetrics
+
+
+def measure(title, func, number):
+    start = time.perf_counter()
+    func(number)
+    elapsed = time.perf_counter() - start
+    print(f'{title:<34} {elapsed / number * 1e9:7.1f} ns/op')
+
+
+def empty(number):
+    for _ in range(number):
+        pass
+
+
+def counter_inc(metrics):
+    def run(number):
+        inc = metrics.connections.inc
+        for _ in range(number):
+            inc()
+    return run
+
+
+def labeled_inc(metrics):
+    def run(number):
+        inc = metrics.requests.inc
+        for _ in range(number):
+            inc('msg')
+    return run
+
+
+def histogram_record(metrics):
+    def run(number):
+        record = metrics.route.record
+        for i in range(number):
+            record(i & 0xFFFFF)
+    return run
+
+
+def timed_section(metrics):
+    """ Как в цикле сервера: два perf_counter_ns и запись в гистограмму """
+    def run(number):
+        record = metrics.decode.record
+        for _ in range(number):
+            start = perf_counter_ns()
+            record(perf_counter_ns() - start)
+    return run
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=1000000, help='Operations per measurement')
+    return parser
+
+
+def main():
+    args = parse_args().parse_args()
+    metrics = ServerMetrics()
+    measure('empty loop (baseline)', empty, args.number)
+    measure('counter.inc()', counter_inc(metrics), args.number)
+    measure('counter.inc(label)', labeled_inc(metrics), args.number)
+    measure('histogram.record()', histogram_record(metrics), args.number)
+    measure('perf_counter_ns x2 + record()', timed_section(metrics), args.number)
+    start = time.perf_counter()
+    text = metrics.render()
+    print(f'render: {(time.perf_counter() - start) * 1e6:.0f} us, {len(text)} bytes')
+
+
+if __name__ == "__main__":
+    main()
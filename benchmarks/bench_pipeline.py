@@ -0,0 +1,87 @@
+"""
+Пропускная способность при конвейерной отправке: отправитель шлёт сообщения в комнату пачками,
+не дожидаясь ответов, участники комнаты считают доставленное.
+Сервер разбирает все кадры из одного recv и отправляет накопленное каждому сокету одним sendmsg,
+поэтому число системных вызовов на сообщение падает с ростом пачки.
+
+    python -m benchmarks.bench_pipeline [-e select|asyncio] [-n 20000] [--receivers 20] [--batch 100]
+
+Число системных вызовов сервера можно посмотреть так:
+    strace -c -f -e trace=sendto,sendmsg,recvfrom,epoll_wait python -m src.server ...
+
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.harness import BenchClient, spawn_server
+from common.codecs import encode_message
+from common.package import Request
+from common.request_body import MsgRoom, User
+from common.utils import pack_frame
+from common.variables import RequestAction
+
+
+def receiver(client, number, done):
+    for _ in range(number):
+        client.recv()
+    done.append(time.perf_counter())
+    client.close()
+
+
+def relay(port, number, receivers, batch):
+    """ Время доставки number сообщений в комнату всем receivers участникам, с """
+    sender = BenchClient(port, 'sender')
+    sender.message('#bench create')
+    for _ in range(3):
+        sender.recv()
+    members = []
+    for i in range(receivers):
+        member = BenchClient(port, f'member{i}')
+        member.send(Request(RequestAction.JOIN, '#bench'))
+        members.append(member)
+    time.sleep(0.5)
+    for member in members:  # уведомления о подключениях и входе в комнату
+        member.sock.settimeout(0.2)
+        try:
+            while True:
+                member.recv()
+        except OSError:
+            pass
+        member.sock.settimeout(None)
+
+    msg = MsgRoom('#bench ' + 'x' * 64, User('sender'))
+    msg.parse_msg()
+    frame = pack_frame(encode_message(Request(RequestAction.MESSAGE, msg).get_dict(), sender.codec))
+    done = []
+    threads = [threading.Thread(target=receiver, args=(m, number, done)) for m in members]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    for i in range(0, number, batch):
+        sender.sock.sendall(frame * min(batch, number - i))
+    for thread in threads:
+        thread.join()
+    sender.close()
+    return max(done) - start
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-e", "--engine", type=str, default='select', choices=('select', 'asyncio'))
+    parser.add_argument("-n", "--number", type=int, default=20000, help='Messages to send')
+    parser.add_argument("--receivers", type=int, default=20, help='Room members besides the sender')
+    parser.add_argument("--batch", type=int, default=100, help='Messages per sendall of the sender')
+    return parser
+
+
+def main():
+    args = parse_args().parse_args()
+    with spawn_server(engine=args.engine) as port:
+        elapsed = relay(port, args.number, args.receivers, args.batch)
+    print(f'{args.engine}: {args.number} msgs x {args.receivers} receivers in {elapsed:.3f}s | '
+          f'{args.number / elapsed:,.0f} msg/s in, {args.number * args.receivers / elapsed:,.0f} deliveries/s')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Стоимость пересылки одного сообщения внутри сервера, без сети: разбор кадра отправителя,
+маршрутизация, кодирование пересылаемого пакета и постановка в очереди получателей.
+Память - по tracemalloc: пик выделений сверх уже занятого на одно сообщение (reset_peak перед каждым).
+
+    python -m benchmarks.bench_relay [-n 20000] [--members 100] [--codec binary]
+
+"""
+import argparse
+import selectors
+import socket
+import time
+import tracemalloc
+
+from common.codecs import encode_message, get_codec
+from common.package import Request
+from common.request_body import Msg, MsgRoom, User
+from common.variables import RequestAction
+from src.connection import SocketClient
+from src.server import Server
+
+
+class Tick:
+    """
+    Клиенты select-сервера в режиме такта: send() только ставит кадр в очередь (dirty),
+    очереди живут до конца такта - их содержимое входит в пик памяти сообщения.
+    Вместо flush() в конце такта очереди просто очищаются.
+
+    """
+    __slots__ = ('selector', 'dirty', 'pairs')
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.dirty = set()
+        self.pairs = []
+
+    def client(self, name):
+        sock, peer = socket.socketpair()
+        self.pairs.append((sock, peer))
+        return SocketClient(sock, name, self.selector, policy=None, dirty=self.dirty)
+
+    def end(self):
+        """ Как Server.__flush: pop() не сжимает таблицу множества, следующий такт её переиспользует """
+        dirty = self.dirty
+        while dirty:
+            client = dirty.pop()
+            client.out.clear()
+            client.out_bytes = 0
+
+
+def payload(request, codec):
+    return encode_message(request.get_dict(), codec)
+
+
+def connect(server, tick, name, codec):
+    session = server._Server__open_session(tick.client(name))
+    server._Server__send_responses(
+        server._Server__read_requests(session, [payload(Request(RequestAction.PRESENCE, User(name)), codec)]))
+    return session
+
+
+def message(text, sender, codec):
+    msg = MsgRoom(text, User(sender)) if text.startswith('#') else Msg(text, User(sender))
+    msg.parse_msg()
+    return payload(Request(RequestAction.MESSAGE, msg), codec)
+
+
+def relay(server, session, frame):
+    """ Один такт: чтение кадра отправителя, маршрутизация, кадры в очередях получателей """
+    server._Server__send_responses(server._Server__read_requests(session, [frame]))
+
+
+def measure(server, tick, session, frame, number):
+    """ (мкс на сообщение, пик выделенных байт на сообщение) """
+    for _ in range(100):
+        relay(server, session, frame)
+        tick.end()
+    elapsed = 0
+    for _ in range(number):
+        start = time.perf_counter_ns()
+        relay(server, session, frame)
+        elapsed += time.perf_counter_ns() - start
+        tick.end()
+
+    tracemalloc.start()
+    peaks = 0
+    sample = min(number, 2000)
+    for _ in range(sample):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        relay(server, session, frame)
+        peaks += tracemalloc.get_traced_memory()[1] - before
+        tick.end()
+    tracemalloc.stop()
+    return elapsed / number / 1000, peaks / sample
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=20000, help='Messages per scenario')
+    parser.add_argument("--members", type=int, default=100, help='Room members and users for ALL')
+    parser.add_argument("--codec", type=str, default='binary', help='Codec of all clients')
+    return parser
+
+
+def main():
+    args = parse_args().parse_args()
+    codec = get_codec(args.codec)
+    server = Server('127.0.0.1', 7777, rate_limits=None, idle_timeout=0, resume_grace=0)
+    tick = Tick()
+    alice = connect(server, tick, 'alice', codec)
+    connect(server, tick, 'bob', codec)
+    members = [connect(server, tick, f'member{i}', codec) for i in range(args.members - 2)]
+    relay(server, alice, message('#bench create', 'alice', codec))
+    for member in members:
+        relay(server, member, payload(Request(RequestAction.JOIN, '#bench'), codec))
+    tick.end()
+
+    scenarios = (
+        ('direct', message('@bob how are you doing today?', 'alice', codec)),
+        (f'room x{args.members - 2}', message('#bench how are you doing today?', 'alice', codec)),
+        (f'all x{args.members - 1}', message('how are you doing today?', 'alice', codec)),
+    )
+    print(f'codec {codec.name}, {args.number} messages per scenario')
+    print(f'{"scenario":>12} {"us/msg":>8} {"peak B/msg":>11}')
+    for title, frame in scenarios:
+        elapsed, peak = measure(server, tick, alice, frame, args.number)
+        print(f'{title:>12} {elapsed:>8.2f} {peak:>11.0f}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Регрессия: задержка личных сообщений между двумя клиентами,
+пока третий клиент непрерывно создаёт комнаты.
+Раньше создание комнаты останавливало сервер на 1 с (два sleep(0.5)).
+
+    python -m benchmarks.bench_room_create [-e select|asyncio] [-n 200]
+
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.harness import BenchClient, percentile, spawn_server
+
+
+def creator(port, stop, created):
+    client = BenchClient(port, 'creator')
+    i = 0
+    while not stop.is_set():
+        client.message(f'#bench{i} hello')
+        for _ in range(3):  # NOT_FOUND, created, now you can send
+            client.recv()
+        i += 1
+    created.append(i)
+    client.close()
+
+
+def measure(port, number):
+    sender, receiver = BenchClient(port, 'sender'), BenchClient(port, 'receiver')
+    sender.recv()  # receiver connected
+    latencies = []
+    for _ in range(number):
+        start = time.perf_counter()
+        sender.message('@receiver ping')
+        receiver.recv()
+        latencies.append((time.perf_counter() - start) * 1000)
+    sender.close()
+    receiver.close()
+    return latencies
+
+
+def report(title, latencies):
+    print(f'{title:<22} p50={percentile(latencies, 0.5):7.3f}ms '
+          f'p99={percentile(latencies, 0.99):7.3f}ms max={max(latencies):7.3f}ms')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-e", "--engine", type=str, default='select', choices=('select', 'asyncio'))
+    parser.add_argument("-n", "--number", type=int, default=200, help='Messages per measurement')
+    return parser
+
+
+def main():
+    args = parse_args().parse_args()
+    with spawn_server(engine=args.engine) as port:
+        report('idle', measure(port, args.number))
+
+        stop, created = threading.Event(), []
+        thread = threading.Thread(target=creator, args=(port, stop, created))
+        thread.start()
+        time.sleep(0.1)
+        latencies = measure(port, args.number)
+        stop.set()
+        thread.join()
+        report('creating rooms', latencies)
+        print(f'rooms created: {created[0]}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Стоимость маршрутизации по действиям: Server.__route для уже декодированного запроса
+(выбор обработчика из таблицы, доставка, кадры в очередях получателей) и разбор адресата на клиенте.
+Сообщения без target (клиенты старой версии) показывают цену вывода типа адресата на сервере.
+
+    python -m benchmarks.bench_route [-n 20000] [--members 100]
+
+"""
+import argparse
+import time
+from timeit import Timer
+
+from benchmarks.bench_relay import Tick, connect, message, payload
+from common.codecs import decode_message, get_codec
+from common.package import Request
+from common.request_body import Msg, MsgRoom
+from common.utils import to_package
+from common.variables import TARGET, RequestAction
+from src.server import Server
+
+
+def decoded(frame):
+    return to_package(decode_message(frame))
+
+
+def measure(server, tick, session, requests, number):
+    """ нс на запрос для каждого из requests; запросы чередуются (LEAVE, затем JOIN) """
+    route = server._Server__route
+    elapsed = [0] * len(requests)
+    for _ in range(number):
+        for i, request in enumerate(requests):
+            start = time.perf_counter_ns()
+            route(session, request)
+            elapsed[i] += time.perf_counter_ns() - start
+            tick.end()
+    return [total / number for total in elapsed]
+
+
+def parse_cost(cls, text, number):
+    def parse():
+        cls(text, 'alice').parse_msg()
+    return min(Timer(parse).repeat(repeat=3, number=number)) / number * 1e9
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=20000, help='Requests per action')
+    parser.add_argument("--members", type=int, default=100, help='Room members and users for ALL')
+    return parser
+
+
+def main():
+    args = parse_args().parse_args()
+    codec = get_codec('binary')
+    server = Server('127.0.0.1', 7777, rate_limits=None, idle_timeout=0, resume_grace=0)
+    tick = Tick()
+    alice = connect(server, tick, 'alice', codec)
+    connect(server, tick, 'bob', codec)
+    members = [connect(server, tick, f'member{i}', codec) for i in range(args.members - 2)]
+    server._Server__route(alice, decoded(message('#bench create', 'alice', codec)))
+    for member in members:
+        server._Server__route(member, decoded(payload(Request(RequestAction.JOIN, '#bench'), codec)))
+    tick.end()
+
+    legacy = decoded(message('@bob how are you doing today?', 'alice', codec))
+    del legacy.body[TARGET]  # кадр клиента, который не передаёт тип адресата
+    scenarios = (
+        (('presence',), [Request(RequestAction.PRESENCE, 'alice')]),
+        (('msg user',), [decoded(message('@bob how are you doing today?', 'alice', codec))]),
+        (('msg user, no target',), [legacy]),
+        ((f'msg room x{args.members - 2}',), [decoded(message('#bench how are you doing today?', 'alice', codec))]),
+        ((f'msg all x{args.members - 1}',), [decoded(message('how are you doing today?', 'alice', codec))]),
+        (('leave', 'join'), [Request(RequestAction.LEAVE, '#bench'), Request(RequestAction.JOIN, '#bench')]),
+        (('command',), [Request(RequestAction.COMMAND, 'history bob')]),
+        (('unknown',), [Request('nope')]),
+    )
+    print(f'{"action":>22} {"ns/request":>11}')
+    for titles, requests in scenarios:
+        server.logger.disabled = titles[0] == 'unknown'  # без записи 'Incorrect request' в лог на каждый запрос
+        for title, cost in zip(titles, measure(server, tick, alice, requests, args.number)):
+            print(f'{title:>22} {cost:>11.0f}')
+    server.logger.disabled = False
+
+    print(f'\n{"client parse":>22} {"ns/message":>11}')
+    for cls, text in ((Msg, '@bob how are you doing today?'), (Msg, 'how are you doing today?'),
+                      (MsgRoom, '#bench how are you doing today?')):
+        print(f'{text.split()[0]:>22} {parse_cost(cls, text, args.number):>11.0f}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Общие помощники бенчмарков: запуск сервера в отдельном процессе и простые клиенты.
+
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from common.codecs import get_codec
+from common.package import Request
+from common.request_body import Msg, MsgRoom, User
+from common.utils import FrameBuffer, get_data, send_data
+from common.variables import DEFAULT_IP_ADDRESS, RequestAction
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((DEFAULT_IP_ADDRESS, 0))
+        return sock.getsockname()[1]
+
+
+def wait_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((DEFAULT_IP_ADDRESS, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f'Server did not start on port {port}')
+
+
+@contextmanager
+def spawn_server(port=None, engine='select', *args, rate_limit=False):
+    """
+    Сервер в дочернем процессе; stdin держим открытым, чтобы консоль сервера ждала ввода.
+    Ограничения частоты по умолчанию выключены: один клиент бенчмарка шлёт поток быстрее любого лимита.
+    Сервер работает во временном каталоге: его журнал (logs/ от текущего каталога) не попадает в репозиторий.
+
+    """
+    port = port or free_port()
+    if not rate_limit:
+        args += ('--no-rate-limit',)
+    cmd = [sys.executable, '-m', 'src.server', '-p', str(port), '-a', DEFAULT_IP_ADDRESS, '-e', engine, *args]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (ROOT, os.environ.get('PYTHONPATH')))))
+    with tempfile.TemporaryDirectory(prefix='py_chat_bench_') as cwd:
+        process = subprocess.Popen(cmd, cwd=cwd, env=env, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+        try:
+            wait_port(port)
+            yield port
+        finally:
+            process.kill()
+            process.wait()
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class BenchClient:
+    """ Синхронный клиент для бенчмарков """
+
+    def __init__(self, port, username, codec='binary'):
+        self.username = username
+        self.codec = get_codec(codec)
+        self.frames = FrameBuffer()
+        self.sock = socket.create_connection((DEFAULT_IP_ADDRESS, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.send(Request(RequestAction.PRESENCE, User(username)))
+        self.presence = self.recv()
+
+    def send(self, request):
+        send_data(self.sock, request, self.codec)
+
+    def recv(self):
+        return get_data(self.sock, self.frames)
+
+    def message(self, text):
+        msg = MsgRoom(text, User(self.username)) if text.startswith('#') else Msg(text, User(self.username))
+        msg.parse_msg()
+        self.send(Request(RequestAction.MESSAGE, msg))
+
+    def close(self):
+        """
+        QUIT до закрытия: иначе сервер держит сессию для RESUME и имя занято до конца resume_grace.
+        Непрочитанные ответы дочитываются до EOF: закрытие сокета с данными в приёмном буфере
+        шлёт RST, и сервер может не прочитать QUIT.
+
+        """
+        try:
+            self.send(Request(RequestAction.QUIT))
+            self.sock.shutdown(socket.SHUT_WR)
+            self.sock.settimeout(5)
+            while self.sock.recv(65536):
+                pass
+        except OSError:
+            pass
+        self.sock.close()
@@ -0,0 +1,199 @@
+"""
+Нагрузочный генератор: N симулированных клиентов в одном процессе (asyncio).
+
+Сценарий: PRESENCE всех клиентов -> создание комнат и JOIN -> поток сообщений
+(личные @user, в комнату #room, всем) с заданной частотой -> LEAVE -> QUIT.
+Задержка доставки считается по полю time: сервер сохраняет в пересылаемом
+сообщении время отправки исходного запроса.
+
+    python -m benchmarks.loadgen --spawn -c 1000 -r 5000 -d 10 --json result.json
+
+Для 10k+ клиентов поднимите лимит дескрипторов (ulimit -n) у генератора и сервера.
+
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+from benchmarks.harness import percentile, spawn_server
+from common.codes import BASIC
+from common.package import Request
+from common.variables import DEFAULT_IP_ADDRESS, DEFAULT_PORT, RequestAction
+from src.async_client import AsyncClient
+
+MARKER = '|lg|'
+
+
+class Stats:
+    __slots__ = ('latencies', 'sent', 'delivered', 'codes', 'connect_times')
+
+    def __init__(self):
+        self.latencies = []
+        self.sent = Counter()
+        self.delivered = 0
+        self.codes = Counter()
+        self.connect_times = []
+
+    def on_response(self, resp, now):
+        self.codes[resp.code] += 1
+        if resp.code == BASIC and MARKER in resp.message:
+            self.delivered += 1
+            self.latencies.append((now - resp.time) * 1000)
+
+
+class SimClient(AsyncClient):
+    """ Симулированный клиент: сессия AsyncClient, все входящие сообщения - в статистику """
+    __slots__ = ('name', 'room')
+
+    def __init__(self, name, args, stats):
+        super().__init__(args.host, args.port, name, (args.codec,), lambda resp: stats.on_response(resp, time.time()))
+        self.name = name
+        self.room = None
+
+
+def parse_mix(value):
+    mix = {'direct': 0.0, 'room': 0.0, 'all': 0.0}
+    for part in value.split(','):
+        kind, weight = part.split('=')
+        if kind not in mix:
+            raise argparse.ArgumentTypeError(f'Unknown message kind: {kind}')
+        mix[kind] = float(weight)
+    return mix
+
+
+async def connect_all(args, stats):
+    clients = [SimClient(f'lg{i}', args, stats) for i in range(args.clients)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def connect(client):
+        async with semaphore:
+            start = time.perf_counter()
+            resp = await client.connect()
+            stats.connect_times.append((time.perf_counter() - start) * 1000)
+            stats.codes[resp.code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connect(c) for c in clients))
+    return clients, time.perf_counter() - start
+
+
+async def join_rooms(clients, rooms):
+    if not rooms:
+        return
+    for i, client in enumerate(clients):
+        client.room = f'#lg{i % rooms}'
+    for client in clients[:rooms]:
+        client.message(f'{client.room} {MARKER} create')  # первое сообщение создаёт комнату
+    await asyncio.sleep(0.2)
+    for client in clients[rooms:]:
+        client.send(Request(RequestAction.JOIN, client.room))
+    await asyncio.sleep(0.5)
+
+
+async def generate(clients, args, stats):
+    kinds, weights = zip(*args.mix.items())
+    names = [c.name for c in clients]
+    interval = 0.005
+    start = time.perf_counter()
+    seq = 0
+    while True:
+        elapsed = time.perf_counter() - start
+        if elapsed >= args.duration:
+            break
+        due = int(elapsed * args.rate)
+        while seq < due:
+            client = random.choice(clients)
+            kind = random.choices(kinds, weights)[0]
+            if kind == 'room' and client.room:
+                client.message(f'{client.room} {MARKER} {seq}')
+            elif kind == 'all':
+                client.message(f'{MARKER} {seq}')
+            else:
+                client.message(f'@{random.choice(names)} {MARKER} {seq}')
+            stats.sent[kind] += 1
+            seq += 1
+        await asyncio.sleep(interval)
+    return time.perf_counter() - start
+
+
+async def run_load(args):
+    stats = Stats()
+    clients, connect_time = await connect_all(args, stats)
+    await join_rooms(clients, args.rooms)
+    stats.latencies.clear()
+    stats.delivered = 0
+    duration = await generate(clients, args, stats)
+    await asyncio.sleep(args.drain)
+    for client in clients:
+        if client.room:
+            client.send(Request(RequestAction.LEAVE, client.room))
+    await asyncio.gather(*(c.close() for c in clients))  # QUIT уходит после LEAVE из той же очереди
+    return report(args, stats, connect_time, duration)
+
+
+def report(args, stats, connect_time, duration):
+    sent = sum(stats.sent.values())
+    return {
+        'clients': args.clients,
+        'rate_target': args.rate,
+        'duration_s': round(duration, 3),
+        'connect': {
+            'total_s': round(connect_time, 3),
+            'per_s': round(args.clients / connect_time, 1),
+            'p50_ms': round(percentile(stats.connect_times, 0.5), 3),
+            'p99_ms': round(percentile(stats.connect_times, 0.99), 3),
+        },
+        'sent': dict(stats.sent),
+        'sent_per_s': round(sent / duration, 1),
+        'delivered': stats.delivered,
+        'delivered_per_s': round(stats.delivered / duration, 1),
+        'latency_ms': {
+            'p50': round(percentile(stats.latencies, 0.5), 3),
+            'p99': round(percentile(stats.latencies, 0.99), 3),
+            'p999': round(percentile(stats.latencies, 0.999), 3),
+            'max': round(max(stats.latencies, default=0), 3),
+        },
+        'codes': {str(k): v for k, v in stats.codes.items()},
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-a", "--host", type=str, default=DEFAULT_IP_ADDRESS, help='Server address')
+    parser.add_argument("-p", "--port", type=int, default=DEFAULT_PORT, help='Server port')
+    parser.add_argument("-c", "--clients", type=int, default=100, help='Simulated clients')
+    parser.add_argument("-r", "--rate", type=float, default=1000, help='Messages per second (all clients)')
+    parser.add_argument("-d", "--duration", type=float, default=10, help='Traffic phase, seconds')
+    parser.add_argument("--rooms", type=int, default=10, help='Rooms to create and join')
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix('direct=0.7,room=0.3'), help='e.g. direct=0.6,room=0.3,all=0.1')
+    parser.add_argument("--codec", type=str, default='binary', help='Wire codec')
+    parser.add_argument("--concurrency", type=int, default=200, help='Parallel connection attempts')
+    parser.add_argument("--drain", type=float, default=1.0, help='Wait for in-flight messages, seconds')
+    parser.add_argument("--json", type=str, default=None, help='Write the report to this file')
+    parser.add_argument("--spawn", action='store_true', help='Start a server subprocess for the run')
+    parser.add_argument("-e", "--engine", type=str, default='select', help='Engine of the spawned server')
+    parser.add_argument("-w", "--workers", type=int, default=1, help='Workers of the spawned server')
+    return parser
+
+
+def main(argv=None):
+    args = parse_args().parse_args(argv)
+    if args.spawn:
+        with spawn_server(None, args.engine, '-w', str(args.workers)) as port:
+            args.port = port
+            result = asyncio.run(run_load(args))
+    else:
+        result = asyncio.run(run_load(args))
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, 'w') as f:
+            f.write(text)
+    return result
+
+
+if __name__ == "__main__":
+    main()
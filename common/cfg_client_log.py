@@ -1,16 +1,17 @@
 import logging
+import os
 
-from common.variables import ENCODING, LOG_FILENAME, LOGGER_NAME
+from common import logs
+from common.variables import ENCODING, LOG_DIRECTORY, LOGGER_NAME
 
 FILE_LOG_LVL = logging.INFO
-
-client_formatter = logging.Formatter(
-    f"%(asctime)-5s - %(levelname)-5s | %(module)-5s | %(message)s", datefmt="%Y-%m-%dT%H:%M:%S"
-)
-
-logHandler = logging.FileHandler(LOG_FILENAME, encoding=ENCODING)
-logHandler.setFormatter(client_formatter)
+CLIENT_LOG_FILENAME = os.path.join(LOG_DIRECTORY, "client.log")
 
 logger = logging.getLogger(LOGGER_NAME)
-# logger.addHandler(logHandler)
 logger.setLevel(FILE_LOG_LVL)
+
+
+def configure(level=FILE_LOG_LVL, json_lines=False):
+    """ Запись лога клиента в файл (по умолчанию выключена), через фоновый поток common.logs """
+    os.makedirs(LOG_DIRECTORY, exist_ok=True)
+    return logs.configure(LOGGER_NAME, logging.FileHandler(CLIENT_LOG_FILENAME, encoding=ENCODING), level, json_lines)
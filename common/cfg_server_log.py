@@ -1,18 +1,27 @@
 import logging
+import os
 from logging.handlers import TimedRotatingFileHandler
 
-from common.variables import ENCODING, LOG_FILENAME, LOGGER_NAME, WHEN_INTERVAL
+from common import logs
+from common.variables import (BACKUP_COUNT, ENCODING, LOG_DEBUG_SAMPLE, LOG_DIRECTORY, LOG_FILENAME, LOG_RATE_LIMIT,
+                              LOGGER_NAME, WHEN_INTERVAL)
 
 FILE_LOG_LVL = logging.INFO
 
-server_formatter = logging.Formatter(
-    f"%(asctime)-5s - %(levelname)-5s | %(module)-5s | %(message)s", datefmt="%Y-%m-%dT%H:%M:%S"
-)
+# Выборка 1 из N для DEBUG; лимит записей в секунду для уровней ниже WARNING задаёт rate_limit
+SAMPLE = {logging.DEBUG: LOG_DEBUG_SAMPLE}
 
-logHandler = TimedRotatingFileHandler(LOG_FILENAME, when=WHEN_INTERVAL, interval=1, encoding=ENCODING)
-logHandler.setFormatter(server_formatter)
 
+def configure(level=FILE_LOG_LVL, json_lines=False, use_queue=True, rate_limit=LOG_RATE_LIMIT):
+    """
+    Файл с ротацией; запись в файл - в фоновом потоке (common.logs), use_queue=False - синхронно.
+    rate_limit=0 - без ограничения.
+    Вызывается точкой входа (src.server.run), а не при импорте: импорт модуля не открывает файлов и не запускает потоков.
 
-logger = logging.getLogger(LOGGER_NAME)
-logger.addHandler(logHandler)
-logger.setLevel(FILE_LOG_LVL)
+    """
+    rate = {logging.DEBUG: rate_limit, logging.INFO: rate_limit} if rate_limit else None
+    os.makedirs(LOG_DIRECTORY, exist_ok=True)
+    handler = TimedRotatingFileHandler(
+        LOG_FILENAME, when=WHEN_INTERVAL, interval=1, backupCount=BACKUP_COUNT, encoding=ENCODING
+    )
+    return logs.configure(LOGGER_NAME, handler, level, json_lines, rate, SAMPLE, use_queue)
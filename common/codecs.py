@@ -0,0 +1,440 @@
+import json
+import zlib
+from struct import Struct, error as StructError
+
+from common.request_body import BaseBody
+from common.variables import *
+from common.zdict import DICTIONARY
+
+# Первый байт полезной нагрузки кадра - идентификатор кодека
+CODECS = {}
+CODECS_BY_NAME = {}
+
+
+class UnknownCodecError(ValueError):
+    pass
+
+
+class BaseCodec:
+    """ Кодек: словарь пакета <-> байты """
+    __slots__ = ()
+
+    name = None
+    tag = None
+
+    def encode(self, message):
+        raise NotImplementedError
+
+    def decode(self, payload):
+        raise NotImplementedError
+
+    def encode_package(self, package):
+        """ Request / Response -> байты; кодек может писать поля пакета сам, не собирая словарь """
+        return self.encode(package.get_dict())
+
+
+def register_codec(codec_cls):
+    codec = codec_cls()
+    if codec.tag in CODECS:
+        raise ValueError(f'Codec tag {codec.tag} already registered')
+    CODECS[codec.tag] = codec
+    CODECS_BY_NAME[codec.name] = codec
+    return codec_cls
+
+
+def get_codec(name):
+    try:
+        return CODECS_BY_NAME[name]
+    except KeyError:
+        raise UnknownCodecError(f'Unknown codec: {name}') from None
+
+
+def frame_codec(payload):
+    try:
+        return CODECS[payload[0]]
+    except (KeyError, IndexError):
+        raise UnknownCodecError(f'Unknown codec tag: {payload[:1]!r}') from None
+
+
+def encode_message(message, codec):
+    return codec.tag.to_bytes(1, 'big') + codec.encode(message)
+
+
+def decode_message(payload):
+    codec = frame_codec(payload)
+    try:
+        message = codec.decode(memoryview(payload)[1:])
+    except (IndexError, StructError, UnicodeDecodeError) as e:
+        raise ValueError(f'Malformed {codec.name} payload: {e}') from None
+    if isinstance(message, dict):
+        return message
+    raise ValueError
+
+
+@register_codec
+class JsonCodec(BaseCodec):
+    """ JSON - подходит и для пакетов, и для словарей протокола JIM (common.messages) """
+    __slots__ = ()
+
+    name = 'json'
+    tag = 1
+
+    def encode(self, message):
+        return json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode(ENCODING)
+
+    def decode(self, payload):
+        return json.loads(bytes(payload).decode(ENCODING))
+
+
+# Бинарный кодек: схема полей из __slots__ Request / Response
+KIND_REQUEST, KIND_RESPONSE = 0, 1
+ACTIONS = (
+    RequestAction.PRESENCE,
+    RequestAction.QUIT,
+    RequestAction.MESSAGE,
+    RequestAction.JOIN,
+    RequestAction.LEAVE,
+    RequestAction.COMMAND,
+    RequestAction.PROBE,
+    RequestAction.RESUME,
+)
+ACTION_IDS = {a: i for i, a in enumerate(ACTIONS)}
+
+REQUEST_HEAD = Struct('!BBd')  # kind, action, time
+RESPONSE_HEAD = Struct('!BHd')  # kind, code, time
+INT = Struct('!q')
+FLOAT = Struct('!d')
+
+V_NONE, V_STR, V_INT, V_FLOAT, V_LIST, V_DICT, V_TRUE, V_FALSE = range(8)
+
+
+def _write_uvarint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_uvarint(data, pos):
+    byte = data[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    shift = result = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+# Вложенность значений: тела протокола не глубже 2, предел защищает декодер от рекурсии без дна
+MAX_DEPTH = 32
+# Ключи словарей тел - несколько известных имён: готовый заголовок строки при кодировании и строка при декодировании
+KEY_CACHE_SIZE = 256
+_KEYS = {}
+_NAMES = {}
+
+
+def _key_head(key):
+    """ Ключ словаря как значение V_STR (заголовок и байты), с кэшем """
+    head = _KEYS.get(key)
+    if head is None:
+        out = bytearray()
+        _write_value(out, str(key))
+        head = bytes(out)
+        if len(_KEYS) < KEY_CACHE_SIZE:
+            _KEYS[key] = head
+    return head
+
+
+def _write_str(out, value):
+    raw = value.encode(ENCODING)
+    out.append(V_STR)
+    if len(raw) < 0x80:
+        out.append(len(raw))
+    else:
+        _write_uvarint(out, len(raw))
+    out += raw
+
+
+def _write_value(out, value, depth=0):
+    """
+    Строки - самые частые значения тел: в списках и словарях они пишутся без рекурсивного вызова.
+    Сравнение type() вместо isinstance() - быстрый путь; подклассы обрабатывает общая ветка в конце.
+
+    """
+    kind = type(value)
+    if kind is str:
+        _write_str(out, value)
+    elif value is None:
+        out.append(V_NONE)
+    elif kind is dict:
+        if depth >= MAX_DEPTH:
+            raise ValueError('Value nested too deep')
+        out.append(V_DICT)
+        _write_uvarint(out, len(value))
+        for key, item in value.items():
+            out += _KEYS.get(key) or _key_head(key)
+            if type(item) is str:
+                raw = item.encode(ENCODING)
+                out.append(V_STR)
+                if len(raw) < 0x80:
+                    out.append(len(raw))
+                else:
+                    _write_uvarint(out, len(raw))
+                out += raw
+            else:
+                _write_value(out, item, depth + 1)
+    elif kind is list or kind is tuple:
+        if depth >= MAX_DEPTH:
+            raise ValueError('Value nested too deep')
+        out.append(V_LIST)
+        _write_uvarint(out, len(value))
+        for item in value:
+            if type(item) is str:
+                raw = item.encode(ENCODING)
+                out.append(V_STR)
+                if len(raw) < 0x80:
+                    out.append(len(raw))
+                else:
+                    _write_uvarint(out, len(raw))
+                out += raw
+            else:
+                _write_value(out, item, depth + 1)
+    elif value is True:
+        out.append(V_TRUE)
+    elif value is False:
+        out.append(V_FALSE)
+    elif kind is int:
+        out.append(V_INT)
+        out += INT.pack(value)
+    elif kind is float:
+        out.append(V_FLOAT)
+        out += FLOAT.pack(value)
+    elif isinstance(value, str):
+        _write_str(out, value)
+    elif isinstance(value, int):
+        _write_value(out, int(value), depth)
+    elif isinstance(value, float):
+        _write_value(out, float(value), depth)
+    elif isinstance(value, (list, tuple, dict)):
+        _write_value(out, dict(value) if isinstance(value, dict) else list(value), depth)
+    else:
+        raise ValueError(f'Unsupported value type: {type(value).__name__}')
+
+
+def _read_str(data, pos):
+    """ Строка после байта V_STR; короткая длина (один байт) читается без _read_uvarint """
+    size = data[pos]
+    if size < 0x80:
+        pos += 1
+    else:
+        size, pos = _read_uvarint(data, pos)
+    end = pos + size
+    if end > len(data):
+        raise ValueError('Truncated string')
+    return data[pos:end].decode(ENCODING), end
+
+
+def _read_key(data, pos):
+    """ Ключ словаря: строка из кэша по её байтам """
+    if data[pos] != V_STR:
+        return _read_value(data, pos)
+    size = data[pos + 1]
+    if size >= 0x80:
+        return _read_str(data, pos + 1)
+    start = pos + 2
+    end = start + size
+    if end > len(data):
+        raise ValueError('Truncated string')
+    raw = data[start:end]
+    key = _NAMES.get(raw)
+    if key is None:
+        key = raw.decode(ENCODING)
+        if len(_NAMES) < KEY_CACHE_SIZE:
+            _NAMES[raw] = key
+    return key, end
+
+
+def _read_value(data, pos, depth=0):
+    kind = data[pos]
+    pos += 1
+    if kind == V_STR:
+        return _read_str(data, pos)
+    if kind == V_NONE:
+        return None, pos
+    if kind == V_DICT:
+        if depth >= MAX_DEPTH:
+            raise ValueError('Value nested too deep')
+        size, pos = _read_uvarint(data, pos)
+        items = {}
+        for _ in range(size):
+            key, pos = _read_key(data, pos)
+            if data[pos] == V_STR and data[pos + 1] < 0x80:
+                start = pos + 2
+                pos = start + data[pos + 1]
+                items[key] = data[start:pos].decode(ENCODING)
+            else:
+                items[key], pos = _read_value(data, pos, depth + 1)
+        if pos > len(data):  # срез за концом данных не падает: короткие строки проверяются здесь
+            raise ValueError('Truncated string')
+        return items, pos
+    if kind == V_LIST:
+        if depth >= MAX_DEPTH:
+            raise ValueError('Value nested too deep')
+        size, pos = _read_uvarint(data, pos)
+        items = []
+        append = items.append
+        for _ in range(size):
+            if data[pos] == V_STR and data[pos + 1] < 0x80:
+                start = pos + 2
+                pos = start + data[pos + 1]
+                append(data[start:pos].decode(ENCODING))
+            else:
+                item, pos = _read_value(data, pos, depth + 1)
+                append(item)
+        if pos > len(data):
+            raise ValueError('Truncated string')
+        return items, pos
+    if kind == V_INT:
+        return INT.unpack_from(data, pos)[0], pos + INT.size
+    if kind == V_FLOAT:
+        return FLOAT.unpack_from(data, pos)[0], pos + FLOAT.size
+    if kind == V_TRUE:
+        return True, pos
+    if kind == V_FALSE:
+        return False, pos
+    raise ValueError(f'Unknown value kind: {kind}')
+
+
+@register_codec
+class BinaryCodec(BaseCodec):
+    """
+    Компактное бинарное кодирование пакетов.
+    Request:  kind | action id | time | body    [| id]
+    Response: kind | code      | time | message [| id]
+    Номер запроса - необязательное последнее значение: декодер старой версии его просто не читает.
+    Кодек на чистом Python: на проводе в 1.5-5 раз меньше pickle, но медленнее C pickle - пакеты со строковым
+    телом в 1-2 раза, тела-словари и списки (Msg, ответы команд) в 2-4 раза. Сравнение - benchmarks/bench_codecs.
+
+    """
+    __slots__ = ()
+
+    name = 'binary'
+    tag = 2
+
+    def encode(self, message):
+        kind = message.get(TYPE)
+        time = float(message.get(TIME) or 0)
+        if kind == REQUEST:
+            try:
+                action = ACTION_IDS[message[ACTION]]
+            except KeyError:
+                raise ValueError(f'Unknown action: {message.get(ACTION)}') from None
+            out = bytearray(REQUEST_HEAD.pack(KIND_REQUEST, action, time))
+            _write_value(out, message.get(BODY))
+        elif kind == RESPONSE:
+            out = bytearray(RESPONSE_HEAD.pack(KIND_RESPONSE, message[CODE], time))
+            _write_value(out, message.get(MESSAGE))
+        else:
+            raise ValueError(f'Unknown package type: {kind}')
+        if message.get(ID) is not None:
+            _write_value(out, message[ID])
+        return bytes(out)
+
+    def encode_package(self, package):
+        """ Те же байты, что encode(package.get_dict()): поля читаются из слотов пакета напрямую """
+        kind = package.type
+        if kind == RESPONSE:
+            out = bytearray(RESPONSE_HEAD.pack(KIND_RESPONSE, package.code, package.time))
+            _write_value(out, package.message)
+        elif kind == REQUEST:
+            try:
+                action = ACTION_IDS[package.action]
+            except KeyError:
+                raise ValueError(f'Unknown action: {package.action}') from None
+            out = bytearray(REQUEST_HEAD.pack(KIND_REQUEST, action, package.time))
+            body = package.body
+            _write_value(out, body.get_dict() if isinstance(body, BaseBody) else body)
+        else:
+            raise ValueError(f'Unknown package type: {kind}')
+        if package.id is not None:
+            _write_value(out, package.id)
+        return bytes(out)
+
+    def decode(self, payload):
+        payload = bytes(payload)
+        kind = payload[0]
+        if kind == KIND_REQUEST:
+            _, action, time = REQUEST_HEAD.unpack_from(payload)
+            body, pos = _read_value(payload, REQUEST_HEAD.size)
+            message = {ACTION: ACTIONS[action], BODY: body, TIME: time, TYPE: REQUEST}
+        elif kind == KIND_RESPONSE:
+            _, code, time = RESPONSE_HEAD.unpack_from(payload)
+            text, pos = _read_value(payload, RESPONSE_HEAD.size)
+            message = {CODE: code, MESSAGE: text, TIME: time, TYPE: RESPONSE}
+        else:
+            raise ValueError(f'Unknown package kind: {kind}')
+        if pos < len(payload):
+            message[ID], _ = _read_value(payload, pos)
+        return message
+
+
+# zbinary: окно 4 КиБ вмещает словарь, memLevel 5 - небольшой буфер состояния на каждый кадр
+ZLIB_WBITS = -12
+ZLIB_MEM_LEVEL = 5
+ZLIB_LEVEL = 6
+RAW, DEFLATE = 0, 1
+# сжатие каждого кадра начинается с копии состояния, в которое словарь уже загружен
+_DEFLATE_BASE = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, ZLIB_WBITS, ZLIB_MEM_LEVEL, zdict=DICTIONARY)
+
+
+def deflate(payload, threshold=COMPRESS_THRESHOLD):
+    """ Флаг + данные: сжатие, только если нагрузка не короче порога и сжатая копия действительно меньше """
+    if len(payload) >= threshold:
+        compressor = _DEFLATE_BASE.copy()
+        data = compressor.compress(payload) + compressor.flush()
+        if len(data) < len(payload):
+            return DEFLATE.to_bytes(1, 'big') + data
+    return RAW.to_bytes(1, 'big') + payload
+
+
+def inflate(payload):
+    if payload[0] == RAW:
+        return payload[1:]
+    if payload[0] != DEFLATE:
+        raise ValueError(f'Unknown compression flag: {payload[0]}')
+    decompressor = zlib.decompressobj(ZLIB_WBITS, zdict=DICTIONARY)
+    try:
+        data = decompressor.decompress(payload[1:], MAX_FRAME_SIZE)
+    except zlib.error as e:
+        raise ValueError(f'Malformed compressed payload: {e}') from None
+    if decompressor.unconsumed_tail:
+        raise ValueError('Decompressed payload exceeds MAX_FRAME_SIZE')
+    return data
+
+
+@register_codec
+class CompressedCodec(BinaryCodec):
+    """
+    Бинарный кодек + сжатие кадра zlib с предустановленным словарём (common.zdict).
+    Согласуется как любой кодек: клиент шлёт PRESENCE в zbinary, старый сервер отвечает INCORRECT_REQUEST.
+    По умолчанию не предлагается (CODEC_PREFERENCE), клиент включает его явно.
+    Рассылка кодируется один раз на кодек (Server.__send_to_all), поэтому сжатие не умножается на получателей.
+
+    """
+    __slots__ = ()
+
+    name = 'zbinary'
+    tag = 4  # 3 - прежний словарь (common.zdict): клиент с ним получит 'Unsupported codec' и выберет binary
+
+    def encode(self, message):
+        return deflate(super().encode(message))
+
+    def encode_package(self, package):
+        return deflate(super().encode_package(package))
+
+    def decode(self, payload):
+        return super().decode(inflate(payload))
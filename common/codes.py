@@ -24,11 +24,17 @@ ANSWER = Code(101, '')
 # 2xx
 OK = Code(200, 'OK')
 CREATED = Code(201, 'Connected created')
+QUEUED = Code(202, 'User is offline, message queued')
+DELIVERED = Code(203, 'Message delivered')
+RESUMED = Code(205, 'Session resumed')
+PARTIAL = Code(206, 'Partial answer')  # страница длинного ответа команды, последняя страница - ANSWER
 # 4xx
 INCORRECT_REQUEST = Code(400, 'Incorrect request / json')
 ACCESS = Code(401, 'You are not connected to this chat!')
 NOT_FOUND = Code(404, 'User / chat is missing on the server')
+SESSION_EXPIRED = Code(410, 'Session expired')
 CONFLICT = Code(409, 'User already connected')
+TOO_MANY_REQUESTS = Code(429, 'Too many requests')
 # 5xx
 SERVER_ERROR = Code(500, 'Server error')
 SERVER_UNAVAILABLE = Code(503, 'Service Unavailable ')
\ No newline at end of file
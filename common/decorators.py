@@ -5,7 +5,7 @@ from common.codes import *
 def log_call_method(func):
     def wrapper(*args, **kwargs):
         logger = args[0].logger
-        logger.debug(f'Func {func.__name__} with args {args}, {kwargs} is called from {func.__module__} ')
+        logger.debug('Func %s with args %s, %s is called from %s ', func.__name__, args, kwargs, func.__module__)
         return func(*args, **kwargs)
     return wrapper
 
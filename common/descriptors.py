@@ -1,9 +1,3 @@
-import sys
-import logging
-from common.decorators import *
-import ipaddress
-
-
 class Port:
     __slots__ = ('name',)
 
@@ -30,6 +24,7 @@ class Addr():
        
     def __set__(self, instance, value):
         if value:
+            import ipaddress  # только для адреса из командной строки, не при импорте
             try:
                 ip = ipaddress.ip_address(value)
                 print(ip)
@@ -0,0 +1,161 @@
+"""
+Фоновое логирование: QueueHandler в рабочих потоках, запись в файл - в потоке QueueListener.
+
+- форматирование ленивое: в очередь уходит сама запись (сообщение и аргументы),
+  строка собирается в потоке записи;
+- RateLimitFilter прореживает уровни ниже WARNING: выборка 1 из N и ограничение записей в секунду,
+  число пропущенных записей попадает в следующую выведенную;
+- JsonFormatter - вывод JSON lines вместо текста;
+- после fork (рабочие процессы --workers) очередь и поток записи создаются заново.
+
+"""
+import atexit
+import json
+import logging
+import os
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from time import monotonic
+
+TEXT_FORMAT = "%(asctime)-5s - %(levelname)-5s | %(module)-5s | %(message)s"
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        return f'{text} [+{suppressed} suppressed]' if suppressed else text
+
+
+class JsonFormatter(logging.Formatter):
+    """ Одна запись - одна строка JSON """
+
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'message': record.getMessage(),
+        }
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Прореживание по уровням: sample - {уровень: N} (проходит каждая N-я запись),
+    rate - {уровень: записей в секунду} (ведро токенов с запасом на одну секунду).
+    Уровни, которых нет в словарях, не ограничиваются.
+
+    """
+
+    def __init__(self, rate=None, sample=None):
+        super().__init__()
+        self.rate = rate or {}
+        self.sample = sample or {}
+        self.seen = {}
+        self.tokens = {level: float(limit) for level, limit in self.rate.items()}
+        self.updated = {level: monotonic() for level in self.rate}
+        self.suppressed = {}
+
+    def filter(self, record):
+        level = record.levelno
+        every = self.sample.get(level)
+        if every is not None and every > 1:
+            seen = self.seen[level] = self.seen.get(level, 0) + 1
+            if seen % every:
+                return self.__drop(level)
+        limit = self.rate.get(level)
+        if limit is not None:
+            now = monotonic()
+            tokens = min(limit, self.tokens[level] + (now - self.updated[level]) * limit)
+            self.updated[level] = now
+            if tokens < 1:
+                self.tokens[level] = tokens
+                return self.__drop(level)
+            self.tokens[level] = tokens - 1
+        suppressed = self.suppressed.pop(level, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+    def __drop(self, level):
+        self.suppressed[level] = self.suppressed.get(level, 0) + 1
+        return False
+
+
+class LazyQueueHandler(QueueHandler):
+    """ В отличие от QueueHandler не форматирует запись в вызывающем потоке """
+
+    def prepare(self, record):
+        return record
+
+
+class LogPipeline:
+    """ Логгер -> LazyQueueHandler -> очередь -> QueueListener -> handlers """
+    __slots__ = ('logger', 'handlers', 'handler', 'listener')
+
+    def __init__(self, logger, handlers, level=logging.INFO, rate=None, sample=None, use_queue=True):
+        self.logger = logger
+        self.handlers = handlers
+        self.listener = None
+        if use_queue:
+            self.handler = LazyQueueHandler(SimpleQueue())
+            self.listener = QueueListener(self.handler.queue, *handlers, respect_handler_level=True)
+        else:
+            self.handler = handlers[0]
+        if rate or sample:
+            self.handler.addFilter(RateLimitFilter(rate, sample))
+        logger.setLevel(level)
+        logger.addHandler(self.handler)
+        if self.listener is not None:
+            self.listener.start()
+
+    def restart(self):
+        """ После fork: поток записи в дочернем процессе не существует, очередь могла быть занята """
+        if self.listener is None:
+            return
+        self.handler.queue = SimpleQueue()
+        self.listener = QueueListener(self.handler.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        """ Дописывает очередь и отключает обработчики """
+        self.logger.removeHandler(self.handler)
+        if self.listener is not None:
+            self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+
+
+PIPELINES = {}
+
+
+def configure(name, handler, level=logging.INFO, json_lines=False, rate=None, sample=None, use_queue=True):
+    """ (Пере)настраивает логгер name; повторный вызов заменяет прежний конвейер """
+    stop(name)
+    handler.setFormatter(JsonFormatter() if json_lines else TextFormatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+    pipeline = PIPELINES[name] = LogPipeline(logging.getLogger(name), [handler], level, rate, sample, use_queue)
+    return pipeline
+
+
+def stop(name=None):
+    for key in list(PIPELINES) if name is None else [name]:
+        pipeline = PIPELINES.pop(key, None)
+        if pipeline is not None:
+            pipeline.stop()
+
+
+def _after_fork():
+    for pipeline in PIPELINES.values():
+        pipeline.restart()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(stop)
@@ -1,45 +1,81 @@
-import pdb
-import types
+"""
+Метаклассы, проверяющие байт-код классов: клиент не слушает порт, сервер не подключается сам,
+socket() не вызывается без параметров.
+
+Проверка разбирает байт-код всех методов при создании класса - это заметная часть времени импорта
+src.server и src.client, поэтому:
+- она выключается переменной окружения CHAT_VERIFY=0 (по умолчанию выключена при python -O);
+- инструкции разбираются только у кода, в именах которого есть socket или запрещённый метод;
+- результат запоминается по объекту кода: один и тот же код не разбирается дважды;
+- коды операций берутся из dis текущей версии: вызов - CALL_FUNCTION / CALL_METHOD до 3.11 и CALL после,
+  загрузка метода - LOAD_METHOD до 3.12 и LOAD_ATTR после.
+
+    python -m benchmarks.bench_import  # время импорта с проверкой и без
+
+"""
 import dis
-from icecream import ic
+import os
+import sys
+import types
+from functools import lru_cache
 
+VERIFY = os.environ.get('CHAT_VERIFY', '1' if __debug__ else '0') != '0'
+
+# Вызов с числом позиционных аргументов в arg
+CALL_OPS = frozenset(op for op in ('CALL_FUNCTION', 'CALL_METHOD', 'CALL') if op in dis.opmap)
+# Инструкции между загрузкой вызываемого объекта и вызовом, не связанные с аргументами
+PASS_OPS = frozenset(op for op in ('PRECALL', 'PUSH_NULL', 'KW_NAMES', 'CACHE') if op in dis.opmap)
+# Загрузка имени, которое может оказаться вызовом метода
+LOAD_OPS = frozenset(['LOAD_GLOBAL', 'LOAD_METHOD'] + (['LOAD_ATTR'] if sys.version_info >= (3, 12) else []))
 
-def disassemble(clsdict, black_list):
 
-    funcs = [a for a in clsdict.values() if isinstance(a, types.FunctionType)]
-    instructions = [list(dis.get_instructions(f)) for f in funcs]
+@lru_cache(maxsize=None)
+def check_code(code, black_list):
+    """ Текст ошибки для объекта кода (включая вложенные функции и lambda) или None """
+    # имена глобальных и атрибутов кода есть в co_names: без нужных имён разбирать инструкции незачем
+    names = set(code.co_names)
+    instructions = dis.get_instructions(code) if 'socket' in names or not black_list.isdisjoint(names) else ()
+    socket_load = False  # предыдущая значимая инструкция - загрузка socket
     for instr in instructions:
-        socket_step_to_call = 0  # кол-во инструкций начиная с 'LOAD_GLOBAL' инструкции для socket
-        for i in instr:
+        if socket_load and instr.opname not in PASS_OPS:
+            socket_load = False
+            if instr.opname in CALL_OPS and instr.arg == 0:
+                return 'Incorrect socket usage'  # вызов socket без параметров
+        if instr.opname in LOAD_OPS:
+            if instr.argval == 'socket':
+                socket_load = True
+            if instr.argval in black_list:
+                return 'Call method of socket from black list'
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            error = check_code(const, black_list)
+            if error:
+                return error
+    return None
 
-            if socket_step_to_call > 0:
-                socket_step_to_call += 1
-                if i.opname.startswith('CALL_FUNCTION'):
-                    if socket_step_to_call <= 2:
-                        raise TypeError('Incorrect socket usage')  # вызов socket без параметров
-                    else:
-                        socket_step_to_call = 0  # вызов socket с параметрами
 
-            if i.opname in ['LOAD_GLOBAL', 'LOAD_METHOD']:
-                if i.argval == 'socket':
-                    socket_step_to_call += 1
-                if i.argval in black_list:
-                    raise TypeError('Call method of socket from black list')
+def disassemble(clsdict, black_list):
+    black_list = frozenset(black_list)
+    for func in clsdict.values():
+        if isinstance(func, types.FunctionType):
+            error = check_code(func.__code__, black_list)
+            if error:
+                raise TypeError(error)
 
 
 class ClientVerifier(type):
     black_list = ['accept', 'listen']
 
     def __init__(cls, clsname, bases, clsdict):
-        disassemble(clsdict, cls.black_list)
+        if VERIFY:
+            disassemble(clsdict, cls.black_list)
         super().__init__(clsname, bases, clsdict)
 
 
-
 class ServerVerifier(type):
     black_list = ['connect']
 
-
     def __init__(cls, clsname, bases, clsdict):
-        disassemble(clsdict, cls.black_list)
+        if VERIFY:
+            disassemble(clsdict, cls.black_list)
         super().__init__(clsname, bases, clsdict)
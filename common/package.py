@@ -1,7 +1,7 @@
 import sys
 import os
 sys.path.append(os.path.join(os.getcwd(), '..'))
-from datetime import datetime as dt
+from time import time
 from common.variables import *
 from common.codes import Code
 from common.request_body import BaseBody
@@ -12,26 +12,32 @@ class BasePackage:
 
     def __init__(self):
         super().__init__()
-        self.time = dt.timestamp(dt.now())
+        self.time = time()  # секунды эпохи без промежуточного объекта datetime на каждый пакет
 
     def get_dict(self):
-        return {s: getattr(self, s, None) for s in self.__slots__}
+        d = {s: getattr(self, s, None) for s in self.__slots__ if s != ID}
+        # номер есть только у запросов, ждущих ответа, и у ответов на них
+        if getattr(self, ID, None) is not None:
+            d[ID] = self.id
+        return d
 
 
 class Request(BasePackage):
-    __slots__ = (ACTION, BODY, TIME, TYPE)
+    __slots__ = (ACTION, BODY, TIME, TYPE, ID)
 
     def __init__(self, action, body=''):
         super().__init__()
         self.type = REQUEST
         self.action = action
         self.body = body
+        self.id = None
 
     @classmethod
     def from_dict(cls, json_obj):
         ins = cls(json_obj[ACTION], json_obj[BODY])
         if TIME in json_obj:
             ins.time = json_obj[TIME]
+        ins.id = json_obj.get(ID)
         return ins
 
     def get_dict(self):
@@ -57,7 +63,7 @@ class Request(BasePackage):
 
 
 class Response(BasePackage):
-    __slots__ = (CODE, MESSAGE, TIME, TYPE)
+    __slots__ = (CODE, MESSAGE, TIME, TYPE, ID)
 
     def __init__(self, code, message=None):
         super().__init__()
@@ -67,12 +73,14 @@ class Response(BasePackage):
             self.message = message
         else:
             self.message = code.message
+        self.id = None
 
     @classmethod
     def from_dict(cls, json_obj):
         ins = cls(Code(json_obj[CODE], json_obj[MESSAGE]))
         if TIME in json_obj:
             ins.time = json_obj[TIME]
+        ins.id = json_obj.get(ID)
         return ins
 
     def __str__(self):
@@ -43,37 +43,44 @@ class Room(BaseBody):
         return f'{self.roomname} >>>>> {self.subscribers}'
 
 
+def target_of(to):
+    """ Тип адресата по имени: '#room' - комната, 'ALL' - все, иначе пользователь """
+    if to.startswith('#'):
+        return MessageTarget.ROOM
+    if to.upper() == 'ALL':
+        return MessageTarget.ALL
+    return MessageTarget.USER
+
+
 class Msg(BaseBody):
-    __slots__ = (SENDER, TO, TEXT)
+    __slots__ = (SENDER, TO, TEXT, TARGET)
 
-    PATTERN_USER = r'@(?P<to>[\w\d]*)?(?P<message>.*)'
-    
+    PATTERN_USER = re.compile(r'@(?P<to>[\w\d]*)?(?P<message>.*)')
 
-    def __init__(self, text, sender, to='ALL'):
+    def __init__(self, text, sender, to='ALL', target=None):
         self.text = text
         self.sender = sender
         self.to = to
+        self.target = target or target_of(to)
 
     @classmethod
     def from_dict(cls, json_obj):
-        ins = cls(json_obj[TEXT], json_obj[SENDER], json_obj[TO])
+        ins = cls(json_obj[TEXT], json_obj[SENDER], json_obj[TO], json_obj.get(TARGET))
         return ins
 
     def parse_msg(self):
+        """ Адресат разбирается один раз, здесь: сервер берёт готовые to и target из кадра """
         to = 'ALL'
         msg = self.text
 
-        if '@' in msg:
-            match = re.match(self.PATTERN_USER, msg)
+        if msg.startswith('@'):
+            match = self.PATTERN_USER.match(msg)
             to = match.group(TO)
             msg = match.group(MESSAGE)
-        # elif '#' in msg:
-        #     match = re.match(self.PATTERN_GROUP, msg)
-        #     to = '#' + match.group(TO)
-        #     msg = match.group(MESSAGE)
 
         self.to = to
         self.text = msg
+        self.target = target_of(to)
 
     def __str__(self):
         return f'{self.sender} to @{self.to}: {self.text}'
@@ -81,7 +88,7 @@ class Msg(BaseBody):
 
 class MsgRoom(Msg):
 
-    PATTERN_GROUP = r'#(?P<to>[\w\d]*)?(?P<message>.*)'
+    PATTERN_GROUP = re.compile(r'#(?P<to>[\w\d]*)?(?P<message>.*)')
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -90,16 +97,14 @@ class MsgRoom(Msg):
         to = ''
         msg = self.text
 
-        if '#' in msg:
-            match = re.match(self.PATTERN_GROUP, msg)
+        if msg.startswith('#'):
+            match = self.PATTERN_GROUP.match(msg)
             to = '#' + match.group(TO)
             msg = match.group(MESSAGE)
 
         self.to = to
         self.text = msg
+        self.target = target_of(to)
 
     def __str__(self):
         return f'{self.sender} to {self.to}: {self.text}'
-
-    
-    
\ No newline at end of file
@@ -1,50 +1,176 @@
-import inspect
 import logging
-from pickle import dumps, loads
+import sys
+from collections import deque
+from struct import Struct
 
-from common.variables import BUFFER_SIZE, ENCODING, LOG_FILENAME
+from common.variables import *
+from common.codecs import decode_message, encode_message, get_codec
+from common.package import Request, Response
 
+# Заголовок кадра: длина полезной нагрузки, 4 байта big-endian
+FRAME_HEADER = Struct('!I')
+# Заголовок кадра вместе с первым байтом нагрузки - идентификатором кодека
+FRAME_PREFIX = Struct('!IB')
 
-def get_message(sock):
+
+def pack_frame(payload):
+    """ Добавляет к полезной нагрузке заголовок с её длиной """
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ValueError(f'Frame too large: {len(payload)} bytes')
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+class FrameBuffer:
+    """
+    Буфер сборки кадров для одного соединения.
+    Накапливает байты из recv и выделяет из них все полные кадры,
+    неполный хвост остаётся до следующего чтения.
+
+    """
+    __slots__ = ('data', 'frames')
+
+    def __init__(self):
+        self.data = bytearray()
+        self.frames = deque()
+
+    def feed(self, chunk):
+        """ Добавляет принятые байты, возвращает кол-во готовых кадров """
+        data = self.data
+        data += chunk
+        size = len(data)
+        offset = 0
+        header_size = FRAME_HEADER.size
+        while size - offset >= header_size:
+            (length,) = FRAME_HEADER.unpack_from(data, offset)
+            if length > MAX_FRAME_SIZE:
+                raise ValueError(f'Frame too large: {length} bytes')
+            end = offset + header_size + length
+            if end > size:
+                break
+            self.frames.append(bytes(data[offset + header_size:end]))
+            offset = end
+        if offset:
+            del data[:offset]
+        return len(self.frames)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def pop(self):
+        return self.frames.popleft()
+
+
+def recv_frames(sock, buffer, size=BUFFER_SIZE):
+    """
+    Возвращает все полные кадры из буфера.
+    Если готовых кадров нет - один вызов recv.
+
+    """
+    if not buffer.frames:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionResetError('Connection closed by peer')
+        buffer.feed(chunk)
+    frames = list(buffer.frames)
+    buffer.frames.clear()
+    return frames
+
+
+def recv_frame(sock, buffer):
+    """ Блокирующее чтение ровно одного кадра, лишние кадры остаются в буфере """
+    while not buffer.frames:
+        chunk = sock.recv(BUFFER_SIZE)
+        if not chunk:
+            raise ConnectionResetError('Connection closed by peer')
+        buffer.feed(chunk)
+    return buffer.pop()
+
+
+def send_all(sock, data):
+    """ Отправка с учётом частичной записи: досылает остаток через memoryview """
+    sent = sock.send(data)
+    if sent == len(data):
+        return  # клиенты сервера ставят кадр в очередь целиком: memoryview не нужен
+    view = memoryview(data)[sent:]
+    while view:
+        sent = sock.send(view)
+        view = view[sent:]
+
+
+def get_message(sock, buffer=None):
     """
     Утилита приема и декодирования сообщения.
     Принимает байты и выдает словарь, если принято что - то другое отдает ошибку значения
 
     """
-    encoded_response = sock.recv(BUFFER_SIZE)
-    if isinstance(encoded_response, bytes):
-        response = loads(encoded_response)
-        if isinstance(response, dict):
-            return response
-        raise ValueError
-    raise ValueError
+    if buffer is None:
+        buffer = FrameBuffer()
+    return decode_message(recv_frame(sock, buffer))
+
 
+def get_messages(sock, buffer):
+    """ Все сообщения, полностью принятые за один вызов recv """
+    return [decode_message(frame) for frame in recv_frames(sock, buffer)]
+
+
+def encode_frame(package, codec=None):
+    """
+    Готовый кадр пакета: его можно отправить нескольким получателям без перекодирования.
+    Байты те же, что pack_frame(encode_message(package.get_dict(), codec)), но без словаря пакета
+    и с одной склейкой вместо двух.
 
-def send_message(sock, msg):
+    """
+    codec = codec or get_codec(DEFAULT_CODEC)
+    payload = codec.encode_package(package)
+    if len(payload) >= MAX_FRAME_SIZE:
+        raise ValueError(f'Frame too large: {len(payload) + 1} bytes')
+    return FRAME_PREFIX.pack(len(payload) + 1, codec.tag) + payload
+
+
+def send_message(sock, msg, codec=None):
     """
     Утилита кодирования и отправки сообщения.
     Принимает словарь и отправляет его.
 
     """
-    encoded_message = dumps(msg)
-    sock.send(encoded_message)
+    send_all(sock, pack_frame(encode_message(msg, codec or get_codec(DEFAULT_CODEC))))
+
+
+def to_package(message):
+    """ Словарь -> Request / Response """
+    if message.get(TYPE) == REQUEST:
+        return Request.from_dict(message)
+    if message.get(TYPE) == RESPONSE:
+        return Response.from_dict(message)
+    raise ValueError(f'Unknown package type: {message.get(TYPE)}')
+
+
+def get_data(sock, buffer=None):
+    """ Приём одного пакета Request / Response """
+    return to_package(get_message(sock, buffer))
+
+
+def get_all_data(sock, buffer):
+    """ Приём всех пакетов, полностью пришедших за один вызов recv """
+    return [to_package(m) for m in get_messages(sock, buffer)]
 
 
-logFormatter = logging.Formatter(f"%(asctime)-5s - %(levelname)-5s %(message)s", datefmt="%Y-%m-%dT%H:%M:%S")
+def send_data(sock, package, codec=None):
+    """ Отправка пакета Request / Response """
+    send_message(sock, package.get_dict(), codec)
 
-logHandler = logging.FileHandler(LOG_FILENAME, encoding=ENCODING)
-logHandler.setFormatter(logFormatter)
 
-logger = logging.getLogger("app." + __name__)
-logger.addHandler(logHandler)
-logger.setLevel(logging.INFO)
+logger = logging.getLogger(LOGGER_NAME)
 
 
 def log(func):
+    """ Отладочный журнал вызовов; имя вызывающей функции берётся из кадра, а не из inspect.stack() """
     def wrapper(*args, **kwargs):
-        logger.info(f'function name: "{func.__name__}", arguments: {args}, {kwargs}')
+        if not logger.isEnabledFor(logging.DEBUG):
+            return func(*args, **kwargs)
+        logger.debug('function name: "%s", arguments: %s, %s', func.__name__, args, kwargs)
         r = func(*args, **kwargs)
-        logger.info(f'Function "{func.__name__}" called from a function "{inspect.stack()[1][3]}"')
+        logger.debug('Function "%s" called from a function "%s"', func.__name__, sys._getframe(1).f_code.co_name)
         return r
 
     return wrapper
@@ -5,11 +5,61 @@ DEFAULT_PORT = 7777
 # IP адрес по умолчанию для подключения клиента
 DEFAULT_IP_ADDRESS = "127.0.0.1"
 # Максимальная очередь подключений
-MAX_CONNECTIONS = 5
+MAX_CONNECTIONS = 1024
 # Максимальная длина сообщений в байтах
 BUFFER_SIZE = 2048
+# Размер чтения сервером за один recv: все кадры, накопившиеся в сокете, за один такт
+RECV_BUFFER_SIZE = 64 * 1024
+# Максимальный размер одного кадра (без заголовка длины)
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+# Очередь исходящих кадров клиента: верхняя и нижняя границы, байт
+OUTBOX_HIGH_WATER = 1024 * 1024
+OUTBOX_LOW_WATER = 256 * 1024
+# Что делать с медленным клиентом: drop - отключить, shed - выбросить старые кадры
+SLOW_CONSUMER_POLICY = "shed"
+# История сообщений: размер сегмента журнала, период group commit (с), порог досрочной записи
+HISTORY_SEGMENT_SIZE = 64 * 1024 * 1024
+HISTORY_FLUSH_INTERVAL = 0.05
+HISTORY_BATCH = 1024
+# Сколько сообщений отдаёт команда history по умолчанию и максимум
+HISTORY_LIMIT = 20
+HISTORY_MAX = 500
+# Команды сервера: потоков пула, команд в работе (сверх - отказ), элементов списка в одном кадре ответа
+COMMAND_WORKERS = 2
+COMMAND_QUEUE = 32
+COMMAND_PAGE = 100
+# Клиент ждёт последнего кадра ответа команды не дольше, с
+COMMAND_TIMEOUT = 30
+# Почтовые ящики офлайн-пользователей: сообщений в ящике, срок хранения (с), число ящиков
+MAILBOX_SIZE = 100
+MAILBOX_TTL = 24 * 60 * 60
+MAILBOX_USERS = 10000
+# Соединение без входящих данных: PROBE через треть IDLE_TIMEOUT, отключение через IDLE_TIMEOUT, с (0 - выключено)
+IDLE_TIMEOUT = 90
+# Колесо таймеров: шаг (с) и число слотов (один оборот должен покрывать IDLE_TIMEOUT)
+TIMER_TICK = 1.0
+TIMER_SLOTS = 512
+# TCP keepalive принятых соединений: простой до первой проверки, интервал, число проверок
+KEEPALIVE_IDLE = 60
+KEEPALIVE_INTERVAL = 10
+KEEPALIVE_COUNT = 3
+# Разрыв без QUIT: сессия с именем и комнатами ждёт RESUME, с (0 - выключено);
+# кадры сессии в буфере повтора: последние RESUME_REPLAY подключённой и до RESUME_BUFFER отключённой
+RESUME_GRACE = 30
+RESUME_REPLAY = 32
+RESUME_BUFFER = 1024
+RESUME_TOKEN_BYTES = 16
+# Переподключение клиента: задержка перед попыткой N - случайная от 0 до min(RECONNECT_MAX, RECONNECT_BASE * 2 ** N), с
+RECONNECT_BASE = 0.5
+RECONNECT_MAX = 30
 # Кодировка проекта
 ENCODING = "utf-8"
+# Кодек до согласования и кодеки, предлагаемые клиентом при PRESENCE (по убыванию приоритета).
+# zbinary клиент включает сам: AsyncClient(codecs=("zbinary", *CODEC_PREFERENCE))
+DEFAULT_CODEC = "json"
+CODEC_PREFERENCE = ("binary", "json")
+# zbinary: полезная нагрузка короче порога не сжимается
+COMPRESS_THRESHOLD = 64
 # Тайм-аут
 TIMEOUT = 0.2
 WAIT = 10
@@ -18,10 +68,30 @@ DEFAULT_SERVER = "server"
 
 
 # Протокол JIM основные ключи
-ACTION = "message"
+ACTION = "action"
 TIME = "time"
 USER = "Dave"
 
+# Ключи пакетов Request / Response
+BODY = "body"
+TYPE = "type"
+CODE = "code"
+ID = "id"  # номер запроса, ждущего ответа; ответ на него несёт тот же номер
+MESSAGE = "message"
+REQUEST = "request"
+
+# Ключи тела запроса
+USERNAME = "username"
+ROOMNAME = "roomname"
+SUBSCRIBERS = "subscribers"
+SENDER = "sender"
+TO = "to"
+TEXT = "text"
+TARGET = "target"  # тип адресата сообщения (MessageTarget), разобранный клиентом
+TOKEN = "token"
+SEQ = "seq"
+LOST = "lost"
+
 
 # Прочие ключи используемые в протоколе
 PRESENCE = "presence"
@@ -30,6 +100,35 @@ ERROR = "error"
 RESPONSE_DEFAULT_IP_ADDRESS = "response_default_ip_address"
 
 
+class RequestAction:
+    PRESENCE = "presence"
+    QUIT = "quit"
+    MESSAGE = "msg"
+    JOIN = "join"
+    LEAVE = "leave"
+    COMMAND = "command"
+    PROBE = "probe"
+    RESUME = "resume"
+
+
+class MessageTarget:
+    USER = "user"
+    ROOM = "room"
+    ALL = "all"
+
+
+# Ограничение частоты (ведро токенов): имя -> (токенов в секунду, ёмкость ведра).
+# session - все запросы соединения, действия - отдельно, fanout - получатели сообщений соединения в комнаты и всем
+RATE_LIMITS = {
+    'session': (200, 400),
+    RequestAction.MESSAGE: (100, 200),
+    RequestAction.JOIN: (5, 20),
+    RequestAction.LEAVE: (5, 20),
+    RequestAction.COMMAND: (5, 10),
+    'fanout': (20000, 50000),
+}
+
+
 # Ключи используемые в протоколе логирования
 ROOT = os.getcwd()
 DIR_LOG = "logs"
@@ -41,6 +140,9 @@ LOGGER_NAME = "app." + __name__
 
 BACKUP_COUNT = 5
 WHEN_INTERVAL = "D"
+# Уровни ниже WARNING: не больше LOG_RATE_LIMIT записей в секунду, DEBUG - каждая LOG_DEBUG_SAMPLE-я запись
+LOG_RATE_LIMIT = 1000
+LOG_DEBUG_SAMPLE = 1
 
 
 # Красивости
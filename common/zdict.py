@@ -0,0 +1,65 @@
+"""
+Предустановленный словарь zlib для кодека zbinary и его обучение.
+
+Короткие сообщения чата почти не сжимаются сами по себе, зато похожи друг на друга:
+одинаковые заголовки бинарного кодека, ключи тела запроса, " to @", " to #", служебные уведомления.
+Словарь - это "предыдущие данные" для каждого кадра: повторы из него кодируются ссылками.
+
+DICTIONARY сгенерирован на синтетическом трафике чата:
+    python -m benchmarks.bench_compression --train
+Словарь - часть протокола: изменённому словарю нужен новый тег кодека.
+Тег 3 - словарь до поля target в теле Msg, текущий словарь - тег 4.
+
+"""
+from collections import Counter
+
+ZDICT_SIZE = 2048
+
+
+def train(samples, size=ZDICT_SIZE, k=6, min_share=0.01):
+    """
+    Словарь из частых фрагментов образцов (упрощённый COVER из zstd).
+    Позиции, чей k-грамм есть хотя бы в доле min_share образцов, склеиваются в отрезки,
+    отрезки ранжируются по (число образцов * длина); отрезок, k-граммы которого в основном
+    уже есть в словаре, пропускается. Самые ценные отрезки идут в конец словаря:
+    они ближе к сжимаемым данным, и ссылки на них короче.
+
+    """
+    min_count = max(2, int(len(samples) * min_share))
+    frequency = Counter()
+    for sample in samples:
+        frequency.update({sample[i:i + k] for i in range(len(sample) - k + 1)})
+    spans = Counter()
+    for sample in samples:
+        found = set()
+        start = None
+        for i in range(len(sample) - k + 2):
+            frequent = i <= len(sample) - k and frequency[sample[i:i + k]] >= min_count
+            if frequent and start is None:
+                start = i
+            elif not frequent and start is not None:
+                found.add(sample[start:i - 1 + k])
+                start = None
+        spans.update(found)
+    chosen = []
+    covered = set()
+    total = 0
+    for span, count in sorted(spans.items(), key=lambda item: (-item[1] * len(item[0]), item[0])):
+        grams = {span[i:i + k] for i in range(len(span) - k + 1)}
+        if total + len(span) > size or len(grams - covered) * 2 < len(grams):
+            continue
+        chosen.append(span)
+        covered |= grams
+        total += len(span)
+    return b''.join(reversed(chosen))
+
+
+DICTIONARY = (
+    b' conne4\x01\x02to\x01\x0b2\x01\x02to\x01\x064\x01\x02to\x01\n1\x01\x02to\x01\x02#4\x01\x02to\x01\x08#9\x01\x02to\x01\x073\x01\x02to\x01\x04#3\x01\x02to\x01'
+    b'\x032\x01\x02to\x01\x036\x01\x02to\x01\t#4\x01\x02to\x01\x030\x01\x02to\x01\x039\x01\x02to\x01\x05#8\x01\x02to\x01\x035\x01\x02to\x01\x031\x01\x02to\x01\x030 to '
+    b'@6 to #3 to @0 to #1 to @8 to #5 to @3 to #6 to @8 to @9 to #2 t'
+    b'o @1 to #4 to @9 to @u\x01\x06target\x01\x03alll\x01\x06target\x01\x04roomh\x01\x06target\x01\x04use'
+    b'r7 to @ALL: 7\x01\x02to\x01\x03ALL\x01\x04text\x01 disconnected\x05\x04\x01\x06sender\x01\x08 JOINED to'
+    b' chat - #\x01\x04text\x01\x01\x1fUser is offline, message queued\x01\x11Message deliv'
+    b'ered'
+)
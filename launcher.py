@@ -1,6 +1,9 @@
 import subprocess
+import sys
 from argparse import ArgumentParser
 
+PORT = 5001
+
 
 class Launcher:
     def __init__(self, num, start):
@@ -9,6 +12,7 @@ class Launcher:
         self.actions = {
             "q": "Выход",
             "s": "Запустить сервер и клиенты (s <кол-во>)",
+            "l": "Нагрузочный тест без окон клиентов (l <кол-во клиентов> <сообщений/с> <секунд>)",
             "x": "Закрыть все окна",
             "h": "Справка",
         }
@@ -36,6 +40,8 @@ class Launcher:
                     except ValueError:
                         continue
                     self.run()
+            elif action.startswith("l"):
+                self.load(*action.split(" ")[1:])
             elif action == "x":
                 self.close()
             elif action == "h":
@@ -43,9 +49,18 @@ class Launcher:
 
     def run(self):
         self.close()
-        self.server = subprocess.Popen("python3 main.py -t server -p 5001", shell=True)
+        self.server = subprocess.Popen(f"python3 manage.py -t server -p {PORT}", shell=True)
         for i in range(self.num):
-            self.clients.append(subprocess.Popen(f"python3 main.py -t client -p 5001 -n test{i}", shell=True))
+            self.clients.append(subprocess.Popen(f"python3 manage.py -t client -p {PORT} -n test{i}", shell=True))
+
+    def load(self, clients="1000", rate="1000", duration="10"):
+        """ Headless-нагрузка на запущенный сервер; без сервера генератор поднимает свой """
+        cmd = [sys.executable, "-m", "benchmarks.loadgen", "-c", clients, "-r", rate, "-d", duration]
+        if self.server and self.server.poll() is None:
+            cmd += ["-p", str(PORT)]
+        else:
+            cmd.append("--spawn")
+        subprocess.run(cmd)
 
     def close(self):
         while self.clients:
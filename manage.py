@@ -1,5 +1,6 @@
 import argparse
 
+import common.cfg_server_log as log_config
 from common.variables import DEFAULT_IP_ADDRESS, DEFAULT_PORT, DEFAULT_SERVER
 from src.client import Client
 from src.server import Server
@@ -11,6 +12,7 @@ def parse_args():
     parser.add_argument("-p", "--port", type=int, default=DEFAULT_PORT)
     parser.add_argument("-a", "--addr", type=str, default=DEFAULT_IP_ADDRESS)
     parser.add_argument("-n", "--name", type=str, default=None)
+    parser.add_argument("-e", "--engine", type=str, default="select")
     return parser
 
 
@@ -23,8 +25,9 @@ def start():
 if __name__ == "__main__":
     ns = start()
     if ns.type == "server":
-        server = Server(ns.addr, ns.port)
-        server.main()
+        log_config.configure()  # лог настраивает точка входа, импорт src.server его не включает
+        server = Server(ns.addr, ns.port, ns.engine)
+        server.start()
     elif ns.type == "client":
         client = Client(ns.addr, ns.port, ns.name)
-        client.main()
+        client.start()
@@ -0,0 +1,303 @@
+"""
+Ядро клиента на asyncio, без консоли: на нём работают консольный клиент (src.client),
+боты и нагрузочные тесты - тысячи сессий в одном процессе.
+
+- задача чтения разбирает кадры: ответ с номером ожидающего запроса завершает его future,
+  остальное (сообщения чата, уведомления) уходит в handler;
+- задача записи забирает из очереди всё накопленное за итерацию цикла и пишет одним writelines,
+  поэтому запросы идут конвейером, не дожидаясь ответов на предыдущие;
+- request() нумерует запрос и ждёт ответ с тем же номером, send() только ставит запрос в очередь;
+  длинный ответ команды приходит страницами: PARTIAL - в handler, request() возвращает последнюю (ANSWER);
+- при разрыве без close() клиент переподключается с экспоненциальной задержкой и продолжает сессию
+  по токену RESUME: сервер сохраняет имя и комнаты и повторяет только недошедшие кадры.
+
+"""
+import asyncio
+import random
+from socket import IPPROTO_TCP, TCP_NODELAY
+
+from common.codecs import decode_message, get_codec
+from common.codes import BASIC, INCORRECT_REQUEST, OK, PARTIAL, RESUMED
+from common.package import Request
+from common.request_body import Msg, MsgRoom, User
+from common.utils import FrameBuffer, encode_frame, to_package
+from common.variables import (CODEC_PREFERENCE, RECONNECT_BASE, RECONNECT_MAX, RECV_BUFFER_SIZE, REQUEST, SEQ, TOKEN,
+                              USERNAME, RequestAction)
+
+
+def backoff(attempt, base=RECONNECT_BASE, cap=RECONNECT_MAX):
+    """
+    Задержка перед попыткой переподключения: экспонента с полным джиттером.
+    Случайная задержка во всём интервале разносит клиентов, потерявших сервер одновременно,
+    и после его перезапуска они не приходят одной волной.
+
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def make_request(text, user):
+    """
+    Запрос из строки в синтаксисе консоли:
+    $<command> - команда серверу, +#room / -#room - вход в комнату и выход,
+    #room <text> - сообщение в комнату, @user <text> - личное, иначе - всем.
+
+    """
+    if text[0] == '$':
+        return Request(RequestAction.COMMAND, text[1:])
+    if text[0] == '+':
+        return Request(RequestAction.JOIN, text[1:])
+    if text[0] == '-':
+        return Request(RequestAction.LEAVE, text[1:])
+    msg = MsgRoom(text, user) if text[0] == '#' else Msg(text, user)
+    msg.parse_msg()
+    return Request(RequestAction.MESSAGE, msg)
+
+
+class AsyncClient:
+    """
+    Одна сессия чата; handler(package) получает всё, что не является ответом на request(),
+    и ответ сервера на автоматическое переподключение (RESUMED или OK новой сессии).
+
+    """
+    __slots__ = ('addr', 'port', 'user', 'codecs', 'codec', 'handler', 'inbox', 'reader', 'writer', 'frames',
+                 'outbox', 'wake', 'pending', 'last_id', 'handshake', 'tasks', 'closing', 'auto_reconnect', 'token',
+                 'seq', 'online', 'stopped', 'retry')
+
+    def __init__(self, addr, port, username, codecs=CODEC_PREFERENCE, handler=None, reconnect=True):
+        self.addr = addr
+        self.port = port
+        self.user = User(username)
+        self.codecs = codecs
+        self.codec = get_codec(codecs[0])
+        self.inbox = asyncio.Queue()
+        self.handler = handler or self.inbox.put_nowait
+        self.reader = self.writer = None
+        self.frames = FrameBuffer()
+        self.outbox = []
+        self.wake = asyncio.Event()
+        self.pending = {}  # номер запроса -> future ответа
+        self.last_id = 0
+        self.handshake = None
+        self.tasks = ()
+        self.closing = False
+        self.auto_reconnect = reconnect
+        self.token = None  # токен RESUME текущей сессии
+        self.seq = 0  # номер последнего полученного кадра сессии, см. RESUME
+        self.online = False  # вход выполнен, разрыв - повод переподключиться
+        self.stopped = False  # вызван close()
+        self.retry = None
+
+    @property
+    def connected(self):
+        return self.writer is not None and not self.closing
+
+    async def connect(self):
+        """
+        Соединение и вход; возвращает ответ сервера.
+        Есть токен прошлой сессии - RESUME, иначе (или если сессия уже закрыта) PRESENCE с согласованием кодека.
+
+        """
+        self.reader, self.writer = await asyncio.open_connection(self.addr, self.port)
+        self.writer.get_extra_info('socket').setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        self.closing = False
+        self.stopped = False
+        self.frames = FrameBuffer()
+        self.outbox = []
+        self.tasks = (asyncio.create_task(self.__read_loop()), asyncio.create_task(self.__write_loop()))
+        if self.token is not None:
+            response = await self.__handshake(
+                Request(RequestAction.RESUME, {USERNAME: self.user.username, TOKEN: self.token, SEQ: self.seq}))
+            if response.code == RESUMED:
+                return response
+            self.token = None
+        response = None
+        for name in self.codecs:
+            self.codec = get_codec(name)
+            response = await self.__handshake(Request(RequestAction.PRESENCE, self.user))
+            if response.code != INCORRECT_REQUEST:
+                break
+        return response
+
+    async def reconnect(self):
+        """ Новое соединение без QUIT: сессия продолжается через RESUME """
+        await self.__drop()
+        return await self.connect()
+
+    async def __handshake(self, request):
+        """
+        Запрос входа. Ответ приходит с номером запроса, кроме отказа в незнакомом кодеке:
+        такой кадр сервер не может разобрать и отвечает без номера.
+
+        """
+        self.last_id += 1
+        request.id = self.last_id
+        self.handshake = self.pending[request.id] = asyncio.get_running_loop().create_future()
+        try:
+            self.send(request)
+            return await self.handshake
+        finally:
+            self.pending.pop(request.id, None)
+            self.handshake = None
+
+    def send(self, request):
+        """ В очередь записи, без ожидания ответа """
+        if not self.connected:
+            raise ConnectionResetError('Not connected')
+        self.outbox.append(encode_frame(request, self.codec))
+        self.wake.set()
+
+    async def request(self, request, timeout=None):
+        """ Запрос с номером; возвращает ответ сервера с тем же номером """
+        self.last_id += 1
+        request.id = self.last_id
+        future = self.pending[request.id] = asyncio.get_running_loop().create_future()
+        try:
+            self.send(request)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(request.id, None)
+
+    def message(self, text):
+        self.send(make_request(text, self.user))
+
+    async def receive(self):
+        """ Следующее сообщение без номера запроса (если handler не задан) """
+        return await self.inbox.get()
+
+    async def close(self):
+        """ QUIT и закрытие; ожидающие ответа запросы завершаются ConnectionResetError """
+        self.stopped = True
+        self.online = False
+        if self.retry is not None and self.retry is not asyncio.current_task():
+            self.retry.cancel()
+        if self.writer is None:
+            return
+        if not self.closing:
+            try:
+                self.send(Request(RequestAction.QUIT))
+            except ConnectionError:
+                pass
+            self.closing = True
+            self.wake.set()
+        reader_task, writer_task = self.tasks
+        try:
+            await writer_task  # очередь записи, включая QUIT, уходит до закрытия
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        reader_task.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        self.writer = None
+        self.__fail(ConnectionResetError('Connection closed'))
+
+    async def __drop(self):
+        """ Закрытие соединения без QUIT: сервер сохранит сессию для RESUME """
+        self.closing = True
+        self.online = False
+        current = asyncio.current_task()
+        for task in self.tasks:
+            if task is not current:
+                task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.writer = None
+        self.__fail(ConnectionResetError('Connection closed'))
+
+    async def __reconnect(self):
+        """ Попытки до успеха или close(); успешный ответ на вход получает handler """
+        await self.__drop()
+        attempt = 0
+        while not self.stopped:
+            await asyncio.sleep(backoff(attempt))
+            attempt += 1
+            try:
+                response = await self.connect()
+            except OSError:
+                await self.__drop()
+                continue
+            if response.code in (OK, RESUMED):
+                self.retry = None
+                return
+            await self.__drop()  # например, CONFLICT: имя ещё держит прежняя сессия в другом шарде
+
+    async def __read_loop(self):
+        frames = self.frames
+        try:
+            while True:
+                chunk = await self.reader.read(RECV_BUFFER_SIZE)
+                if not chunk:
+                    break
+                frames.feed(chunk)
+                while frames.frames:
+                    self.__dispatch(to_package(decode_message(frames.pop())))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            # разрыв не по close(): переподключение, если вход был выполнен
+            lost = self.online and not self.closing and self.auto_reconnect
+            self.closing = True
+            self.online = False
+            self.wake.set()
+            self.__fail(ConnectionResetError('Connection closed by server'))
+            if lost:
+                self.retry = asyncio.create_task(self.__reconnect())
+
+    def __dispatch(self, package):
+        self.seq += 1
+        if package.type == REQUEST:
+            if package.action == RequestAction.PROBE and self.connected:
+                self.send(Request(RequestAction.PROBE))  # heartbeat: сервер проверяет, что клиент жив
+            elif package.action == RequestAction.QUIT:
+                self.auto_reconnect = False  # сервер закрыл сессию (kick): переподключение её не вернёт
+            return
+        future = self.pending.get(package.id) if package.id is not None else None
+        if package.code == PARTIAL:
+            self.handler(package)  # страница длинного ответа; запрос ждёт последнюю страницу (ANSWER)
+            return
+        handshake = self.handshake
+        if future is None and handshake is not None and package.id is None and package.code != BASIC:
+            future = handshake  # отказ в незнакомом кодеке или сервер, не возвращающий номера запросов
+        if future is None or future.done():
+            self.handler(package)
+            return
+        # вход или смена имени повторным PRESENCE: у сессии новый токен и новый счёт кадров
+        if package.code in (OK, RESUMED) and (future is handshake or isinstance(package.message, dict)):
+            self.__enter(package.message)
+            if future is handshake and self.retry is not None:
+                self.handler(package)  # о переподключении приложение узнаёт раньше повторённых кадров
+        future.set_result(package)
+
+    def __enter(self, message):
+        """ Вход выполнен; ответ несёт токен RESUME и номер этого кадра в сессии, с него идёт счёт кадров """
+        self.online = True
+        if isinstance(message, dict) and TOKEN in message:
+            self.token = message[TOKEN]
+            self.seq = message[SEQ]
+
+    async def __write_loop(self):
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            if self.outbox:
+                frames, self.outbox = self.outbox, []
+                try:
+                    self.writer.writelines(frames)
+                    await self.writer.drain()
+                except ConnectionError:
+                    return  # разрыв обнаружит и обработает задача чтения
+            if self.closing:
+                return
+
+    def __fail(self, error):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+        if self.handshake is not None and not self.handshake.done():
+            self.handshake.set_exception(error)
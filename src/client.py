@@ -1,29 +1,15 @@
 import argparse
+import asyncio
 import logging
 import random
-from socket import *
-from threading import Thread
-from logs import cfg_client_log as log_config
-from common.decorators import *
+from common import cfg_client_log as log_config
 from common.descriptors import Port, Addr
-from common.codes import *
-from common.request_body import *
-from common.utils import *
+from common.codes import ANSWER, DELIVERED, OK, PARTIAL, RESUMED
+from common.package import Request
+from common.request_body import User
+from common.variables import COMMAND_TIMEOUT, DEFAULT_IP_ADDRESS, DEFAULT_PORT, LOST, RequestAction
 from common.metacls import ClientVerifier
-
-
-class ClientThread(Thread):
-    __slots__ = ('func', 'logger')
-
-    def __init__(self, func, logger):
-        super().__init__()
-        self.func = func
-        self.logger = logger
-        self.daemon = True
-
-    @try_except_wrapper
-    def run(self):
-        self.func()
+from src.async_client import AsyncClient, make_request
 
 
 def print_help():
@@ -42,108 +28,112 @@ def print_help():
 
 
 class Client(metaclass=ClientVerifier):
-    __slots__ = ('_addr', '_port', 'logger', 'socket', 'connected', 'listener', 'sender')
+    """ Консольный интерфейс: ввод в потоке исполнителя, сеть - в AsyncClient """
+    __slots__ = ('_addr', '_port', 'logger', 'core', 'commands')
 
-    TCP = (AF_INET, SOCK_STREAM)
     USER = User(f'Test{random.randint(0, 1000)}')
     addr = Addr('_addr')
     port = Port('_port')
-  
 
-    def __init__(self, addr, port):
+    def __init__(self, addr, port, name=None):
         self.logger = logging.getLogger(log_config.LOGGER_NAME)
         self.addr = addr
         self.port = port
-        self.connected = False
+        if name:
+            self.USER.username = name
+        self.core = None
+        self.commands = set()  # задачи команд в ожидании ответа: цикл хранит на задачи только слабые ссылки
 
     def start(self):
-        self.socket = socket(*self.TCP)
         start_txt = f'Connect to {self.addr}:{self.port} as {self.USER}...'
         self.logger.debug(start_txt)
         print(start_txt)
-        self.__connect()
+        asyncio.run(self.__run())
 
-    @try_except_wrapper
-    def __connect(self):
-        self.socket.connect((self.addr, self.port))
-        self.connected = True
+    async def __run(self):
+        if await self.__connect():
+            print_help()
+            await self.send_msg()
+        await self.core.close()
+
+    async def __connect(self):
+        self.core = AsyncClient(self.addr, self.port, self.USER.username, handler=self.__show)
+        try:
+            response = await self.core.connect()
+        except OSError as e:
+            self.logger.error(e)
+            print(f'Connection failed: {e}')
+            return False
         print('Done')
-        print_help()
-        response = self.presence()
         if response.code != OK:
             self.logger.warning(response)
-            return
-
-        self.listener = ClientThread(self.__listen_server, self.logger)
-        self.listener.start()
-        self.send_msg()
-
-    @try_except_wrapper
-    def __send_request(self, request):
-        if not self.connected:
-            return
-        self.logger.debug(request)
-        send_data(self.socket, request)
-
-    @try_except_wrapper
-    def __get_response(self):
-        if not self.connected:
-            return
-        response = get_data(self.socket)
-        self.logger.debug(response)
-        return response
-
-    def presence(self):
-        request = Request(RequestAction.PRESENCE, self.USER)
-        self.__send_request(request)
-        return self.__get_response()
-
-    def send_msg(self):
-        while self.connected:
-            msg = input('Enter message:\n')
+            print(response.message)
+            return False
+        return True
+
+    async def send_msg(self):
+        loop = asyncio.get_running_loop()
+        while not self.core.stopped:
+            msg = await loop.run_in_executor(None, input, 'Enter message:\n')
+            if not msg:
+                continue
             if msg.upper() == 'Q':
                 break
-            elif msg[0] == '!':
-                self.__execute_local_command(msg[1:])
+            if msg[0] == '!':
+                await self.__execute_local_command(msg[1:])
                 continue
-            elif msg[0] == '$':
-                request = Request(RequestAction.COMMAND, msg[1:])
-            elif msg[0] == '+':
-                request = Request(RequestAction.JOIN, msg[1:])
-            elif msg[0] == '-':
-                request = Request(RequestAction.LEAVE, msg[1:])
-            else:
-                if not msg[0] == '#':
-                    msg = Msg(msg, self.USER)
+            request = make_request(msg, self.USER)
+            self.logger.debug(request)
+            try:
+                if request.action == RequestAction.COMMAND:
+                    # ответ команды приходит с номером запроса; ввод не ждёт его
+                    task = asyncio.create_task(self.__command(request))
+                    self.commands.add(task)
+                    task.add_done_callback(self.commands.discard)
                 else:
-                    msg = MsgRoom(msg, self.USER)
-                msg.parse_msg()
-                request = Request(RequestAction.MESSAGE, msg)
-            self.__send_request(request)
-
-    def __execute_local_command(self, command):
+                    self.core.send(request)
+            except ConnectionError:
+                print('Connection lost, reconnecting...')
+
+    async def __command(self, request):
+        try:
+            self.__show(await self.core.request(request, COMMAND_TIMEOUT))
+        except asyncio.TimeoutError:
+            print(f'server: no answer to {request.body}')
+        except ConnectionError:
+            pass
+
+    async def __execute_local_command(self, command):
         if command == 'help':
             print_help()
         elif command == 'set_name':
-            name = input('Set new name')
+            name = await asyncio.get_running_loop().run_in_executor(None, input, 'Set new name')
             self.USER.username = name
-            self.__send_request(Request(RequestAction.PRESENCE, self.USER))
+            self.core.user.username = name
+            print((await self.core.request(Request(RequestAction.PRESENCE, self.USER))).message)
         elif command == 'reconnect':
-            self.start()
+            try:
+                self.__show(await self.core.reconnect())
+            except OSError as e:
+                print(f'Connection failed: {e}')
         else:
             print('Command not found')
 
-    def __listen_server(self):
-        while self.connected:
-            resp = get_data(self.socket)
-            self.logger.debug(resp)
-            if resp.type != RESPONSE:
-                self.logger.warning(f'Received not RESPONSE:\n {resp}')
-                continue
-            if resp.code == 101:
-                print(f'server: {resp.message}')
-            else:
-                print(resp.message)
+    def __show(self, resp):
+        self.logger.debug(resp)
+        if resp.code == DELIVERED:
+            return
+        if resp.code == RESUMED:
+            lost = resp.message.get(LOST)
+            print('Session resumed' + (f', {lost} messages lost' if lost else ''))
+        elif resp.code == OK:
+            print('Reconnected')
+        elif resp.code in (ANSWER, PARTIAL) and isinstance(resp.message, list):
+            print('server:', *resp.message, sep='\n')
+        elif resp.code == ANSWER:
+            print(f'server: {resp.message}')
+        else:
+            print(resp.message)
 
 
 def main():
@@ -168,7 +158,7 @@ def parse_args():
 
 
 def run():
-    args = parse_args()
+    args = parse_args().parse_args()
     client = Client(args.addr, args.port)
     client.start()
 
@@ -0,0 +1,129 @@
+"""
+Команды сервера ($<command> клиента и консоль сервера): реестр, пул исполнения и постраничные ответы.
+
+Обработчик команды может читать диск (history) или собирать длинный список, поэтому он выполняется
+в ограниченном пуле потоков, а не в цикле ввода-вывода:
+- пул принимает не больше COMMAND_QUEUE команд сразу, лишние получают отказ без ожидания;
+- ответы возвращаются в поток цикла через очередь и байт в socketpair: цикл слушает fileno() пула,
+  как шину шардов (select или add_reader asyncio), и отправляет кадры сам;
+- список (или генератор) уходит страницами по COMMAND_PAGE элементов: PARTIAL, ..., последняя - ANSWER.
+  Страницы генератора отправляются по мере готовности, не дожидаясь конца списка.
+Команды, меняющие состояние сессий (inline), выполняются прямо в потоке цикла.
+
+"""
+from collections import deque
+from socket import socketpair
+from types import GeneratorType
+
+from common.codes import ANSWER, PARTIAL, SERVER_ERROR
+from common.package import Response
+from common.variables import COMMAND_PAGE, COMMAND_QUEUE, COMMAND_WORKERS
+
+
+class Command:
+    """ Обработчик func(username, *args); username None - консоль сервера """
+    __slots__ = ('func', 'inline')
+
+    def __init__(self, func, inline=False):
+        self.func = func
+        self.inline = inline
+
+
+def command_responses(answer, page=COMMAND_PAGE):
+    """ Результат обработчика -> ответы клиенту; список и генератор - страницами по page элементов """
+    if answer is False:
+        yield Response(SERVER_ERROR, 'Command error')
+    elif answer is None:
+        yield Response(ANSWER, 'Done')
+    elif isinstance(answer, Response):
+        yield answer
+    elif isinstance(answer, (list, tuple, GeneratorType)):
+        items = []
+        for item in answer:
+            # страница уходит, только когда известно, что она не последняя
+            if len(items) == page:
+                yield Response(PARTIAL, items)
+                items = []
+            items.append(str(item))
+        yield Response(ANSWER, items)
+    else:
+        yield Response(ANSWER, answer)
+
+
+class CommandPool:
+    """
+    Ограниченный пул потоков для команд и очередь вызовов, которые должен выполнить поток цикла.
+    post() можно вызывать из любого потока; drain() и submit() - только из потока цикла.
+
+    """
+    __slots__ = ('workers', 'limit', 'inflight', 'executor', 'done', 'reader', 'writer')
+
+    def __init__(self, workers=COMMAND_WORKERS, limit=COMMAND_QUEUE):
+        self.workers = workers
+        self.limit = limit
+        self.inflight = 0
+        self.executor = None
+        self.done = deque()
+        self.reader = self.writer = None
+
+    def open(self):
+        """ Канал пробуждения цикла; до open() вызовы копятся и выполняются при первом drain() """
+        self.reader, self.writer = socketpair()
+        self.reader.setblocking(False)
+        self.writer.setblocking(False)
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def submit(self, func, *args):
+        """ func(*args) в потоке пула; False - пул занят """
+        if self.inflight >= self.limit:
+            return False
+        if self.executor is None:
+            # пул и его модуль нужны только после первой команды
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='command')
+        self.inflight += 1
+        self.executor.submit(self.__run, func, args)
+        return True
+
+    def __run(self, func, args):
+        try:
+            func(*args)
+        finally:
+            self.post(None)  # конец команды: место в пуле освобождает поток цикла
+
+    def post(self, func, *args):
+        """ Выполнить func(*args) в потоке цикла """
+        self.done.append((func, args))
+        if self.writer is not None:
+            try:
+                self.writer.send(b'\0')
+            except BlockingIOError:
+                pass  # буфер полон: цикл и так проснётся
+
+    def drain(self):
+        """ Вызовы, накопившиеся с прошлого раза, в порядке post() """
+        if self.reader is not None:
+            try:
+                while self.reader.recv(4096):
+                    pass
+            except BlockingIOError:
+                pass
+        calls = []
+        done = self.done
+        while done:
+            func, args = done.popleft()
+            if func is None:
+                self.inflight -= 1
+            else:
+                calls.append((func, args))
+        return calls
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        for sock in (self.reader, self.writer):
+            if sock is not None:
+                sock.close()
+        self.reader = self.writer = None
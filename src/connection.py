@@ -0,0 +1,262 @@
+import socket
+from collections import Counter, deque
+from itertools import islice
+from selectors import EVENT_READ, EVENT_WRITE
+
+from common.variables import (KEEPALIVE_COUNT, KEEPALIVE_IDLE, KEEPALIVE_INTERVAL, OUTBOX_HIGH_WATER, OUTBOX_LOW_WATER,
+                              SLOW_CONSUMER_POLICY)
+
+
+# Максимум буферов в одном sendmsg (IOV_MAX в Linux)
+IOV_MAX = 1024
+
+
+class SlowConsumerError(ConnectionError):
+    pass
+
+
+def tune_socket(sock):
+    """ TCP_NODELAY и keepalive: ядро само находит полуоткрытые соединения за KEEPALIVE_IDLE + INTERVAL * COUNT """
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, KEEPALIVE_COUNT)
+
+
+class BaseClient:
+    """
+    Ограниченная очередь исходящих кадров одного клиента.
+    Когда очередь превышает OUTBOX_HIGH_WATER, клиент считается медленным:
+    policy='drop' - соединение разрывается (SlowConsumerError),
+    policy='shed' - выбрасываются самые старые кадры, пока очередь не опустится до OUTBOX_LOW_WATER,
+    policy=None - очередь не ограничена (внутренние каналы, например шина шардов).
+    shed - сколько кадров соединение выбросило: сервер вычитает их из счёта кадров сессии (RESUME).
+
+    """
+    __slots__ = ('addr', 'out', 'out_bytes', 'partial', 'policy', 'stats', 'shed')
+
+    def __init__(self, addr, policy=SLOW_CONSUMER_POLICY, stats=None):
+        self.addr = addr
+        self.out = deque()
+        self.out_bytes = 0
+        self.partial = False  # первый кадр очереди уже частично отправлен
+        self.policy = policy
+        self.stats = Counter() if stats is None else stats
+        self.shed = 0
+
+    def pending(self):
+        """ Байты, ожидающие отправки """
+        return self.out_bytes
+
+    def _push(self, view):
+        self.out.append(view)
+        self.out_bytes += len(view)
+        if self.policy is None or self.pending() <= OUTBOX_HIGH_WATER:
+            return
+        if self.policy == 'drop':
+            self.stats['slow_consumers_dropped'] += 1
+            raise SlowConsumerError(f'Outbox overflow: {self.pending()} bytes queued for {self.addr}')
+        out = self.out
+        keep = 1 if self.partial else 0
+        while self.pending() > OUTBOX_LOW_WATER and len(out) > keep + 1:
+            frame = out[keep]
+            del out[keep]
+            self.out_bytes -= len(frame)
+            self.shed += 1
+            self.stats['frames_shed'] += 1
+            self.stats['bytes_shed'] += len(frame)
+
+    def _pop(self):
+        view = self.out.popleft()
+        self.out_bytes -= len(view)
+        self.partial = False
+        return view
+
+
+class StreamClient(BaseClient):
+    """
+    asyncio.StreamWriter с интерфейсом сокета, достаточным для send_data.
+    send() только ставит кадр в очередь; всё накопленное за итерацию цикла событий
+    уходит одним writelines() в flush(), запланированном через call_soon.
+    В буфер транспорта пишется не больше OUTBOX_LOW_WATER, остальное досылает задача pump().
+
+    """
+    __slots__ = ('writer', 'transport', 'loop', 'scheduled', 'ready', 'task')
+
+    def __init__(self, writer, policy=SLOW_CONSUMER_POLICY, stats=None):
+        import asyncio  # модуль нужен только движку asyncio, select-сервер его не загружает
+        super().__init__(writer.get_extra_info('peername'), policy, stats)
+        self.writer = writer
+        self.transport = writer.transport
+        self.transport.set_write_buffer_limits(high=OUTBOX_LOW_WATER)
+        self.loop = asyncio.get_running_loop()
+        self.scheduled = False
+        self.ready = asyncio.Event()
+        self.task = self.loop.create_task(self.pump())
+
+    def pending(self):
+        return self.out_bytes + self.transport.get_write_buffer_size()
+
+    def send(self, data):
+        self._push(data)
+        if not self.scheduled:
+            self.scheduled = True
+            self.loop.call_soon(self.flush)
+        return len(data)
+
+    def flush(self):
+        self.scheduled = False
+        if self.transport.is_closing():
+            return
+        batch = []
+        size = self.transport.get_write_buffer_size()
+        while self.out and size < OUTBOX_LOW_WATER:
+            view = self._pop()
+            batch.append(view)
+            size += len(view)
+        if batch:
+            self.writer.writelines(batch)
+        if self.out:
+            self.ready.set()
+
+    async def pump(self):
+        """ Медленный клиент: ждёт, пока транспорт освободит буфер """
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while self.out:
+                await self.writer.drain()
+                self.flush()
+
+    def close(self):
+        self.task.cancel()
+        self.out.clear()
+        self.out_bytes = 0
+        self.writer.close()
+
+    def __repr__(self):
+        return f'<StreamClient raddr={self.addr} queued={len(self.out)}>'
+
+
+class SocketClient(BaseClient):
+    """
+    Неблокирующий сокет клиента с очередью исходящих кадров.
+    send() не блокируется: что не ушло сразу, ставится в очередь,
+    и только пока очередь не пуста сокет подписан на EVENT_WRITE.
+    С dirty (множество, общее для цикла сервера) send() только ставит кадр в очередь
+    и отмечает клиента, а цикл в конце такта вызывает flush() - один sendmsg на сокет.
+
+    """
+    __slots__ = ('sock', 'selector', 'writing', 'dirty')
+
+    def __init__(self, sock, addr, selector, policy=SLOW_CONSUMER_POLICY, stats=None, dirty=None):
+        super().__init__(addr, policy, stats)
+        self.sock = sock
+        self.selector = selector
+        self.writing = False
+        self.dirty = dirty
+        sock.setblocking(False)
+        selector.register(sock, EVENT_READ, self)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv(self, size):
+        return self.sock.recv(size)
+
+    def send(self, data):
+        """
+        Пытается отправить сразу (без dirty), остаток - в очередь.
+        В очередь встаёт сам кадр: рассылка кладёт всем получателям один и тот же bytes-объект,
+        memoryview создаётся только для недосланного хвоста.
+
+        """
+        size = len(data)
+        if self.dirty is not None:
+            if self.out_bytes >= OUTBOX_LOW_WATER and not self.writing:
+                self.flush()  # крупный такт: не копить до порога сброса кадров
+            self._push(data)
+            self.dirty.add(self)
+            return size
+        if not self.out:
+            try:
+                sent = self.sock.send(data)
+            except BlockingIOError:
+                sent = 0
+            if sent:
+                data = memoryview(data)[sent:]
+                self.partial = bool(data)
+        if data:
+            self._push(data)
+            self.__want_write(True)
+        return size
+
+    def flush(self):
+        """ Конец такта или EVENT_WRITE: очередь уходит через sendmsg, пока сокет принимает данные """
+        out = self.out
+        while out:
+            batch = list(islice(out, IOV_MAX))
+            try:
+                sent = self.sock.sendmsg(batch)
+            except BlockingIOError:
+                break
+            complete = sent == sum(len(view) for view in batch)
+            while sent:
+                view = out[0]
+                if sent < len(view):
+                    out[0] = memoryview(view)[sent:]
+                    self.out_bytes -= sent
+                    self.partial = True
+                    break
+                sent -= len(view)
+                self._pop()
+            if not complete:
+                break
+        self.__want_write(bool(out))
+
+    def __want_write(self, flag):
+        if self.writing != flag:
+            self.writing = flag
+            self.selector.modify(self.sock, EVENT_READ | EVENT_WRITE if flag else EVENT_READ, self)
+
+    def close(self):
+        if self.dirty is not None:
+            self.dirty.discard(self)
+        try:
+            self.selector.unregister(self.sock)
+        except (KeyError, ValueError):
+            pass
+        self.out.clear()
+        self.out_bytes = 0
+        self.sock.close()
+
+    def __repr__(self):
+        return f'<SocketClient raddr={self.addr} queued={len(self.out)}>'
+
+
+class DetachedClient:
+    """ Соединение сессии, ждущей RESUME: кадры никуда не отправляются, их хранит буфер повтора сессии """
+    __slots__ = ()
+
+    addr = None
+    shed = 0
+
+    def send(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pending(self):
+        return 0
+
+    def close(self):
+        pass
+
+    def __repr__(self):
+        return '<DetachedClient>'
+
+
+DETACHED = DetachedClient()
@@ -0,0 +1,228 @@
+"""
+Постоянная история сообщений комнат и личных переписок.
+
+Журнал только на дозапись, разбит на сегменты 00000000.log, 00000001.log, ...
+Запись: RECORD (crc32, длина ключа, длина текста, время) + ключ + текст, ключ - комната (#room)
+или личная переписка (conversation()).
+
+- append() только ставит запись в очередь: кодирование, write и fsync делает отдельный поток
+  пачками (group commit), поэтому цикл сервера диска не ждёт;
+- индекс ключ -> (времена, позиции) хранится в памяти и восстанавливается при открытии,
+  оборванная запись в конце последнего сегмента отрезается;
+- закрытые сегменты читаются через mmap, текущий - через pread.
+
+"""
+import logging
+import mmap
+import os
+import threading
+import zlib
+from bisect import bisect_left
+from collections import deque
+from struct import Struct
+from time import time
+
+import common.cfg_server_log as log_config
+from common.variables import ENCODING, HISTORY_BATCH, HISTORY_FLUSH_INTERVAL, HISTORY_LIMIT, HISTORY_SEGMENT_SIZE
+
+RECORD = Struct('!IHId')
+SEGMENT_SUFFIX = '.log'
+# fdatasync есть не везде (нет в macOS): там данные и метаданные сбрасывает fsync
+fdatasync = getattr(os, 'fdatasync', os.fsync)
+
+
+def conversation(first, second):
+    """ Ключ личной переписки не зависит от того, кто кому пишет """
+    return '@' + '|'.join(sorted((first, second)))
+
+
+class Index:
+    """ Записи одного ключа: времена (по возрастанию) и позиции (сегмент, смещение, размер) """
+    __slots__ = ('times', 'places')
+
+    def __init__(self):
+        self.times = []
+        self.places = []
+
+
+class History:
+    __slots__ = ('path', 'segment_size', 'flush_interval', 'logger', 'index', 'pending', 'inflight', 'lock', 'commit_lock',
+                 'wake', 'closed', 'maps', 'number', 'fd', 'size', 'writer')
+
+    def __init__(self, path, segment_size=HISTORY_SEGMENT_SIZE, flush_interval=HISTORY_FLUSH_INTERVAL):
+        self.path = path
+        self.segment_size = segment_size
+        self.flush_interval = flush_interval
+        self.logger = logging.getLogger(log_config.LOGGER_NAME)
+        self.index = {}
+        self.pending = deque()
+        self.inflight = []
+        self.lock = threading.Lock()  # индекс, inflight и текущий сегмент
+        self.commit_lock = threading.Lock()  # одна пачка за раз: поток записи или flush()
+        self.wake = threading.Event()
+        self.closed = False
+        self.maps = {}  # закрытые сегменты: номер -> mmap
+        os.makedirs(path, exist_ok=True)
+        self.__recover()
+        self.writer = threading.Thread(target=self.__run, name='history-writer', daemon=True)
+        self.writer.start()
+
+    def append(self, key, text, stamp=None):
+        """ Вызывается из цикла сервера: только постановка в очередь """
+        self.pending.append((key, time() if stamp is None else stamp, text))
+        if len(self.pending) >= HISTORY_BATCH:
+            self.wake.set()
+
+    def query(self, key, limit=HISTORY_LIMIT, since=None):
+        """
+        Список (время, текст) по возрастанию времени:
+        последние limit сообщений или первые limit сообщений не раньше since.
+
+        """
+        with self.lock:
+            result = []
+            entry = self.index.get(key)
+            if entry is not None:
+                start = 0 if since is None else bisect_left(entry.times, since)
+                places = entry.places[start:]
+                times = entry.times[start:]
+                if since is None:
+                    places, times = places[-limit:], times[-limit:]
+                else:
+                    places, times = places[:limit], times[:limit]
+                result = [(stamp, self.__read(place)) for stamp, place in zip(times, places)]
+            # ещё не записанное на диск
+            for k, stamp, text in self.inflight + list(self.pending):
+                if k == key and (since is None or stamp >= since):
+                    result.append((stamp, text))
+        return result[:limit] if since is not None else result[-limit:]
+
+    def keys(self):
+        with self.lock:
+            return list(self.index)
+
+    def flush(self):
+        """ Синхронная запись очереди (тесты, бенчмарки) """
+        with self.commit_lock:
+            self.__commit()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.wake.set()
+        self.writer.join()
+        os.close(self.fd)
+        for segment in self.maps.values():
+            segment.close()
+        self.maps.clear()
+
+    def __segment(self, number):
+        return os.path.join(self.path, f'{number:08d}{SEGMENT_SUFFIX}')
+
+    def __recover(self):
+        numbers = sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.path)
+                         if name.endswith(SEGMENT_SUFFIX))
+        self.number = numbers[-1] if numbers else 0
+        for number in numbers[:-1]:
+            self.__scan(number, last=False)
+        self.size = self.__scan(self.number, last=True) if numbers else 0
+        self.fd = os.open(self.__segment(self.number), os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        if os.fstat(self.fd).st_size > self.size:
+            self.logger.warning('History: torn tail in %s truncated at %s', self.__segment(self.number), self.size)
+            os.ftruncate(self.fd, self.size)
+
+    def __scan(self, number, last):
+        """ Индексирует сегмент; возвращает длину корректной части """
+        with open(self.__segment(number), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                return 0
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = 0
+        while offset + RECORD.size <= size:
+            crc, key_len, text_len, stamp = RECORD.unpack_from(data, offset)
+            end = offset + RECORD.size + key_len + text_len
+            if end > size or zlib.crc32(data[offset + RECORD.size:end]) != crc:
+                break
+            key = str(data[offset + RECORD.size:offset + RECORD.size + key_len], ENCODING)
+            entry = self.index.get(key)
+            if entry is None:
+                entry = self.index[key] = Index()
+            entry.times.append(stamp)
+            entry.places.append((number, offset, end - offset))
+            offset = end
+        if offset < size and not last:
+            self.logger.error('History: damaged segment %s after %s bytes', self.__segment(number), offset)
+        if last:
+            data.close()
+        else:
+            self.maps[number] = data
+        return offset
+
+    def __read(self, place):
+        number, offset, size = place
+        if number == self.number:
+            record = os.pread(self.fd, size, offset)
+            offset = 0
+        else:
+            record = self.maps.get(number)
+            if record is None:
+                with open(self.__segment(number), 'rb') as f:
+                    record = self.maps[number] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _, key_len, text_len, _ = RECORD.unpack_from(record, offset)
+        start = offset + RECORD.size + key_len
+        return str(record[start:start + text_len], ENCODING)
+
+    def __run(self):
+        while not self.closed:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+        self.flush()
+
+    def __commit(self):
+        """ Одна пачка: один write и один fdatasync, затем обновление индекса """
+        with self.lock:
+            batch = self.inflight = [self.pending.popleft() for _ in range(len(self.pending))]
+        if not batch:
+            return
+        out = bytearray()
+        places = []
+        offset = self.size
+        for key, stamp, text in batch:
+            key_bytes, text_bytes = key.encode(ENCODING), text.encode(ENCODING)
+            body = key_bytes + text_bytes
+            out += RECORD.pack(zlib.crc32(body), len(key_bytes), len(text_bytes), stamp)
+            out += body
+            places.append((offset, RECORD.size + len(body)))
+            offset += RECORD.size + len(body)
+        try:
+            view = memoryview(out)
+            while view:
+                view = view[os.write(self.fd, view):]
+            fdatasync(self.fd)
+        except OSError as e:
+            self.logger.critical('History write failed: %s', e)
+            with self.lock:
+                os.ftruncate(self.fd, self.size)
+                self.pending.extendleft(reversed(batch))
+                self.inflight = []
+            return
+        with self.lock:
+            for (key, stamp, _), (start, size) in zip(batch, places):
+                entry = self.index.get(key)
+                if entry is None:
+                    entry = self.index[key] = Index()
+                entry.times.append(stamp)
+                entry.places.append((self.number, start, size))
+            self.size = offset
+            self.inflight = []
+            if self.size >= self.segment_size:
+                self.__rotate()
+
+    def __rotate(self):
+        os.close(self.fd)
+        self.number += 1
+        self.size = 0
+        self.fd = os.open(self.__segment(self.number), os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
@@ -0,0 +1,51 @@
+from collections import deque
+from time import monotonic
+
+from common.variables import MAILBOX_SIZE, MAILBOX_TTL, MAILBOX_USERS
+
+
+class Mailboxes:
+    """
+    Почтовые ящики офлайн-пользователей: имя -> очередь (время, сообщение).
+    Ограничены размер ящика (старые сообщения вытесняются), срок хранения и число ящиков.
+    Ящик целиком забирается при следующем PRESENCE пользователя.
+
+    """
+    __slots__ = ('boxes', 'size', 'ttl', 'limit')
+
+    def __init__(self, size=MAILBOX_SIZE, ttl=MAILBOX_TTL, limit=MAILBOX_USERS):
+        self.boxes = {}
+        self.size = size
+        self.ttl = ttl
+        self.limit = limit
+
+    def __contains__(self, username):
+        return username in self.boxes
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def put(self, username, message, now=None):
+        now = monotonic() if now is None else now
+        box = self.boxes.get(username)
+        if box is None:
+            if len(self.boxes) >= self.limit:
+                self.expire(now)
+            if len(self.boxes) >= self.limit:
+                # самый давно созданный ящик
+                del self.boxes[next(iter(self.boxes))]
+            box = self.boxes[username] = deque(maxlen=self.size)
+        box.append((now, message))
+
+    def take(self, username, now=None):
+        """ Непросроченные сообщения по порядку; ящик удаляется """
+        box = self.boxes.pop(username, None)
+        if not box:
+            return []
+        deadline = (monotonic() if now is None else now) - self.ttl
+        return [message for stamp, message in box if stamp >= deadline]
+
+    def expire(self, now=None):
+        deadline = (monotonic() if now is None else now) - self.ttl
+        for username in [u for u, box in self.boxes.items() if box[-1][0] < deadline]:
+            del self.boxes[username]
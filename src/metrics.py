@@ -0,0 +1,185 @@
+"""
+Метрики сервера: счётчики, показатели (gauge) и гистограммы в стиле HDR.
+
+Запись дешёвая: счётчик - сложение в словаре, гистограмма - номер корзины по bit_length и сложение.
+Показатели, которые можно вычислить по состоянию сервера (подключения, очереди), не пишутся
+на горячем пути, а считаются функцией в момент чтения.
+Текст в формате Prometheus собирается только по запросу: команда $stats или HTTP /metrics.
+
+"""
+from collections import defaultdict
+from threading import Thread
+
+# Корзины гистограммы: 2**SUB_BITS линейных корзин на каждую степень двойки, погрешность < 1/16
+SUB_BITS = 5
+SUB_COUNT = 1 << SUB_BITS
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def _labels(label, value):
+    return '' if label is None else f'{{{label}="{value}"}}'
+
+
+class Metric:
+    """ Счётчик или показатель; с fn значение (число или словарь метка -> число) вычисляется при чтении """
+    __slots__ = ('name', 'help', 'kind', 'label', 'fn', 'values')
+
+    def __init__(self, name, help, kind, label=None, fn=None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label = label
+        self.fn = fn
+        self.values = defaultdict(int)
+
+    def inc(self, value=None, amount=1):
+        self.values[value] += amount
+
+    def samples(self):
+        values = self.fn() if self.fn is not None else dict(self.values)
+        if not isinstance(values, dict):
+            values = {None: values}
+        return [(f'{self.name}{_labels(self.label, value)}', number) for value, number in values.items()]
+
+
+class Histogram:
+    """
+    Лог-линейная гистограмма целых значений (наносекунды, размеры).
+    Значения меньше SUB_COUNT хранятся точно, дальше - SUB_COUNT / 2 корзин на степень двойки.
+
+    """
+    __slots__ = ('name', 'help', 'scale', 'total', 'buckets')
+
+    kind = 'summary'
+
+    def __init__(self, name, help, scale=1):
+        self.name = name
+        self.help = help
+        self.scale = scale  # множитель при выводе, например 1e-9 для наносекунд -> секунды
+        self.total = 0
+        self.buckets = defaultdict(int)
+
+    def record(self, value):
+        if value < SUB_COUNT:
+            index = value
+        else:
+            shift = value.bit_length() - SUB_BITS
+            index = (shift << SUB_BITS) | (value >> shift)
+        self.buckets[index] += 1
+        self.total += value
+
+    @property
+    def count(self):
+        return sum(dict(self.buckets).values())
+
+    @staticmethod
+    def bucket_value(index):
+        """ Середина корзины """
+        shift, base = index >> SUB_BITS, index & (SUB_COUNT - 1)
+        if not shift:
+            return base
+        return (base << shift) + (1 << (shift - 1))
+
+    def percentile(self, q, buckets=None):
+        """ buckets - снимок корзин, если несколько перцентилей считаются по одному состоянию """
+        buckets = dict(self.buckets) if buckets is None else buckets
+        count = sum(buckets.values())
+        if not count:
+            return 0
+        rank = q * count
+        seen = 0
+        for index in sorted(buckets):
+            seen += buckets[index]
+            if seen >= rank:
+                return self.bucket_value(index)
+        return self.bucket_value(max(buckets))
+
+    def samples(self):
+        buckets = dict(self.buckets)
+        samples = [(f'{self.name}{{quantile="{q}"}}', self.percentile(q, buckets) * self.scale) for q in QUANTILES]
+        samples.append((f'{self.name}_sum', self.total * self.scale))
+        samples.append((f'{self.name}_count', sum(buckets.values())))
+        return samples
+
+
+class Metrics:
+    """ Реестр метрик; имена получают общий префикс """
+    __slots__ = ('prefix', 'metrics')
+
+    def __init__(self, prefix='chat'):
+        self.prefix = prefix
+        self.metrics = []
+
+    def __add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, label=None, fn=None):
+        return self.__add(Metric(f'{self.prefix}_{name}', help, 'counter', label, fn))
+
+    def gauge(self, name, help, fn, label=None):
+        return self.__add(Metric(f'{self.prefix}_{name}', help, 'gauge', label, fn))
+
+    def histogram(self, name, help, scale=1):
+        return self.__add(Histogram(f'{self.prefix}_{name}', help, scale))
+
+    def render(self):
+        """ Текстовый формат Prometheus """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name} {value:g}' for name, value in metric.samples())
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """ Короткий вид для команды $stats: только значения """
+        return [f'{name} {value:g}' for metric in self.metrics for name, value in metric.samples()]
+
+
+class ServerMetrics(Metrics):
+    """ Метрики, которые сервер пишет на горячем пути; показатели состояния сервер регистрирует сам """
+    __slots__ = ('connections', 'requests', 'responses', 'bytes_in', 'bytes_out', 'fanout', 'decode', 'route', 'flush',
+                 'limited')
+
+    def __init__(self, prefix='chat'):
+        super().__init__(prefix)
+        self.connections = self.counter('connections_total', 'Accepted connections')
+        self.requests = self.counter('requests_total', 'Decoded requests by action', 'action')
+        self.responses = self.counter('responses_total', 'Responses queued by code', 'code')
+        self.bytes_in = self.counter('received_bytes_total', 'Bytes of request frames')
+        self.bytes_out = self.counter('sent_bytes_total', 'Bytes of response frames queued for sending')
+        self.fanout = self.histogram('fanout_recipients', 'Recipients of one broadcast or room message')
+        self.decode = self.histogram('decode_seconds', 'Decoding one request frame', 1e-9)
+        self.route = self.histogram('route_seconds', 'Routing one request', 1e-9)
+        self.flush = self.histogram('flush_seconds', 'Writing queued frames at the end of a tick (select engine)', 1e-9)
+        self.limited = self.counter('rate_limited_total', 'Requests rejected by rate limits', 'limit')
+
+
+def serve_metrics(metrics, addr, port):
+    """
+    HTTP /metrics в фоновом потоке; значения читаются без блокировок, допустима небольшая неточность.
+    http.server загружается здесь, а не при импорте: без --metrics-port он серверу не нужен.
+
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = self.server.metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((addr, port), MetricsHandler)
+    httpd.metrics = metrics
+    Thread(target=httpd.serve_forever, name='metrics-http', daemon=True).start()
+    return httpd
@@ -0,0 +1,57 @@
+from array import array
+
+from common.variables import RATE_LIMITS
+
+SESSION = 'session'
+FANOUT = 'fanout'
+
+
+class RateLimiter:
+    """
+    Вёдра токенов для всех соединений сервера.
+    Параметры вёдер общие, у соединения - один array('d'): остатки токенов и время пополнения каждого ведра.
+    Ведро пополняется лениво, при списании: без таймеров и без работы для молчащих соединений.
+
+    """
+    __slots__ = ('names', 'rates', 'bursts', 'size', 'session', 'actions', 'fanout')
+
+    def __init__(self, limits=RATE_LIMITS):
+        self.names = tuple(limits)
+        self.rates = tuple(float(rate) for rate, burst in limits.values())
+        self.bursts = tuple(float(burst) for rate, burst in limits.values())
+        self.size = len(self.names)
+        index = {name: i for i, name in enumerate(self.names)}
+        # вёдра, из которых платит запрос: общее ведро соединения и ведро действия
+        self.session = (index[SESSION],) if SESSION in index else ()
+        self.actions = {name: self.session + (i,) for name, i in index.items() if name not in (SESSION, FANOUT)}
+        self.fanout = (index[FANOUT],) if FANOUT in index else ()
+
+    def new(self, now):
+        """ Состояние нового соединения: вёдра полные """
+        return array('d', self.bursts + (now,) * self.size)
+
+    def allow(self, state, action, now):
+        return self.take(state, self.actions.get(action, self.session), 1, now)
+
+    def allow_fanout(self, state, recipients, now):
+        """ Рассылка стоит по токену на получателя; рассылке больше ёмкости ведра нужно полное ведро """
+        if not self.fanout:
+            return True
+        return self.take(state, self.fanout, min(recipients, self.bursts[self.fanout[0]]), now)
+
+    def take(self, state, buckets, cost, now):
+        """ Списывает cost из всех вёдер buckets или ни из одного """
+        size = self.size
+        for i in buckets:
+            stamp = state[size + i]
+            # запросы одного чтения приходят с одним now: ведро пополняется один раз на пачку
+            if stamp != now:
+                tokens = state[i] + (now - stamp) * self.rates[i]
+                state[i] = tokens if tokens < self.bursts[i] else self.bursts[i]
+                state[size + i] = now
+        for i in buckets:
+            if state[i] < cost:
+                return False
+        for i in buckets:
+            state[i] -= cost
+        return True
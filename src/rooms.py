@@ -0,0 +1,45 @@
+class Rooms:
+    """
+    Реестр комнат: имя комнаты -> множество сессий участников.
+    Обратный индекс пользователь -> комнаты хранится в Session.rooms
+    и обновляется здесь же, вместе с прямым.
+
+    """
+    __slots__ = ('members',)
+
+    def __init__(self):
+        self.members = {}
+
+    def __contains__(self, roomname):
+        return roomname in self.members
+
+    def __len__(self):
+        return len(self.members)
+
+    def get(self, roomname):
+        """ Множество участников или None, если комнаты нет """
+        return self.members.get(roomname)
+
+    def ensure(self, roomname):
+        """ Комната, созданная в другом шарде: пока без локальных участников """
+        self.members.setdefault(roomname, set())
+
+    def create(self, roomname, session):
+        self.members[roomname] = {session}
+        session.rooms.add(roomname)
+
+    def join(self, roomname, session):
+        self.members[roomname].add(session)
+        session.rooms.add(roomname)
+
+    def leave(self, roomname, session):
+        self.members[roomname].discard(session)
+        session.rooms.discard(roomname)
+
+    def leave_all(self, session):
+        for roomname in session.rooms:
+            self.members[roomname].discard(session)
+        session.rooms.clear()
+
+    def names(self):
+        return self.members.keys()
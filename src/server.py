@@ -1,18 +1,40 @@
-import re
+import os
 import argparse
 import logging
-from time import sleep
-from icecream import ic
-from socket import *
-from select import select
+from collections import Counter, deque
+from socket import AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, SO_REUSEPORT, socket
+from secrets import compare_digest, token_urlsafe
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
 from threading import Thread
-import logs.cfg_server_log as log_config
+from time import monotonic, perf_counter_ns
+import common.cfg_server_log as log_config
 from common.decorators import try_except_wrapper
 from common.descriptors import Port
-from common.codes import *
-from common.request_body import Msg, MsgRoom, Room
-from common.utils import *
+from common.codes import (ACCESS, BASIC, CONFLICT, DELIVERED, INCORRECT_REQUEST, NOT_FOUND, OK, QUEUED, RESUMED,
+                          SERVER_ERROR, SERVER_UNAVAILABLE, SESSION_EXPIRED, TOO_MANY_REQUESTS)
+from common.package import Request, Response
+from common.request_body import target_of
+from common.utils import FRAME_HEADER, encode_frame, recv_frames, send_all, send_data, to_package
+from common.variables import (DEFAULT_IP_ADDRESS, DEFAULT_PORT, HISTORY_LIMIT, HISTORY_MAX, IDLE_TIMEOUT, LOG_RATE_LIMIT,
+                              LOST, MAX_CONNECTIONS, MESSAGE, RATE_LIMITS, RECV_BUFFER_SIZE, RESUME_BUFFER, RESUME_GRACE,
+                              RESUME_REPLAY, RESUME_TOKEN_BYTES, SENDER, SEQ, SLOW_CONSUMER_POLICY, TARGET, TEXT, TO,
+                              TOKEN, USERNAME, MessageTarget, RequestAction)
+from common.codecs import ACTION_IDS, UnknownCodecError, decode_message, frame_codec
 from common.metacls import ServerVerifier
+from src.commands import Command, CommandPool, command_responses
+from src.connection import DETACHED, SocketClient, StreamClient, tune_socket
+from src.history import History, conversation
+from src.mailbox import Mailboxes
+from src.ratelimit import FANOUT, RateLimiter
+from src.metrics import ServerMetrics, serve_metrics
+from src.rooms import Rooms
+from src.session import Sessions
+from src.shard import ALL, DRAIN, MAILBOX, ROOM, ROOM_CREATED, USER, run_workers
+from src.timers import TimerWheel
+
+
+# Метка requests_total для действий, которых нет в протоколе
+UNKNOWN_ACTION = 'unknown'
 
 
 class ServerThread(Thread):
@@ -30,203 +52,933 @@ class ServerThread(Thread):
 
 
 class Server(metaclass=ServerVerifier):
-    __slots__ = ('bind_addr', '_port', 'logger', 'socket', 'clients', 'users', 'rooms', 'commands', 'listener', 'subscribers')
+    __slots__ = ('bind_addr', '_port', 'engine', 'slow_consumer', 'bus', 'stats', 'metrics', 'metrics_port', 'logger', 'socket', 'selector', 'dirty', 'sessions', 'rooms', 'mailboxes', 'history', 'routes', 'targets', 'commands', 'pool', 'listener', 'idle_timeout', 'timers', 'limiter', 'resume_grace')
 
     TCP = (AF_INET, SOCK_STREAM)
-    TIMEOUT = 5
+    ENGINES = ('select', 'asyncio')
     port = Port('_port')
 
-    def __init__(self, bind_addr, port):
+    def __init__(self, bind_addr, port, engine='select', slow_consumer=SLOW_CONSUMER_POLICY, bus=None, history=None,
+                 metrics_port=None, idle_timeout=IDLE_TIMEOUT, rate_limits=RATE_LIMITS, resume_grace=RESUME_GRACE):
         self.logger = logging.getLogger(log_config.LOGGER_NAME)
         self.bind_addr = bind_addr
         self.port = port
-        self.clients = []
-        self.users = {}
-        self.subscribers = {}
-        self.rooms = {}
-
-    def start(self, request_count=5):
+        self.engine = engine
+        self.slow_consumer = slow_consumer
+        self.bus = bus
+        self.stats = Counter()
+        self.dirty = set()  # клиенты, которым за текущий такт поставлены кадры
+        self.sessions = Sessions()
+        self.rooms = Rooms()
+        self.mailboxes = Mailboxes()  # в многопроцессном режиме ящики хранит ShardHub
+        self.history = history
+        self.metrics = ServerMetrics()
+        self.metrics_port = metrics_port
+        self.idle_timeout = idle_timeout
+        self.timers = TimerWheel(monotonic())  # сессия -> срок следующей проверки простоя или конца ожидания RESUME
+        self.limiter = RateLimiter(rate_limits) if rate_limits else None
+        self.resume_grace = resume_grace
+        # обработчики запросов по действию; PROBE и RESUME обрабатывает __read_requests
+        self.routes = {
+            RequestAction.PRESENCE: self.__on_presence,
+            RequestAction.QUIT: self.__on_quit,
+            RequestAction.MESSAGE: self.__on_message,
+            RequestAction.JOIN: self.__on_join,
+            RequestAction.LEAVE: self.__on_leave,
+            RequestAction.COMMAND: self.__on_command,
+        }
+        self.targets = {
+            MessageTarget.USER: self.__message_user,
+            MessageTarget.ROOM: self.__message_room,
+            MessageTarget.ALL: self.__message_all,
+        }
+        # команды $<command>: обработчик получает имя пользователя (None - консоль) и аргументы
+        self.commands = {
+            'users': Command(self.__users),
+            'rooms': Command(self.__rooms),
+            'who': Command(self.__who),
+            'stats': Command(self.__stats),
+            'history': Command(self.__history),
+            'kick': Command(self.__kick, inline=True),  # меняет сессии: только в потоке цикла
+        }
+        self.pool = CommandPool()
+        self.__register_gauges()
+
+    def start(self, request_count=MAX_CONNECTIONS):
+        self.listener = ServerThread(lambda: self.serve(request_count), self.logger)
+        self.listener.start()
+        self.__console()
+        self.pool.close()
+        if self.history is not None:
+            self.history.close()
+
+    def serve(self, request_count=MAX_CONNECTIONS):
+        """ Запуск выбранного движка в текущем потоке (без консоли) """
+        shard = '' if self.bus is None else f'| Shard - {self.bus.shard}'
+        self.logger.info('Config server port - %s| Bind address - %s| Engine - %s%s', self.port, self.bind_addr, self.engine, shard)
+        if self.bus is not None:
+            self.bus.open()
+        if self.metrics_port is not None:
+            serve_metrics(self.metrics, self.bind_addr, self.metrics_port)
+        self.pool.open()
+        if self.engine == 'asyncio':
+            import asyncio  # только для этого движка: select-серверу импорт asyncio (и ssl) не нужен
+            asyncio.run(self.__serve(request_count))
+            return
         self.socket = socket(*self.TCP)
-        self.socket.settimeout(0.5)
+        self.socket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        if self.bus is not None:
+            self.socket.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
         self.socket.bind((self.bind_addr, self.port))
-        self.logger.info(f'Config server port - {self.port}| Bind address - {self.bind_addr}')
         self.socket.listen(request_count)
-        self.listener = ServerThread(self.__listen, self.logger)
-        self.listener.start()
-        self.__console()
+        self.socket.setblocking(False)
+        self.selector = DefaultSelector()
+        self.selector.register(self.socket, EVENT_READ)
+        if self.bus is not None:
+            self.selector.register(self.bus, EVENT_READ, self.bus)
+        self.selector.register(self.pool, EVENT_READ, self.pool)
+        self.__listen()
 
     def __console(self):
         while True:
             msg = input('Enter command:\n')
             if msg.upper() == 'Q':
                 break
+            if not msg.strip():
+                continue
             if msg[0] == '#':
                 msg = msg[1:]
 
-            command, *args = msg.split(' ')
-            if command in self.commands:
-                res = self.commands[command](*args)
+            command, *args = msg.split()
+            # консоль - другой поток: команда запускается из потока цикла, как команда клиента
+            self.pool.post(self.__console_command, command, args)
+
+    def __console_command(self, name, args):
+        command = self.commands.get(name)
+        if command is None:
+            print('Command not found')
+        elif command.inline:
+            self.__print_command(command.func, args)
+        elif not self.pool.submit(self.__print_command, command.func, args):
+            print('Too many commands in progress')
+
+    def __print_command(self, func, args):
+        try:
+            for resp in command_responses(func(None, *args)):
+                if isinstance(resp.message, list):
+                    print(*resp.message, sep='\n')
+                else:
+                    print(resp.message)
+        except Exception:
+            self.logger.exception('Console command failed: %s %s', func.__name__, args)
 
     def __listen(self):
+        """
+        Цикл на selectors (epoll в Linux), один такт - конвейер:
+        чтение и декодирование всех готовых кадров всех сокетов -> маршрутизация -> постановка в очереди
+        -> один sendmsg на каждый сокет, которому есть что отправить.
+        EVENT_WRITE только у клиентов, чья очередь не ушла целиком.
+        Раз в тик колеса таймеров - проверка простаивающих соединений и отключённых сессий.
+
+        """
         self.logger.info('Start listen')
+        timeout = self.timers.tick if self.idle_timeout or self.resume_grace else None
+        next_reap = monotonic()
         while True:
-            try:
-                client, addr = self.socket.accept()
-            except OSError:
-                pass
-            except Exception as ex:
-                self.logger.error(ex)
-            else:
-                self.logger.info(f'Connection from {addr}')
-                self.clients.append(client)
-            i_clients, o_clients = [], []
-            try:
-                i_clients, o_clients, ex = select(self.clients, self.clients, [], self.TIMEOUT)
-            except OSError:
-                pass
-            except Exception as ex:
-                self.logger.error(ex)
+            i_clients = []
+            for key, mask in self.selector.select(timeout):
+                client = key.data
+                if client is None:
+                    self.__accept()
+                    continue
+                if client is self.bus:
+                    self.__on_bus(readable=True)
+                    continue
+                if client is self.pool:
+                    self.__on_commands()
+                    continue
+                session = self.sessions.get(client)
+                if session is None:
+                    continue
+                if mask & EVENT_WRITE:
+                    try:
+                        client.flush()
+                    except ConnectionError:
+                        self.__client_disconnect(session)
+                        continue
+                if mask & EVENT_READ:
+                    i_clients.append(session)
 
             requests = self.__get_requests(i_clients)
             if requests:
-                self.__send_responses(requests, o_clients)
+                self.__send_responses(requests)
+            if self.bus is not None and self.bus.pending():
+                self.__on_bus()
+            if timeout is not None:
+                now = monotonic()
+                if now >= next_reap:
+                    self.__reap(now)
+                    next_reap = now + timeout
+            self.__flush()
+
+    def __flush(self):
+        """ Конец такта: всё накопленное для сокета уходит одним sendmsg """
+        dirty = self.dirty
+        if not dirty:
+            return
+        start = perf_counter_ns()
+        while dirty:
+            client = dirty.pop()
+            try:
+                client.flush()
+            except ConnectionError:
+                session = self.sessions.get(client)
+                if session is not None:
+                    self.__client_disconnect(session)
+        self.metrics.flush.record(perf_counter_ns() - start)
+
+    def __accept(self):
+        while True:
+            try:
+                sock, addr = self.socket.accept()
+            except BlockingIOError:
+                return
+            except OSError as ex:
+                self.logger.error(ex)
+                return
+            tune_socket(sock)
+            self.__open_session(SocketClient(sock, addr, self.selector, self.slow_consumer, self.stats, self.dirty))
+
+    def __open_session(self, client):
+        self.logger.info('Connection from %s', client.addr)
+        self.metrics.connections.inc()
+        session = self.sessions.open(client)
+        if self.limiter is not None:
+            session.limits = self.limiter.new(session.last_seen)
+        if self.idle_timeout:
+            self.timers.schedule(session, session.last_seen + self.idle_timeout / 3)
+        return session
+
+    async def __serve(self, request_count):
+        import asyncio
+        self.logger.info('Start listen (asyncio)')
+        server = await asyncio.start_server(
+            self.__handle_connection, self.bind_addr, self.port, backlog=request_count, reuse_address=True,
+            reuse_port=self.bus is not None,
+        )
+        if self.bus is not None:
+            asyncio.get_running_loop().add_reader(self.bus.fileno(), self.__on_bus, True)
+        asyncio.get_running_loop().add_reader(self.pool.fileno(), self.__on_commands)
+        # ссылка держит задачу до конца serve_forever, затем задача отменяется
+        reaper = asyncio.create_task(self.__reaper()) if self.idle_timeout or self.resume_grace else None
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if reaper is not None:
+                reaper.cancel()
+
+    async def __handle_connection(self, reader, writer):
+        """ Корутина одного соединения: чтение кадров и маршрутизация через общий __send_responses """
+        tune_socket(writer.get_extra_info('socket'))
+        session = self.__open_session(StreamClient(writer, self.slow_consumer, self.stats))
+        client = session.client
+        buffer = session.frames
+        try:
+            while client in self.sessions:
+                chunk = await reader.read(RECV_BUFFER_SIZE)
+                if not chunk:
+                    break
+                buffer.feed(chunk)
+                frames = list(buffer.frames)
+                buffer.frames.clear()
+                # после RESUME соединение принадлежит восстановленной сессии
+                requests = self.__read_requests(self.sessions.get(client), frames)
+                if requests:
+                    self.__send_responses(requests)
+                if self.bus is not None and self.bus.pending():
+                    self.__on_bus()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            session = self.sessions.get(client)
+            if session is not None:
+                self.__client_disconnect(session)
+
+    async def __reaper(self):
+        from asyncio import sleep
+        while True:
+            await sleep(self.timers.tick)
+            self.__reap(monotonic())
 
     @try_except_wrapper
     def __get_requests(self, i_clients):
-        requests = {}
-        for client in i_clients:
+        requests = []
+        for session in i_clients:
+            if session.client not in self.sessions:
+                continue
             try:
-                request = get_data(client)
-                requests[client] = request
-
-                if request.action == RequestAction.PRESENCE:
-                    if request.body in self.users:
-                        requests.pop(client)
-                        send_data(client, Response(CONFLICT))
-                        self.clients.remove(client)
-                    else:
-                        self.users[request.body] = client
-                elif request.action == RequestAction.QUIT:
-                    self.__client_disconnect(client)
+                requests.extend(self.__read_requests(session, recv_frames(session.client, session.frames, RECV_BUFFER_SIZE)))
+            except BlockingIOError:
+                continue
             except (ConnectionError, ValueError):
-                self.__client_disconnect(client)
-            except Exception as e:
-                raise e
+                self.__client_disconnect(session)
         return requests
 
-    @try_except_wrapper
-    def __send_responses(self, requests, o_clients):
-
-        for client, i_req in requests.items():
-            other_clients = [c for c in o_clients if c != client]
-            self.logger.info(client)
-            self.logger.info(i_req)
-
-            if i_req.action == RequestAction.PRESENCE:
-                self.__send_to_client(client, Response(OK))
-                self.__send_to_all(other_clients, Response(BASIC, f'{i_req.body} connected'))
-
-            elif i_req.action == RequestAction.QUIT:
-                self.__client_disconnect(client)
-
-            elif i_req.action == RequestAction.MESSAGE:
-                if not re.match(r'#', i_req.body['to']):
-                    msg = Msg.from_dict(i_req.body)
-                    if msg.to.upper() != 'ALL' and msg.to in self.users:
-                        self.__send_to_client(self.users[msg.to], Response(BASIC, str(msg)))
-                    else:
-                        self.__send_to_all(other_clients, Response(BASIC, str(msg)))
-                else:
-                    msg = MsgRoom.from_dict(i_req.body)
-                    if msg.to in self.rooms:
-                        room = self.rooms[msg.to]
-                        room_clients = [v for k, v in room.get_dict().items() if k != msg.sender]
-                        if len(room_clients):
-                            if msg.sender in room.get_dict():
-                                self.__send_to_all(room_clients, Response(BASIC, str(msg)))
-                            else:
-                                self.__send_to_client(self.users[msg.sender], Response(ACCESS))
-                    else:
-                        self.__send_to_client(self.users[msg.sender], Response(NOT_FOUND))
-                        subscribers = {}
-                        subscribers[msg.sender] = self.users[msg.sender]
-                        self.rooms[msg.to] = Room(msg.to, subscribers)
-                        sleep(0.5)
-                        self.__send_to_client(self.users[msg.sender], Response(BASIC, f'Chat {msg.to} created!'))
-                        sleep(0.5)
-                        self.__send_to_client(self.users[msg.sender], Response(BASIC, f'Now you can send a message to the chat {msg.to}'))
-                
-            elif i_req.action == RequestAction.JOIN:
-                user = [k for k, v in self.users.items() if v == client]
-                room = self.rooms[i_req.body]
-                room.get_dict()[user[0]] = client
-                room_clients = [v for k, v in room.get_dict().items() if k != user[0]]
-                self.__send_to_all(room_clients, Response(BASIC, f'{user[0]} JOINED to chat - {i_req.body}!'))
-
-            elif i_req.action == RequestAction.LEAVE:
-                user = [k for k, v in self.users.items() if v == client]
-                room = self.rooms[i_req.body]
-                room.get_dict().pop(user[0])
-                room_clients = room.get_dict().values()
-                self.__send_to_all(room_clients, Response(BASIC, f'{user[0]} LEFT chat!'))
-
-            elif i_req.action == RequestAction.COMMAND:
-                command, *args = i_req.body.split()
-                user = [u for u, c in self.users.items() if c == client].pop()
-                args.insert(0, user)
-                o_resp = self.__execute_command(command, *args)
-                self.__send_to_client(client, o_resp)
-            else:
-                self.__send_to_client(client, Response(INCORRECT_REQUEST))
-                self.logger.error(f'Incorrect request:\n {i_req}')
+    def __read_requests(self, session, frames):
+        """ Кадры одного клиента -> список (session, request); PRESENCE, RESUME, QUIT и PROBE обрабатываются сразу """
+        client = session.client
+        metrics = self.metrics
+        # таймер не переставляется: при срабатывании он сам перенесётся на last_seen + интервал
+        session.last_seen = monotonic()
+        session.probed = False
+        metrics.bytes_in.inc(amount=sum(map(len, frames)) + FRAME_HEADER.size * len(frames))
+        requests = []
+        for frame in frames:
+            start = perf_counter_ns()
+            try:
+                request = to_package(decode_message(frame))
+                if not isinstance(request, Request) or not isinstance(request.action, str):
+                    raise ValueError(f'Not a request: {request}')
+            except UnknownCodecError:
+                self.__answer(session, Response(INCORRECT_REQUEST, 'Unsupported codec'))
+                continue
+            except (ValueError, KeyError, TypeError, AttributeError, RecursionError) as e:
+                # испорченный кадр касается только своего клиента: остальные кадры такта разбираются дальше
+                self.logger.error('Malformed request from %r: %r', session, e)
+                self.__answer(session, Response(INCORRECT_REQUEST, 'Malformed request'))
+                continue
+            metrics.decode.record(perf_counter_ns() - start)
+            # действие задаёт клиент: неизвестные считаются под одной меткой, а не каждое под своей
+            action = request.action
+            metrics.requests.inc(action if action in ACTION_IDS else UNKNOWN_ACTION)
+            session.requests += 1
+            if request.action == RequestAction.PROBE:
+                continue  # ответ на PROBE сервера: достаточно обновлённого last_seen
+            if request.action == RequestAction.RESUME:
+                session = self.__resume(session, request, frame)
+                continue
+            if request.action == RequestAction.PRESENCE:
+                if not isinstance(request.body, str) or not request.body:
+                    resp = Response(INCORRECT_REQUEST, 'Username required')
+                    resp.id = request.id
+                    self.__answer(session, resp, frame_codec(frame))
+                    continue
+                # вход не ограничивается; повторный PRESENCE рассылается всем и в режиме шардов стоит claim через шину
+                if session.username is not None and self.limiter is not None:
+                    if not self.limiter.allow(session.limits, request.action, session.last_seen):
+                        self.__reject(session, request, request.action)
+                        continue
+                    if not self.__allow_fanout(session, request, len(self.sessions.by_name) - 1):
+                        continue
+                owner = self.sessions.find(request.body)
+                conflict = owner is not None and owner is not session
+                if not conflict and owner is None and self.bus is not None:
+                    conflict = not self.bus.claim(request.body)
+                if conflict:
+                    resp = Response(CONFLICT)
+                    resp.id = request.id
+                    self.__answer(session, resp, frame_codec(frame))
+                    if session.username is None:
+                        self.sessions.close(client)
+                        client.flush()  # отказ уходит до закрытия, не дожидаясь конца такта
+                        client.close()
+                        break
+                    continue
+                if self.bus is not None and session.username not in (None, request.body):
+                    self.bus.release(session.username)
+                self.sessions.bind(session, request.body)
+                session.codec = frame_codec(frame)
+                if self.resume_grace:
+                    session.token = token_urlsafe(RESUME_TOKEN_BYTES)
+                    session.replay = deque(maxlen=RESUME_REPLAY)
+                    session.seq = session.lost = client.shed = 0
+            elif request.action == RequestAction.QUIT:
+                self.__client_disconnect(session, resumable=False)
+                break
+            requests.append((session, request))
+        return requests
 
     @try_except_wrapper
-    def __send_to_client(self, client, resp):
+    def __send_responses(self, requests):
+        route = self.metrics.route
+        limiter = self.limiter
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        for session, i_req in requests:
+            if session.client not in self.sessions:
+                continue
+            if debug:
+                self.logger.debug('%r %s', session, i_req)
+            start = perf_counter_ns()
+            try:
+                # время пополнения вёдер - время чтения запросов, отдельный вызов часов не нужен;
+                # PRESENCE уже проверен при чтении, до claim
+                if limiter is not None and i_req.action != RequestAction.PRESENCE \
+                        and not limiter.allow(session.limits, i_req.action, session.last_seen):
+                    self.__reject(session, i_req, i_req.action)
+                    continue
+                self.__route(session, i_req)
+            except Exception as ex:
+                # тело запроса задаёт клиент: ошибка одного запроса не прерывает такт остальных
+                self.logger.error('Incorrect request %s: %r', i_req, ex)
+                if session.client in self.sessions:
+                    self.__reply(session, i_req, Response(INCORRECT_REQUEST))
+                continue
+            route.record(perf_counter_ns() - start)
+
+    def __route(self, session, i_req):
+        """ Маршрутизация одного запроса: обработчик по действию из таблицы self.routes """
+        handler = self.routes.get(i_req.action)
+        if handler is None:
+            self.__reply(session, i_req, Response(INCORRECT_REQUEST))
+            self.logger.error('Incorrect request:\n %s', i_req)
+            return
+        handler(session, i_req)
+
+    def __on_presence(self, session, i_req):
+        # токен RESUME и номер этого ответа в буфере повтора: с него клиент считает полученные кадры
+        self.__reply(session, i_req, Response(OK, session.token and {TOKEN: session.token, SEQ: session.seq + 1}))
+        if self.bus is None:
+            self.__deliver_mailbox(session, self.mailboxes.take(session.username))
+        self.__broadcast(Response(BASIC, f'{i_req.body} connected'), session)
+
+    def __on_quit(self, session, i_req):
+        self.__client_disconnect(session, resumable=False)
+
+    def __on_message(self, session, i_req):
+        """ Адресата разобрал клиент (target); у старых клиентов без target тип выводится из имени, без regex """
+        body = i_req.body
+        handler = self.targets.get(body.get(TARGET) or target_of(body[TO]))
+        if handler is None:
+            self.__reply(session, i_req, Response(INCORRECT_REQUEST, 'Unknown message target'))
+            return
+        handler(session, i_req, body)
+
+    def __message_user(self, session, i_req, body):
+        to = body[TO]
+        # текст как str(Msg.from_dict(body)), без промежуточного объекта
+        resp = Response(BASIC, f'{body[SENDER]} to @{to}: {body[TEXT]}')
+        resp.time = i_req.time  # время пересылаемого сообщения - время отправки
+        if self.__send_to_user(to, resp, session.username):
+            self.__reply(session, i_req, Response(DELIVERED))
+        else:
+            self.__queue_offline(to, resp, session.username)
+            self.__reply(session, i_req, Response(QUEUED))
+        if self.history is not None:
+            self.history.append(conversation(session.username, to), resp.message)
+
+    def __message_all(self, session, i_req, body):
+        if self.__allow_fanout(session, i_req, len(self.sessions.by_name) - 1):
+            resp = Response(BASIC, f'{body[SENDER]} to @{body[TO]}: {body[TEXT]}')
+            resp.time = i_req.time
+            self.__broadcast(resp, session)
+            self.__ack(session, i_req, DELIVERED)
+
+    def __message_room(self, session, i_req, body):
+        to = body[TO]
+        members = self.rooms.get(to)
+        if members is None:
+            # очередь соединения сохраняет порядок уведомлений, ждать между ними не нужно
+            self.rooms.create(to, session)
+            if self.bus is not None:
+                self.bus.publish(ROOM_CREATED, room=to)
+            self.__reply(session, i_req, Response(NOT_FOUND))
+            self.__reply(session, i_req, Response(BASIC, f'Chat {to} created!'))
+            self.__reply(session, i_req, Response(BASIC, f'Now you can send a message to the chat {to}'))
+        elif session not in members:
+            self.__reply(session, i_req, Response(ACCESS))
+        elif self.__allow_fanout(session, i_req, len(members) - 1):
+            resp = Response(BASIC, f'{body[SENDER]} to {to}: {body[TEXT]}')
+            resp.time = i_req.time
+            self.__send_to_room(to, resp, session)
+            self.__ack(session, i_req, DELIVERED)
+            if self.history is not None:
+                self.history.append(to, resp.message)
+
+    def __on_join(self, session, i_req):
+        if i_req.body not in self.rooms:
+            self.__reply(session, i_req, Response(NOT_FOUND))
+            return
+        self.rooms.join(i_req.body, session)
+        self.__send_to_room(i_req.body, Response(BASIC, f'{session.username} JOINED to chat - {i_req.body}!'), session)
+        self.__ack(session, i_req)
+
+    def __on_leave(self, session, i_req):
+        if i_req.body not in self.rooms:
+            self.__reply(session, i_req, Response(NOT_FOUND))
+            return
+        self.rooms.leave(i_req.body, session)
+        self.__send_to_room(i_req.body, Response(BASIC, f'{session.username} LEFT chat!'))
+        self.__ack(session, i_req)
+
+    def __on_command(self, session, i_req):
+        """ Команда выполняется в пуле, ответ (или его страницы) приходит позже с номером запроса """
+        # тело задаёт клиент: не строка или пустая строка - такой команды нет
+        words = i_req.body.split() if isinstance(i_req.body, str) else None
+        command = self.commands.get(words[0]) if words else None
+        args = words[1:] if command is not None else ()
+        if command is None:
+            self.__reply(session, i_req, Response(INCORRECT_REQUEST, 'Command not found'))
+        elif command.inline:
+            for resp in command_responses(command.func(session.username, *args)):
+                self.__reply(session, i_req, resp)
+        elif not self.pool.submit(self.__run_command, session, i_req, command.func, args):
+            self.__reply(session, i_req, Response(SERVER_UNAVAILABLE, 'Too many commands in progress'))
+
+    def __run_command(self, session, i_req, func, args):
+        """ Поток пула: страницы ответа отправляет поток цикла, по мере готовности """
         try:
-            send_data(client, resp)
+            for resp in command_responses(func(session.username, *args)):
+                self.pool.post(self.__command_reply, session, i_req, resp)
+        except Exception:
+            self.logger.exception('Command failed: %s', i_req.body)
+            self.pool.post(self.__command_reply, session, i_req, Response(SERVER_ERROR, 'Command error'))
+
+    def __on_commands(self):
+        """ Поток цикла: ответы команд и вызовы консоли, накопленные пулом """
+        for func, args in self.pool.drain():
+            func(*args)
+
+    def __command_reply(self, session, i_req, resp):
+        # пока команда выполнялась, сессия могла закрыться; отключённой ответ уйдёт в буфер повтора
+        if session.client in self.sessions or (session.client is DETACHED and self.sessions.find(session.username) is session):
+            self.__reply(session, i_req, resp)
+
+    def __allow_fanout(self, session, i_req, recipients):
+        """ Сообщение в комнату или всем стоит по токену на получателя """
+        if self.limiter is None or self.limiter.allow_fanout(session.limits, recipients, session.last_seen):
+            return True
+        self.__reject(session, i_req, FANOUT)
+        return False
+
+    def __reject(self, session, i_req, limit):
+        self.metrics.limited.inc(limit)
+        self.__reply(session, i_req, Response(TOO_MANY_REQUESTS, f'Too many requests: {limit} limit'))
+
+    def __answer(self, session, resp, codec=None):
+        """
+        Ответ до маршрутизации (отказ во входе, незнакомый кодек): вошедшему клиенту - как любой кадр сессии,
+        чтобы не разошёлся счёт кадров для RESUME; ещё не вошедшему - в кодеке его запроса.
+
+        """
+        if session.codec is None:
+            send_data(session.client, resp, codec)
+        else:
+            self.__send_to_client(session, resp)
+
+    def __reply(self, session, i_req, resp):
+        """ Ответ на запрос несёт его номер: клиент сопоставляет ответы конвейерных запросов """
+        resp.id = i_req.id
+        self.__send_to_client(session, resp)
+
+    def __ack(self, session, i_req, code=OK):
+        """ Успех без ответа по протоколу подтверждается, только если клиент ждёт ответа (у запроса есть номер) """
+        if i_req.id is not None:
+            self.__reply(session, i_req, Response(code))
+
+    def __send_to_client(self, session, resp):
+        self.metrics.responses.inc(resp.code)
+        self.__send_frame(session, encode_frame(resp, session.codec))
+
+    def __send_to_user(self, username, resp, sender=None):
+        """ Личное сообщение, в т.ч. пользователю другого шарда; False - пользователь не найден """
+        target = self.sessions.find(username)
+        if target is not None and target.client is not DETACHED:
+            self.__send_to_client(target, resp)
+            return True
+        if self.bus is not None and self.bus.remote(username):
+            self.bus.publish(USER, to=username, sender=sender, package=resp.get_dict())
+            return True
+        return False
+
+    def __queue_offline(self, username, resp, sender):
+        """
+        Пользователь не в сети: сообщение ждёт его PRESENCE в почтовом ящике.
+        Отключённому, но ещё ждущему RESUME - тоже: буфер повтора ограничен и пропадает вместе с сессией.
+
+        """
+        if self.bus is not None:
+            self.bus.publish(MAILBOX, to=username, sender=sender, package=resp.get_dict())
+        else:
+            self.mailboxes.put(username, resp)
+
+    def __deliver_mailbox(self, session, responses):
+        """ Весь ящик уходит одной записью в сокет """
+        if responses:
+            for resp in responses:
+                self.metrics.responses.inc(resp.code)
+            self.__send_frame(session, *[encode_frame(resp, session.codec) for resp in responses])
+
+    def __broadcast(self, resp, exclude=None):
+        """ Всем пользователям, включая подключённых к другим шардам """
+        self.__send_to_all(self.sessions.users(), resp, exclude)
+        if self.bus is not None:
+            self.bus.publish(ALL, package=resp.get_dict())
+
+    def __send_to_room(self, roomname, resp, exclude=None):
+        self.__send_to_all(self.rooms.get(roomname), resp, exclude)
+        if self.bus is not None:
+            self.bus.publish(ROOM, room=roomname, package=resp.get_dict())
+
+    def __send_to_all(self, sessions, resp, exclude=None):
+        """ Рассылка: пакет кодируется один раз на кодек, всем уходит один и тот же bytes-объект """
+        frames = {}
+        dead = []
+        sent = size = 0
+        for session in sessions:
+            if session is exclude:
+                continue
+            frame = frames.get(session.codec)
+            if frame is None:
+                frame = frames[session.codec] = encode_frame(resp, session.codec)
+            # кадр в буфере повтора до отправки: не ушедший из-за разрыва повторится после RESUME
+            if session.replay is not None:
+                session.replay.append(frame)
+                session.seq += 1
+            try:
+                send_all(session.client, frame)
+                session.responses += 1
+                sent += 1
+                size += len(frame)
+            except ConnectionError:
+                dead.append(session)
+        metrics = self.metrics
+        metrics.fanout.record(sent)
+        metrics.responses.inc(resp.code, sent)
+        metrics.bytes_out.inc(amount=size)
+        for session in dead:
+            self.__client_disconnect(session)
+
+    def __send_frame(self, session, *frames):
+        """ Несколько кадров уходят одной записью, в буфер повтора - по отдельности """
+        data = frames[0] if len(frames) == 1 else b''.join(frames)
+        self.metrics.bytes_out.inc(amount=len(data))
+        if session.replay is not None:
+            session.replay.extend(frames)
+            session.seq += len(frames)
+        try:
+            send_all(session.client, data)
+            session.responses += len(frames)
         except ConnectionError:
-            self.__client_disconnect(client)
-        except Exception as e:
-            raise e
-
-    def __send_to_all(self, clients, resp):
-        for cl in clients:
-            self.__send_to_client(cl, resp)
+            self.__client_disconnect(session)
+
+    def __reap(self, now):
+        """
+        Сработавшие таймеры колеса - работа пропорциональна их числу, а не числу соединений.
+        Молчавшему треть idle_timeout уходит PROBE, молчавший idle_timeout отключается;
+        отключённая сессия, не дождавшаяся RESUME, закрывается.
+
+        """
+        probe_after = self.idle_timeout / 3
+        for session in self.timers.advance(now):
+            if session.client is DETACHED:
+                self.__expire(session)
+                continue
+            if session.client not in self.sessions:
+                continue
+            idle = now - session.last_seen
+            if idle >= self.idle_timeout:
+                self.stats['idle_reaped'] += 1
+                self.logger.info('Idle timeout: %r', session)
+                self.__client_disconnect(session)
+            elif idle >= probe_after:
+                self.timers.schedule(session, session.last_seen + self.idle_timeout)
+                if not session.probed:
+                    session.probed = True
+                    self.stats['probes_sent'] += 1
+                    self.__send_frame(session, encode_frame(Request(RequestAction.PROBE), session.codec))
+            else:
+                self.timers.schedule(session, session.last_seen + probe_after)
 
     @try_except_wrapper
-    def __client_disconnect(self, client):
-        self.clients.remove(client)
-        disconnected_user = [u for u, c in self.users.items() if c == client].pop()
-        self.users.pop(disconnected_user)
-        disconnection_response = Response(BASIC, f'{disconnected_user} disconnected')
-        for cl in self.clients:
-            send_data(cl, disconnection_response)
-
-    def __execute_command(self, command, *args):
-        if command in self.commands:
-            answer = self.commands[command](*args)
-            if answer is False:
-                return Response(SERVER_ERROR, 'Command error')
-            elif isinstance(answer, list):
-                answer = [str(a) for a in answer]
-                return Response(ANSWER, answer)
-            elif answer is None:
-                return Response(ANSWER, 'Done')
-            return Response(ANSWER, answer)
+    def __client_disconnect(self, session, resumable=True):
+        """ resumable - разрыв без QUIT: сессия с токеном ждёт RESUME, а не закрывается """
+        client = session.client
+        if client not in self.sessions:
+            return
+        client.close()
+        if resumable and session.token is not None:
+            self.__detach(session)
+            return
+        self.sessions.close(client)
+        self.timers.cancel(session)
+        self.__end_session(session)
+
+    def __end_session(self, session):
+        self.rooms.leave_all(session)
+        if session.username is None:
+            return
+        if self.bus is not None:
+            self.bus.release(session.username)
+        self.__broadcast(Response(BASIC, f'{session.username} disconnected'))
+
+    def __detach(self, session):
+        """
+        Сессия без соединения: имя, комнаты и вёдра токенов сохраняются на resume_grace секунд,
+        рассылки копятся в буфере повтора. Для остальных пользователей она по-прежнему в сети.
+
+        """
+        self.__count_shed(session)
+        self.sessions.detach(session.client)
+        session.client = DETACHED
+        session.replay = deque(session.replay, maxlen=RESUME_BUFFER)
+        self.timers.schedule(session, monotonic() + self.resume_grace)
+        self.stats['sessions_detached'] += 1
+        self.logger.info('Detached, waiting for resume: %r', session)
+
+    def __count_shed(self, session):
+        """
+        Соединение уходит от сессии: выброшенные им кадры (policy='shed') клиент не получил.
+        Выбрасываются самые старые кадры очереди, поэтому неполученный хвост - последние seq - (номер клиента)
+        кадров буфера повтора, а выброшенные RESUME сообщает как потерянные.
+
+        """
+        session.seq -= session.client.shed
+        session.lost += session.client.shed
+
+    def __expire(self, session):
+        self.sessions.forget(session)
+        self.stats['sessions_expired'] += 1
+        self.logger.info('Resume timeout: %r', session)
+        self.__end_session(session)
+
+    def __resume(self, session, i_req, frame):
+        """
+        RESUME: новое соединение продолжает сессию по токену, выданному при PRESENCE.
+        Клиент сообщает номер последнего полученного кадра, сервер повторяет только следующие за ним
+        (сколько их осталось в буфере повтора). Возвращает сессию, которой теперь принадлежит соединение.
+
+        """
+        client = session.client
+        body = i_req.body if isinstance(i_req.body, dict) else {}
+        target = self.sessions.find(body.get(USERNAME))
+        token = body.get(TOKEN)
+        seq = body.get(SEQ)
+        if session.username is not None or target is None or target.token is None or not isinstance(token, str) \
+                or not isinstance(seq, int) or not compare_digest(target.token, token):
+            resp = Response(SESSION_EXPIRED)
+            resp.id = i_req.id
+            self.__answer(session, resp, frame_codec(frame))
+            return session
+        if target.client is not DETACHED:  # старое соединение ещё не признано разорванным
+            self.__count_shed(target)
+            self.sessions.detach(target.client)
+            target.client.close()
+        self.timers.cancel(session)
+        self.sessions.attach(target, client)
+        target.client = client
+        target.frames = session.frames  # байты после RESUME уже в буфере нового соединения
+        target.codec = frame_codec(frame)
+        target.last_seen = session.last_seen
+        target.probed = False
+        target.requests += session.requests
+        if self.idle_timeout:
+            self.timers.schedule(target, target.last_seen + self.idle_timeout / 3)
         else:
-            return Response(INCORRECT_REQUEST, 'Command not found')
+            self.timers.cancel(target)
+
+        replay = list(target.replay)
+        missing = target.seq - seq
+        frames = replay[-missing:] if 0 < missing else []
+        target.replay = deque(replay, maxlen=RESUME_REPLAY)
+        lost = target.lost + max(0, missing - len(frames))
+        target.lost = 0
+        # ответ и повтор не записываются в буфер: номер в ответе - последний кадр до повторённых
+        resp = Response(RESUMED, {TOKEN: target.token, SEQ: target.seq - len(frames), LOST: lost})
+        resp.id = i_req.id
+        self.metrics.responses.inc(resp.code)
+        send_data(client, resp, target.codec)
+        if frames:
+            data = b''.join(frames)
+            self.metrics.bytes_out.inc(amount=len(data))
+            send_all(client, data)
+        self.stats['sessions_resumed'] += 1
+        self.logger.info('Resumed: %r, replayed %s frames', target, len(frames))
+        if self.bus is None:
+            self.__deliver_mailbox(target, self.mailboxes.take(target.username))
+        return target
+
+    def __on_bus(self, readable=False):
+        """ Доставка сообщений, пришедших из других шардов """
+        try:
+            deliveries = self.bus.read(readable)
+        except (ConnectionError, ValueError) as e:
+            self.logger.critical('Shard bus lost: %s', e)
+            raise SystemExit(1)
+        for message in deliveries:
+            op = message['op']
+            if op == ROOM_CREATED:
+                self.rooms.ensure(message['room'])
+                continue
+            if op == DRAIN:
+                self.__on_drain(message)
+                continue
+            resp = Response.from_dict(message['package'])
+            if op == USER:
+                target = self.sessions.find(message['to'])
+                if target is not None:
+                    self.__send_to_client(target, resp)
+                    # у каждого шарда своя история: переписку записывают шарды обоих собеседников
+                    if self.history is not None and message.get('sender'):
+                        self.history.append(conversation(message['sender'], message['to']), resp.message)
+            elif op == ALL:
+                self.__send_to_all(self.sessions.users(), resp)
+            elif op == ROOM:
+                members = self.rooms.get(message['room'])
+                if members:
+                    self.__send_to_all(members, resp)
+                if self.history is not None:
+                    self.history.append(message['room'], resp.message)
+
+    def __on_drain(self, message):
+        """ Почтовый ящик пользователя, только что занявшего имя в этом шарде """
+        username = message['to']
+        target = self.sessions.find(username)
+        if target is None:
+            for item in message['messages']:
+                self.bus.publish(MAILBOX, to=username, sender=item['sender'], package=item['package'])
+            return
+        self.__deliver_mailbox(target, [Response.from_dict(item['package']) for item in message['messages']])
+        if self.history is not None:
+            for item in message['messages']:
+                if item['shard'] != self.bus.shard:  # шард отправителя уже записал сообщение
+                    self.history.append(conversation(item['sender'], username), item['package'][MESSAGE])
+
+    def __register_gauges(self):
+        """ Показатели состояния считаются при чтении метрик, горячий путь их не трогает """
+        metrics = self.metrics
+        metrics.gauge('sessions', 'Open connections', lambda: len(self.sessions))
+        metrics.gauge('users', 'Connections that sent PRESENCE', lambda: len(self.sessions.by_name))
+        metrics.gauge('rooms', 'Known rooms', lambda: len(self.rooms))
+        metrics.gauge('outbox_bytes', 'Bytes queued in client outboxes',
+                      lambda: sum(s.client.pending() for s in list(self.sessions.sessions())))
+        metrics.gauge('outbox_max_bytes', 'Largest client outbox',
+                      lambda: max((s.client.pending() for s in list(self.sessions.sessions())), default=0))
+        metrics.gauge('mailboxes', 'Offline mailboxes', lambda: len(self.mailboxes))
+        metrics.gauge('history_pending', 'Messages waiting for group commit',
+                      lambda: 0 if self.history is None else len(self.history.pending))
+        metrics.counter('connection_events_total', 'Slow consumer and idle connection handling', 'event',
+                        lambda: dict(self.stats))
+        metrics.gauge('timers', 'Sessions in the idle timer wheel', lambda: len(self.timers))
+        metrics.gauge('detached', 'Sessions waiting for RESUME',
+                      lambda: sum(1 for s in list(self.sessions.users()) if s.client is DETACHED))
+        metrics.gauge('commands', 'Server commands in progress', lambda: self.pool.inflight)
+
+    def __users(self, username, *args):
+        """ users - пользователи этого сервера (шарда); ждущие RESUME помечены """
+        # обработчики выполняются в пуле: list() снимает копию словаря, который меняет поток цикла
+        for name, session in sorted(list(self.sessions.by_name.items())):
+            yield f'{name} (reconnecting)' if session.client is DETACHED else name
+
+    def __rooms(self, username, *args):
+        """ rooms - комнаты и число участников """
+        for name, members in sorted(list(self.rooms.members.items())):
+            yield f'{name} {len(members)}'
+
+    def __who(self, username, room=None, *args):
+        """ who <#room> - участники комнаты """
+        if room is None:
+            return Response(INCORRECT_REQUEST, 'Usage: who <#room>')
+        members = self.rooms.get(room)
+        if members is None:
+            return Response(NOT_FOUND)
+        return sorted(session.username for session in list(members))
+
+    def __stats(self, username, *args):
+        """ stats - текущие значения метрик сервера """
+        return self.metrics.summary()
+
+    def __kick(self, username, target=None, *reason):
+        """ kick <user> [reason] - отключить пользователя без права RESUME; только из консоли сервера """
+        if username is not None:
+            return Response(ACCESS, 'Only the server console can kick users')
+        if target is None:
+            return Response(INCORRECT_REQUEST, 'Usage: kick <user> [reason]')
+        session = self.sessions.find(target)
+        if session is None:
+            return Response(NOT_FOUND)
+        if session.client is DETACHED:
+            self.sessions.forget(session)
+            self.timers.cancel(session)
+            self.__end_session(session)
+        else:
+            notice = 'Kicked by the server' + (': ' + ' '.join(reason) if reason else '')
+            # QUIT от сервера: клиент не переподключается
+            self.__send_frame(session, encode_frame(Response(BASIC, notice), session.codec),
+                              encode_frame(Request(RequestAction.QUIT), session.codec))
+            session.client.flush()  # уведомление уходит до закрытия, не дожидаясь конца такта
+            self.__client_disconnect(session, resumable=False)
+        self.stats['sessions_kicked'] += 1
+        self.logger.info('Kicked: %s', target)
+        return f'{target} kicked'
+
+    def __history(self, username, target=None, *args):
+        """ history <#room|user> [N | since <timestamp>] - последние N сообщений или сообщения начиная с момента """
+        if self.history is None:
+            return Response(SERVER_UNAVAILABLE, 'History is disabled')
+        if target is None:
+            return Response(INCORRECT_REQUEST, 'Usage: history <#room|user> [N | since <timestamp>]')
+        limit, since = HISTORY_LIMIT, None
+        try:
+            if args and args[0] == 'since':
+                since = float(args[1])
+            elif args:
+                limit = int(args[0])
+        except (IndexError, ValueError):
+            return Response(INCORRECT_REQUEST, 'Usage: history <#room|user> [N | since <timestamp>]')
+        if target.startswith('#'):
+            session = self.sessions.find(username)
+            if target not in self.rooms:
+                return Response(NOT_FOUND)
+            if username is not None and (session is None or target not in session.rooms):
+                return Response(ACCESS)
+            key = target
+        elif username is None:
+            return Response(INCORRECT_REQUEST, 'Console reads room history only')
+        else:
+            key = conversation(username, target.lstrip('@'))
+        messages = self.history.query(key, max(1, min(limit, HISTORY_MAX)), since)
+        return [f'[{stamp:.3f}] {text}' for stamp, text in messages]
 
 
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("-p", "--port", type=int, default=DEFAULT_PORT, nargs='?', help='Port [default=7777]')
     parser.add_argument("-a", "--addr", type=str, default=DEFAULT_IP_ADDRESS, nargs='?', help='Bind address')
+    parser.add_argument("-e", "--engine", type=str, default='select', choices=Server.ENGINES, help='Server engine [default=select]')
+    parser.add_argument("--slow-consumer", type=str, default=SLOW_CONSUMER_POLICY, choices=('drop', 'shed'), help='Slow client policy')
+    parser.add_argument("-w", "--workers", type=int, default=1, help='Worker processes sharing the port [default=1]')
+    parser.add_argument("--history", type=str, default=None, help='Message history directory [default=disabled]')
+    parser.add_argument("--log-level", type=str, default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'), help='Log level')
+    parser.add_argument("--log-json", action='store_true', help='Write the log as JSON lines')
+    parser.add_argument("--log-sync", action='store_true', help='Write the log from the server thread (no queue)')
+    parser.add_argument("--log-rate", type=int, default=LOG_RATE_LIMIT, help='Records per second below WARNING, 0 - unlimited')
+    parser.add_argument("--metrics-port", type=int, default=None, help='HTTP /metrics port, +shard number per worker')
+    parser.add_argument("--no-rate-limit", action='store_true', help='Disable per-connection rate limits')
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT, help='Disconnect silent clients after N seconds, 0 - never')
+    parser.add_argument("--resume-grace", type=float, default=RESUME_GRACE, help='Keep a dropped session for RESUME N seconds, 0 - never')
     return parser
 
 
+def open_history(path, shard=None):
+    """ У каждого шарда свой журнал: запись в один каталог идёт только из одного процесса """
+    if path is None:
+        return None
+    return History(path if shard is None else os.path.join(path, f'shard{shard}'))
+
+
 def run():
-    args = parse_args()
-    server = Server(args.addr, args.port)
+    args = parse_args().parse_args()
+    log_config.configure(logging.getLevelName(args.log_level), args.log_json, not args.log_sync, args.log_rate)
+    if args.workers > 1:
+        run_workers(args.workers, lambda bus: Server(
+            args.addr, args.port, args.engine, args.slow_consumer, bus, open_history(args.history, bus.shard),
+            None if args.metrics_port is None else args.metrics_port + bus.shard, args.idle_timeout,
+            None if args.no_rate_limit else RATE_LIMITS, args.resume_grace))
+        return
+    server = Server(args.addr, args.port, args.engine, args.slow_consumer, history=open_history(args.history),
+                    metrics_port=args.metrics_port, idle_timeout=args.idle_timeout,
+                    rate_limits=None if args.no_rate_limit else RATE_LIMITS, resume_grace=args.resume_grace)
     server.start()
 
 
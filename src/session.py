@@ -0,0 +1,96 @@
+from time import monotonic
+
+from common.utils import FrameBuffer
+
+
+class Session:
+    """ Состояние одного подключения: пользователь, комнаты, буфер кадров, кодек, статистика """
+    __slots__ = ('client', 'username', 'rooms', 'frames', 'codec', 'requests', 'responses', 'connected_at', 'last_seen',
+                 'probed', 'limits', 'token', 'replay', 'seq', 'lost')
+
+    def __init__(self, client):
+        self.client = client
+        self.username = None
+        self.rooms = set()
+        self.frames = FrameBuffer()
+        self.codec = None
+        self.requests = 0
+        self.responses = 0
+        self.connected_at = self.last_seen = monotonic()
+        self.probed = False  # PROBE отправлен, ответа (любых входящих данных) ещё не было
+        self.limits = None  # вёдра токенов, см. RateLimiter
+        self.token = None  # токен RESUME, выдаётся при PRESENCE
+        self.replay = None  # последние кадры сессии для повтора после RESUME
+        self.seq = 0  # кадров записано в буфер повтора с выдачи токена (без выброшенных соединением)
+        self.lost = 0  # кадров выброшено медленным соединением (policy='shed') с последнего RESUME
+
+    def __repr__(self):
+        return f'<Session {self.username} {self.client!r}>'
+
+
+class Sessions:
+    """
+    Реестр сессий с двумя индексами: по клиенту (сокету) и по имени пользователя.
+    Оба поиска - O(1), индексы согласуются при PRESENCE, смене имени и отключении.
+
+    """
+    __slots__ = ('by_client', 'by_name')
+
+    def __init__(self):
+        self.by_client = {}
+        self.by_name = {}
+
+    def __len__(self):
+        return len(self.by_client)
+
+    def __contains__(self, client):
+        return client in self.by_client
+
+    def open(self, client):
+        session = Session(client)
+        self.by_client[client] = session
+        return session
+
+    def get(self, client):
+        return self.by_client.get(client)
+
+    def find(self, username):
+        return self.by_name.get(username)
+
+    def bind(self, session, username):
+        """ Привязка имени к сессии; повторный PRESENCE с другим именем освобождает старое """
+        if session.username is not None and self.by_name.get(session.username) is session:
+            del self.by_name[session.username]
+        session.username = username
+        self.by_name[username] = session
+
+    def detach(self, client):
+        """ Соединение закрыто, но сессия с именем остаётся до RESUME или истечения срока """
+        return self.by_client.pop(client, None)
+
+    def attach(self, session, client):
+        """ RESUME: новое соединение продолжает сессию (временная сессия соединения заменяется) """
+        self.by_client[client] = session
+
+    def forget(self, session):
+        if self.by_name.get(session.username) is session:
+            del self.by_name[session.username]
+
+    def close(self, client):
+        session = self.by_client.pop(client, None)
+        if session is not None and self.by_name.get(session.username) is session:
+            del self.by_name[session.username]
+        return session
+
+    def clients(self):
+        return self.by_client.keys()
+
+    def sessions(self):
+        return self.by_client.values()
+
+    def users(self):
+        """ Сессии, прошедшие PRESENCE """
+        return self.by_name.values()
+
+    def usernames(self):
+        return self.by_name.keys()
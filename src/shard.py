@@ -0,0 +1,250 @@
+"""
+Многопроцессный режим сервера (--workers N).
+
+N рабочих процессов слушают один порт через SO_REUSEPORT, ядро распределяет между ними подключения.
+Родительский процесс держит ShardHub - шину на Unix-сокете и общий справочник имя -> шард:
+- PRESENCE занимает имя через синхронный claim, поэтому CONFLICT корректен для всех шардов;
+- справочник реплицируется в каждый шард (bind / unbind), поиск адресата локальный;
+- личные сообщения, рассылки ALL и сообщения комнат пересылаются в другие шарды через шину;
+- почтовые ящики офлайн-пользователей хранятся здесь же и отдаются шарду, занявшему имя.
+
+"""
+import logging
+import os
+import signal
+from collections import deque
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
+from socket import AF_UNIX, SOCK_STREAM, socket
+
+import common.cfg_server_log as log_config
+from common import logs
+from common.codecs import decode_message, encode_message, get_codec
+from common.utils import FrameBuffer, get_message, get_messages, pack_frame, recv_frames, send_all, send_message
+from common.variables import MAX_CONNECTIONS
+from src.connection import SocketClient
+from src.mailbox import Mailboxes
+
+# Операции шины
+HELLO = 'hello'
+CLAIM = 'claim'
+CLAIMED = 'claimed'
+RELEASE = 'release'
+BIND = 'bind'
+UNBIND = 'unbind'
+DIRECTORY = 'directory'
+USER = 'user'
+ALL = 'all'
+ROOM = 'room'
+ROOM_CREATED = 'room_created'
+MAILBOX = 'mailbox'
+DRAIN = 'drain'
+
+BUS_CODEC = get_codec('json')
+
+
+class ShardBus:
+    """ Сторона шины в рабочем процессе """
+    __slots__ = ('path', 'shard', 'sock', 'frames', 'inbox', 'directory')
+
+    def __init__(self, path, shard):
+        self.path = path
+        self.shard = shard
+        self.sock = None
+        self.frames = FrameBuffer()
+        self.inbox = deque()
+        self.directory = {}
+
+    def open(self):
+        self.sock = socket(AF_UNIX, SOCK_STREAM)
+        self.sock.connect(self.path)
+        self.publish(HELLO)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def publish(self, op, **fields):
+        fields['op'] = op
+        fields['shard'] = self.shard
+        send_message(self.sock, fields, BUS_CODEC)
+
+    def claim(self, username):
+        """ Синхронно занимает имя во всех шардах; сообщения, пришедшие до ответа, откладываются """
+        self.publish(CLAIM, name=username)
+        while True:
+            message = get_message(self.sock, self.frames)
+            if message['op'] == CLAIMED and message['name'] == username:
+                if message['ok']:
+                    self.directory[username] = self.shard
+                return message['ok']
+            self.inbox.append(message)
+
+    def release(self, username):
+        if self.directory.get(username) == self.shard:
+            del self.directory[username]
+        self.publish(RELEASE, name=username)
+
+    def remote(self, username):
+        """ Имя занято пользователем другого шарда """
+        shard = self.directory.get(username)
+        return shard is not None and shard != self.shard
+
+    def pending(self):
+        """ Есть принятые, но ещё не обработанные сообщения (например, отложенные во время claim) """
+        return bool(self.inbox or self.frames.frames)
+
+    def read(self, readable=False):
+        """ Входящие операции доставки; изменения справочника применяются здесь же """
+        messages = list(self.inbox)
+        self.inbox.clear()
+        if readable or self.frames.frames:
+            messages.extend(get_messages(self.sock, self.frames))
+        deliveries = []
+        for message in messages:
+            op = message['op']
+            if op == BIND:
+                self.directory[message['name']] = message['shard']
+            elif op == UNBIND:
+                if self.directory.get(message['name']) == message['shard']:
+                    del self.directory[message['name']]
+            elif op == DIRECTORY:
+                self.directory.update(message['names'])
+            else:
+                deliveries.append(message)
+        return deliveries
+
+
+class ShardHub:
+    """ Шина в родительском процессе: справочник имён и пересылка между шардами """
+    __slots__ = ('path', 'logger', 'sock', 'selector', 'workers', 'buffers', 'directory', 'mailboxes')
+
+    def __init__(self, path):
+        self.path = path
+        self.logger = logging.getLogger(log_config.LOGGER_NAME)
+        self.sock = socket(AF_UNIX, SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen()
+        self.selector = DefaultSelector()
+        self.workers = {}  # shard -> SocketClient
+        self.buffers = {}  # SocketClient -> (shard, FrameBuffer)
+        self.directory = {}
+        self.mailboxes = Mailboxes()
+
+    def start(self):
+        """ Приём подключений шардов; в родительском процессе, после fork рабочих """
+        self.sock.setblocking(False)
+        self.selector.register(self.sock, EVENT_READ)
+
+    def serve_forever(self):
+        self.start()
+        while True:
+            self.poll()
+
+    def poll(self, timeout=None):
+        """ Один проход селектора: подключения шардов, их операции и досылка очередей """
+        for key, mask in self.selector.select(timeout):
+            if key.data is None:
+                self.__accept()
+                continue
+            link = key.data
+            if link not in self.buffers:
+                continue
+            try:
+                if mask & EVENT_WRITE:
+                    link.flush()
+                if mask & EVENT_READ:
+                    for frame in recv_frames(link, self.buffers[link][1]):
+                        self.__handle(link, decode_message(frame))
+            except BlockingIOError:
+                continue
+            except (ConnectionError, ValueError):
+                self.__drop(link)
+
+    def __accept(self):
+        sock, _ = self.sock.accept()
+        # шина не должна терять сообщения: очередь без ограничения
+        link = SocketClient(sock, self.path, self.selector, policy=None)
+        self.buffers[link] = (None, FrameBuffer())
+
+    def __send(self, link, message):
+        send_all(link, pack_frame(encode_message(message, BUS_CODEC)))
+
+    def __send_others(self, shard, message):
+        frame = pack_frame(encode_message(message, BUS_CODEC))
+        for other, link in self.workers.items():
+            if other != shard:
+                send_all(link, frame)
+
+    def __handle(self, link, message):
+        op, shard = message['op'], message['shard']
+        if op == HELLO:
+            self.workers[shard] = link
+            self.buffers[link] = (shard, self.buffers[link][1])
+            self.__send(link, {'op': DIRECTORY, 'shard': None, 'names': self.directory})
+        elif op == CLAIM:
+            name = message['name']
+            ok = self.directory.get(name, shard) == shard
+            if ok:
+                self.directory[name] = shard
+                self.__send_others(shard, {'op': BIND, 'shard': shard, 'name': name})
+            self.__send(link, {'op': CLAIMED, 'shard': None, 'name': name, 'ok': ok})
+            messages = self.mailboxes.take(name) if ok else None
+            if messages:
+                self.__send(link, {'op': DRAIN, 'shard': None, 'to': name, 'messages': messages})
+        elif op == RELEASE:
+            name = message['name']
+            if self.directory.get(name) == shard:
+                del self.directory[name]
+                self.__send_others(shard, {'op': UNBIND, 'shard': shard, 'name': name})
+        elif op == USER:
+            target = self.workers.get(self.directory.get(message['to']))
+            if target is not None:
+                self.__send(target, message)
+        elif op == MAILBOX:
+            target = self.workers.get(self.directory.get(message['to']))
+            if target is not None:
+                # имя заняли, пока сообщение шло по шине
+                message['op'] = USER
+                self.__send(target, message)
+            else:
+                self.mailboxes.put(message['to'], {'sender': message['sender'], 'shard': shard, 'package': message['package']})
+        else:
+            self.__send_others(shard, message)
+
+    def __drop(self, link):
+        shard, _ = self.buffers.pop(link)
+        link.close()
+        if self.workers.get(shard) is link:
+            del self.workers[shard]
+        self.logger.error('Shard %s disconnected from bus', shard)
+        for name in [n for n, s in self.directory.items() if s == shard]:
+            del self.directory[name]
+            self.__send_others(shard, {'op': UNBIND, 'shard': shard, 'name': name})
+
+
+def run_workers(workers, make_server, request_count=MAX_CONNECTIONS):
+    """ Запускает шину и N рабочих процессов; make_server(bus) создаёт Server рабочего процесса """
+    import tempfile  # нужен только многопроцессному режиму
+    path = os.path.join(tempfile.mkdtemp(prefix='py_chat_'), 'bus.sock')
+    hub = ShardHub(path)
+    children = []
+    for shard in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            hub.sock.close()
+            server = make_server(ShardBus(path, shard))
+            try:
+                server.serve(request_count)
+            finally:
+                logs.stop()  # os._exit не вызывает atexit: дописать очередь лога
+                os._exit(0)
+        children.append(pid)
+    try:
+        hub.serve_forever()
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        os.unlink(path)
+        os.rmdir(os.path.dirname(path))
@@ -0,0 +1,57 @@
+from math import floor
+
+from common.variables import TIMER_SLOTS, TIMER_TICK
+
+
+class TimerWheel:
+    """
+    Хэшированное колесо таймеров: слот = номер тика по модулю числа слотов.
+    schedule / cancel - O(1), advance(now) просматривает только слоты наступивших тиков,
+    поэтому работа пропорциональна сработавшим таймерам, а не числу соединений.
+    Таймер дальше одного оборота колеса остаётся в слоте до нужного оборота.
+
+    """
+    __slots__ = ('tick', 'slots', 'where', 'current')
+
+    def __init__(self, now, tick=TIMER_TICK, slots=TIMER_SLOTS):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]  # item -> deadline
+        self.where = {}  # item -> слот
+        self.current = floor(now / tick)
+
+    def __len__(self):
+        return len(self.where)
+
+    def __contains__(self, item):
+        return item in self.where
+
+    def schedule(self, item, deadline):
+        self.cancel(item)
+        # таймер в прошлом сработает на ближайшем тике
+        index = max(floor(deadline / self.tick), self.current) % len(self.slots)
+        self.slots[index][item] = deadline
+        self.where[item] = index
+
+    def cancel(self, item):
+        index = self.where.pop(item, None)
+        if index is not None:
+            del self.slots[index][item]
+
+    def advance(self, now):
+        """ Снимает и возвращает таймеры со сроком не позже now """
+        due = []
+        target = floor(now / self.tick)
+        # после долгой паузы каждый слот достаточно просмотреть один раз
+        start = max(self.current, target - len(self.slots) + 1)
+        for tick in range(start, target + 1):
+            slot = self.slots[tick % len(self.slots)]
+            if not slot:
+                continue
+            expired = [item for item, deadline in slot.items() if deadline <= now]
+            for item in expired:
+                del slot[item]
+                del self.where[item]
+            due.extend(expired)
+        # текущий тик ещё не закончился: его слот просматривается и при следующем вызове
+        self.current = target
+        return due
@@ -0,0 +1,182 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from common.codecs import decode_message, frame_codec, get_codec
+from common.codes import ANSWER, BASIC, INCORRECT_REQUEST, OK, RESUMED
+from common.package import Request, Response
+from common.request_body import User
+from common.utils import FrameBuffer, encode_frame, to_package
+from common.variables import SEQ, TOKEN, RequestAction
+from src.async_client import AsyncClient, backoff, make_request
+
+
+class FakeServer:
+    """ Сервер протокола в тестовом цикле: zbinary не понимает, на команды отвечает в обратном порядке """
+
+    def __init__(self):
+        self.received = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        frames = FrameBuffer()
+        commands = []
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            frames.feed(chunk)
+            while frames.frames:
+                frame = frames.pop()
+                codec = frame_codec(frame)
+                if codec.name == 'zbinary':
+                    writer.write(encode_frame(Response(INCORRECT_REQUEST, 'Unsupported codec')))
+                    continue
+                request = to_package(decode_message(frame))
+                self.received.append(request)
+                if request.action == RequestAction.PRESENCE:
+                    writer.write(encode_frame(Response(OK), codec))
+                    writer.write(encode_frame(Request(RequestAction.PROBE), codec))
+                    writer.write(encode_frame(Response(BASIC, 'welcome'), codec))
+                elif request.action == RequestAction.COMMAND:
+                    commands.append(request)
+            # ответы на конвейерные команды - в обратном порядке
+            for request in reversed(commands):
+                resp = Response(ANSWER, request.body)
+                resp.id = request.id
+                writer.write(encode_frame(resp, codec))
+            commands.clear()
+        writer.close()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class ResumeServer(FakeServer):
+    """ Выдаёт токен при PRESENCE, на RESUME отвечает RESUMED; после входа шлёт два кадра и обрывает соединение """
+
+    async def handle(self, reader, writer):
+        frames = FrameBuffer()
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            frames.feed(chunk)
+            while frames.frames:
+                request = to_package(decode_message(frames.pop()))
+                self.received.append(request)
+                if request.action in (RequestAction.PRESENCE, RequestAction.RESUME):
+                    if request.action == RequestAction.PRESENCE:
+                        resp = Response(OK, {TOKEN: 'secret', SEQ: 1})
+                    else:
+                        resp = Response(RESUMED, {TOKEN: 'secret', SEQ: request.body[SEQ]})
+                    resp.id = request.id
+                    writer.write(encode_frame(resp))
+                    writer.write(encode_frame(Response(BASIC, 'one')) + encode_frame(Response(BASIC, 'two')))
+                    if request.action == RequestAction.PRESENCE:
+                        await writer.drain()
+                        writer.transport.abort()
+                        return
+        writer.close()
+
+
+class TestBackoff(unittest.TestCase):
+    def test_full_jitter_within_cap(self):
+        for attempt in range(20):
+            delay = backoff(attempt, base=0.5, cap=30)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(30, 0.5 * 2 ** attempt))
+
+    def test_spread(self):
+        delays = [backoff(6, base=0.5, cap=30) for _ in range(1000)]
+        self.assertLess(min(delays), 3)
+        self.assertGreater(max(delays), 27)
+
+
+class TestReconnect(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = ResumeServer()
+        self.received = []
+        self.client = AsyncClient('127.0.0.1', await self.server.start(), 'alice', ('json',), self.received.append)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.stop()
+
+    async def test_resume_after_drop(self):
+        with mock.patch('src.async_client.backoff', return_value=0):
+            await self.client.connect()
+            for _ in range(100):
+                if [r.action for r in self.server.received][-1:] == [RequestAction.RESUME]:
+                    break
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+        resume = self.server.received[-1]
+        self.assertEqual(resume.action, RequestAction.RESUME)
+        self.assertEqual((resume.body[TOKEN], resume.body[SEQ]), ('secret', 3))  # ответ на PRESENCE + два кадра
+        self.assertEqual([p.code for p in self.received], [BASIC, BASIC, RESUMED, BASIC, BASIC])
+        self.assertTrue(self.client.connected)
+        self.assertEqual(self.client.seq, 5)
+
+    async def test_close_stops_reconnect(self):
+        with mock.patch('src.async_client.backoff', return_value=60):
+            await self.client.connect()
+            await asyncio.sleep(0.05)
+            await self.client.close()
+        self.assertEqual([r.action for r in self.server.received], [RequestAction.PRESENCE])
+
+
+class TestAsyncClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = FakeServer()
+        self.client = AsyncClient('127.0.0.1', await self.server.start(), 'alice')
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.stop()
+
+    async def test_codec_fallback(self):
+        await self.client.close()
+        self.client = AsyncClient('127.0.0.1', self.client.port, 'alice', codecs=('zbinary', 'binary', 'json'))
+        response = await self.client.connect()
+        self.assertEqual(response.code, OK)
+        self.assertEqual(self.client.codec, get_codec('binary'))
+        self.assertEqual((await self.client.receive()).message, 'welcome')
+
+    async def test_pipelined_requests_matched_by_id(self):
+        await self.client.connect()
+        answers = await asyncio.gather(*(self.client.request(Request(RequestAction.COMMAND, f'c{i}')) for i in range(20)))
+        self.assertEqual([a.message for a in answers], [f'c{i}' for i in range(20)])
+
+    async def test_probe_answered(self):
+        await self.client.connect()
+        await self.client.request(Request(RequestAction.COMMAND, 'sync'))
+        self.assertIn(RequestAction.PROBE, [r.action for r in self.server.received])
+
+    async def test_close_sends_quit_and_fails_pending(self):
+        await self.client.connect()
+        await self.client.close()
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.server.received[-1].action, RequestAction.QUIT)
+        with self.assertRaises(ConnectionError):
+            self.client.send(Request(RequestAction.COMMAND, 'late'))
+
+
+class TestMakeRequest(unittest.TestCase):
+    def test_console_syntax(self):
+        user = User('alice')
+        self.assertEqual(make_request('$stats', user).action, RequestAction.COMMAND)
+        self.assertEqual(make_request('+#room', user).body, '#room')
+        self.assertEqual(make_request('-#room', user).action, RequestAction.LEAVE)
+        self.assertEqual(make_request('#room hi', user).body.to, '#room')
+        self.assertEqual(make_request('@bob hi', user).body.to, 'bob')
+        self.assertEqual(make_request('hi all', user).body.to, 'ALL')
+
+
+if __name__ == "__main__":
+    unittest.main()
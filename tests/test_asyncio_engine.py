@@ -0,0 +1,103 @@
+import asyncio
+import socket
+import unittest
+from unittest.mock import patch
+
+from common.codecs import get_codec
+from common.codes import OK
+from common.package import Request
+from common.request_body import User
+from common.utils import FrameBuffer, get_data, send_data
+from common.variables import RequestAction
+from src.async_client import AsyncClient, make_request
+from src.server import Server
+
+WAIT = 5
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestAsyncioEngine(unittest.IsolatedAsyncioTestCase):
+    """ Движок asyncio в цикле теста: __serve без потока и консоли, клиенты - AsyncClient """
+    slow_consumer = 'shed'
+
+    async def asyncSetUp(self):
+        self.port = free_port()
+        self.server = Server('127.0.0.1', self.port, 'asyncio', self.slow_consumer, rate_limits=None, idle_timeout=0,
+                             resume_grace=0)
+        self.server.pool.open()
+        self.serving = asyncio.create_task(self.server._Server__serve(16))
+        self.clients = []
+        self.alice = await self.connect('alice')
+        self.bob = await self.connect('bob')
+
+    async def asyncTearDown(self):
+        for client in self.clients:
+            await client.close()
+        self.serving.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await self.serving
+        asyncio.get_running_loop().remove_reader(self.server.pool.fileno())
+        self.server.pool.close()
+
+    async def connect(self, name):
+        client = AsyncClient('127.0.0.1', self.port, name, codecs=('binary',))
+        for _ in range(100):  # сервер начинает слушать в задаче serving
+            try:
+                response = await client.connect()
+                break
+            except OSError:
+                await asyncio.sleep(0.01)
+        self.assertEqual(response.code, OK)
+        self.clients.append(client)
+        return client
+
+    async def until(self, client, text):
+        """ Сообщения клиента до первого с текстом text (уведомления о входе других пропускаются) """
+        while True:
+            package = await asyncio.wait_for(client.receive(), WAIT)
+            if package.message == text:
+                return package
+
+    async def test_direct(self):
+        self.alice.message('@bob hi')
+        await self.until(self.bob, 'alice to @bob:  hi')
+
+    async def test_room_fanout(self):
+        carol = await self.connect('carol')
+        await self.alice.request(make_request('#room create', self.alice.user))
+        for client in (self.bob, carol):
+            await client.request(make_request('+#room', client.user))
+        self.alice.message('#room hello')
+        for client in (self.bob, carol):
+            await self.until(client, 'alice to #room:  hello')
+
+    @patch('src.connection.OUTBOX_LOW_WATER', 16 * 1024)
+    @patch('src.connection.OUTBOX_HIGH_WATER', 64 * 1024)
+    async def test_slow_consumer_shed(self):
+        slow = socket.socket()
+        slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        slow.connect(('127.0.0.1', self.port))
+        self.addCleanup(slow.close)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, send_data, slow, Request(RequestAction.PRESENCE, User('slow')), get_codec('binary'))
+        frames = FrameBuffer()
+        self.assertEqual((await loop.run_in_executor(None, get_data, slow, frames)).code, OK)
+
+        # slow не читает: его очередь переполняется и теряет старые кадры, bob получает всё
+        text = 'x' * 1000
+        for i in range(2000):
+            self.alice.message(f'{i} {text}')
+        await self.until(self.bob, f'alice to @ALL: 1999 {text}')
+        self.assertGreater(self.server.stats['frames_shed'], 0)
+        session = self.server.sessions.find('slow')
+        self.assertIsNotNone(session)
+        self.assertLessEqual(session.client.out_bytes, 64 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
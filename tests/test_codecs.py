@@ -0,0 +1,127 @@
+import unittest
+import zlib
+
+from common.codecs import CODECS, DEFLATE, MAX_DEPTH, RAW, REQUEST_HEAD, V_LIST, V_NONE, V_STR, UnknownCodecError, \
+    decode_message, encode_message, frame_codec, get_codec
+from common.codes import ANSWER, BASIC
+from common.messages import action_msg, action_presence
+from common.package import Request, Response
+from common.request_body import Msg, User
+from common.variables import RequestAction
+
+
+class TestCodecs(unittest.TestCase):
+    def setUp(self) -> None:
+        msg = Msg('@bob hello', User('alice'))
+        msg.parse_msg()
+        self.packages = [
+            Request(RequestAction.PRESENCE, User('alice')).get_dict(),
+            Request(RequestAction.MESSAGE, msg).get_dict(),
+            Request(RequestAction.QUIT).get_dict(),
+            Response(BASIC, 'привет').get_dict(),
+            Response(ANSWER, ['alice', 'bob']).get_dict(),
+        ]
+        for package in (Request(RequestAction.COMMAND, 'stats'), Response(ANSWER, ['1'])):
+            package.id = 42  # номер запроса для сопоставления ответов
+            self.packages.append(package.get_dict())
+        return super().setUp()
+
+    def test_roundtrip(self):
+        for codec in CODECS.values():
+            for package in self.packages:
+                payload = encode_message(package, codec)
+                self.assertIs(frame_codec(payload), codec)
+                self.assertEqual(decode_message(payload), package)
+
+    def test_encode_package(self):
+        msg = Msg('#room hello', User('alice'))
+        msg.parse_msg()
+        packages = [Request(RequestAction.MESSAGE, msg), Request(RequestAction.JOIN, '#room'),
+                    Response(BASIC, 'привет'), Response(ANSWER, ['alice', 'bob'])]
+        packages[1].id = packages[3].id = 9
+        for codec in CODECS.values():
+            for package in packages:
+                self.assertEqual(codec.encode_package(package), codec.encode(package.get_dict()))
+
+    def test_binary_is_compact(self):
+        binary, json = get_codec('binary'), get_codec('json')
+        for package in self.packages:
+            self.assertLess(len(binary.encode(package)), len(json.encode(package)))
+
+    def test_jim_messages(self):
+        codec = get_codec('json')
+        for message in (action_presence('alice'), action_msg('alice', 'hi')):
+            self.assertEqual(decode_message(encode_message(message, codec)), message)
+
+    def test_request_id_optional(self):
+        binary = get_codec('binary')
+        request = Request(RequestAction.QUIT)
+        plain = binary.encode(request.get_dict())
+        request.id = 7
+        numbered = binary.encode(request.get_dict())
+        self.assertTrue(numbered.startswith(plain))  # номер дописан в конец, старый декодер его не читает
+        self.assertNotIn('id', decode_message(encode_message(Request(RequestAction.QUIT).get_dict(), binary)))
+
+    def test_unknown_codec(self):
+        with self.assertRaises(UnknownCodecError):
+            decode_message(b'\xff{}')
+        with self.assertRaises(UnknownCodecError):
+            get_codec('pickle')
+
+    def test_malformed_payload(self):
+        payload = encode_message(self.packages[1], get_codec('binary'))
+        with self.assertRaises(ValueError):
+            decode_message(payload[:-3])
+        short = bytes([get_codec('binary').tag]) + REQUEST_HEAD.pack(0, 5, 0) + bytes([V_LIST, 1, V_STR, 9]) + b'abc'
+        with self.assertRaises(ValueError):
+            decode_message(short)
+
+    def test_long_and_nested_values(self):
+        binary = get_codec('binary')
+        body = {'text': 'ж' * 200, 'list': ['a' * 300, 'b', None, 1, 2.5, True, ['c']], 'n': {'k': 'v' * 130}}
+        package = Request(RequestAction.COMMAND, body).get_dict()
+        self.assertEqual(decode_message(encode_message(package, binary)), package)
+
+    def test_nesting_limited(self):
+        binary = get_codec('binary')
+        deep = bytes([binary.tag]) + REQUEST_HEAD.pack(0, 5, 0) + bytes([V_LIST, 1]) * 5000 + bytes([V_NONE])
+        with self.assertRaises(ValueError):
+            decode_message(deep)
+        value = []
+        for _ in range(MAX_DEPTH + 1):
+            value = [value]
+        with self.assertRaises(ValueError):
+            binary.encode(Request(RequestAction.COMMAND, value).get_dict())
+
+
+class TestCompressedCodec(unittest.TestCase):
+    def setUp(self) -> None:
+        self.codec = get_codec('zbinary')
+        return super().setUp()
+
+    def test_short_payload_not_compressed(self):
+        payload = self.codec.encode(Response(BASIC, 'hi').get_dict())
+        self.assertEqual(payload[0], RAW)
+
+    def test_long_payload_compressed(self):
+        package = Response(BASIC, 'alice to #general: ' + 'hello everyone ' * 20).get_dict()
+        payload = encode_message(package, self.codec)
+        self.assertEqual(payload[1], DEFLATE)
+        self.assertLess(len(payload), len(encode_message(package, get_codec('binary'))) // 4)
+        self.assertEqual(decode_message(payload), package)
+
+    def test_malformed_compressed_payload(self):
+        with self.assertRaises(ValueError):
+            decode_message(bytes([self.codec.tag, DEFLATE]) + b'not deflate')
+        with self.assertRaises(ValueError):
+            decode_message(bytes([self.codec.tag, 7]))
+
+    def test_decompressed_size_limited(self):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -12)
+        bomb = compressor.compress(bytes(32 * 1024 * 1024)) + compressor.flush()
+        with self.assertRaises(ValueError):
+            decode_message(bytes([self.codec.tag, DEFLATE]) + bomb)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import threading
+import time
+import unittest
+
+from common.codes import ANSWER, BASIC, PARTIAL, SERVER_ERROR
+from common.package import Response
+from src.commands import CommandPool, command_responses
+
+
+class TestCommandResponses(unittest.TestCase):
+    def test_pages(self):
+        pages = list(command_responses((i for i in range(250)), page=100))
+        self.assertEqual([p.code for p in pages], [PARTIAL.code, PARTIAL.code, ANSWER.code])
+        self.assertEqual([len(p.message) for p in pages], [100, 100, 50])
+        self.assertEqual(pages[0].message[0], '0')
+
+    def test_single_page(self):
+        for items in ([], list(range(100))):
+            pages = list(command_responses(items, page=100))
+            self.assertEqual(len(pages), 1)
+            self.assertEqual(pages[0].code, ANSWER.code)
+
+    def test_other_answers(self):
+        self.assertEqual(next(command_responses(False)).code, SERVER_ERROR.code)
+        self.assertEqual(next(command_responses(None)).message, 'Done')
+        response = Response(BASIC, 'text')
+        self.assertIs(next(command_responses(response)), response)
+        self.assertEqual(next(command_responses('text')).message, 'text')
+
+
+class TestCommandPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = CommandPool(workers=2, limit=2)
+        self.pool.open()
+
+    def tearDown(self):
+        self.pool.close()
+
+    def wait(self):
+        calls = []
+        while self.pool.inflight:
+            time.sleep(0.001)
+            calls.extend(self.pool.drain())
+        return calls
+
+    def test_results_posted_in_order(self):
+        def job(n):
+            for i in range(n):
+                self.pool.post(print, i)
+
+        self.assertTrue(self.pool.submit(job, 5))
+        self.assertEqual([args for _, args in self.wait()], [(i,) for i in range(5)])
+
+    def test_bounded(self):
+        release = threading.Event()
+        self.assertTrue(self.pool.submit(release.wait))
+        self.assertTrue(self.pool.submit(release.wait))
+        self.assertFalse(self.pool.submit(release.wait))
+        release.set()
+        self.wait()
+        self.assertTrue(self.pool.submit(release.wait))
+        self.wait()
+
+    def test_failed_job_frees_slot(self):
+        self.pool.submit(lambda: 1 / 0)
+        self.wait()
+        self.assertEqual(self.pool.inflight, 0)
+
+    def test_post_from_other_thread_wakes(self):
+        thread = threading.Thread(target=self.pool.post, args=(print, 'x'))
+        thread.start()
+        thread.join()
+        self.assertEqual(self.pool.reader.recv(1), b'\0')
+        self.assertEqual(self.pool.drain(), [(print, ('x',))])
+
+
+if __name__ == "__main__":
+    unittest.main()
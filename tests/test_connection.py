@@ -0,0 +1,120 @@
+import socket
+import unittest
+from selectors import EVENT_READ, EVENT_WRITE, DefaultSelector
+from unittest.mock import patch
+
+from src.connection import SlowConsumerError, SocketClient
+
+
+class TestSocketClient(unittest.TestCase):
+    def setUp(self) -> None:
+        self.left, self.right = socket.socketpair()
+        self.left.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        self.selector = DefaultSelector()
+        self.client = SocketClient(self.left, 'test', self.selector)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.right.close()
+        self.selector.close()
+        return super().tearDown()
+
+    def events(self):
+        return self.selector.get_key(self.left).events
+
+    def test_small_send_is_immediate(self):
+        self.client.send(b'hello')
+        self.assertFalse(self.client.out)
+        self.assertEqual(self.events(), EVENT_READ)
+        self.assertEqual(self.right.recv(5), b'hello')
+
+    def test_write_interest_only_while_queued(self):
+        data = bytes(range(256)) * 4096
+        self.client.send(data)
+        self.assertTrue(self.client.out)
+        self.assertEqual(self.events(), EVENT_READ | EVENT_WRITE)
+
+        received = bytearray()
+        while len(received) < len(data):
+            received += self.right.recv(65536)
+            self.client.flush()
+        self.assertEqual(bytes(received), data)
+        self.assertFalse(self.client.out)
+        self.assertEqual(self.events(), EVENT_READ)
+
+    @patch('src.connection.OUTBOX_LOW_WATER', 32 * 1024)
+    @patch('src.connection.OUTBOX_HIGH_WATER', 128 * 1024)
+    def test_shed_oldest_frames(self):
+        frames = [bytes([i]) * 10000 for i in range(100)]
+        for frame in frames:
+            self.client.send(frame)
+        self.assertLessEqual(self.client.pending(), 128 * 1024)
+        self.assertGreater(self.client.stats['frames_shed'], 0)
+        self.assertEqual(self.client.shed + len(self.client.out), len(frames))
+        self.assertEqual(bytes(self.client.out[-1]), frames[-1])
+        self.assertEqual(self.client.out_bytes, sum(len(v) for v in self.client.out))
+
+    @patch('src.connection.OUTBOX_HIGH_WATER', 128 * 1024)
+    def test_drop_slow_consumer(self):
+        self.client.policy = 'drop'
+        with self.assertRaises(SlowConsumerError):
+            for i in range(100):
+                self.client.send(bytes(10000))
+        self.assertEqual(self.client.stats['slow_consumers_dropped'], 1)
+
+
+class TestBatchedSocketClient(unittest.TestCase):
+    def setUp(self) -> None:
+        self.left, self.right = socket.socketpair()
+        self.selector = DefaultSelector()
+        self.dirty = set()
+        self.client = SocketClient(self.left, 'test', self.selector, dirty=self.dirty)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.right.close()
+        self.selector.close()
+        return super().tearDown()
+
+    def test_send_waits_for_flush(self):
+        for i in range(10):
+            self.client.send(bytes([i]) * 10)
+        self.assertEqual(self.dirty, {self.client})
+        self.right.setblocking(False)
+        with self.assertRaises(BlockingIOError):
+            self.right.recv(1)
+        self.client.flush()
+        self.assertFalse(self.client.out)
+        self.assertEqual(self.right.recv(1000), b''.join(bytes([i]) * 10 for i in range(10)))
+
+    def test_partial_flush_keeps_order(self):
+        self.left.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        frames = [bytes([i % 256]) * 1000 for i in range(500)]
+        for frame in frames:
+            self.client.send(frame)
+        self.client.flush()
+        self.assertTrue(self.client.out)
+        self.assertEqual(self.selector.get_key(self.left).events, EVENT_READ | EVENT_WRITE)
+        received = bytearray()
+        while len(received) < 500 * 1000:
+            received += self.right.recv(65536)
+            self.client.flush()
+        self.assertEqual(bytes(received), b''.join(frames))
+        self.assertEqual(self.client.out_bytes, 0)
+
+    def test_large_tick_flushes_early(self):
+        for i in range(400):
+            self.client.send(bytes(1000))
+        self.assertLess(self.client.out_bytes, 400 * 1000)
+        self.assertEqual(self.client.stats['frames_shed'], 0)
+
+    def test_close_forgets_client(self):
+        self.client.send(b'data')
+        self.client.close()
+        self.assertFalse(self.dirty)
+
+
+if __name__ == "__main__":
+    unittest.main()
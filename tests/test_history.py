@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+from src.history import History, conversation
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.history = History(self.dir.name, flush_interval=60)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.history.close()
+        self.dir.cleanup()
+        return super().tearDown()
+
+    def fill(self, key, number, start=0):
+        for i in range(number):
+            self.history.append(key, f'message {i}', start + i)
+
+    def reopen(self, **kwargs):
+        self.history.close()
+        self.history = History(self.dir.name, flush_interval=60, **kwargs)
+
+    def test_conversation_key(self):
+        self.assertEqual(conversation('alice', 'bob'), conversation('bob', 'alice'))
+        self.assertNotEqual(conversation('alice', 'bob'), conversation('alice', 'carol'))
+
+    def test_pending_is_visible(self):
+        self.fill('#room', 3)
+        self.assertEqual([t for _, t in self.history.query('#room')], ['message 0', 'message 1', 'message 2'])
+
+    def test_last_and_since(self):
+        self.fill('#room', 10)
+        self.fill('#other', 5)
+        self.history.flush()
+        self.fill('#room', 2, start=10)
+        self.assertEqual([s for s, _ in self.history.query('#room', 3)], [9, 10, 11])
+        self.assertEqual([s for s, _ in self.history.query('#room', 4, since=5)], [5, 6, 7, 8])
+        self.assertEqual(len(self.history.query('#other', 100)), 5)
+        self.assertEqual(self.history.query('#missing'), [])
+
+    def test_recover_after_reopen(self):
+        self.fill('#room', 5)
+        self.reopen()
+        self.assertEqual(self.history.query('#room', 2), [(3, 'message 3'), (4, 'message 4')])
+
+    def test_torn_tail_is_truncated(self):
+        self.fill('#room', 3)
+        self.history.flush()
+        segment = os.path.join(self.dir.name, '00000000.log')
+        with open(segment, 'ab') as f:
+            f.write(b'\x00\x01\x02')
+        self.reopen()
+        self.assertEqual(len(self.history.query('#room')), 3)
+        self.fill('#room', 1, start=3)
+        self.reopen()
+        self.assertEqual([s for s, _ in self.history.query('#room')], [0, 1, 2, 3])
+
+    def test_segment_rotation(self):
+        self.reopen(segment_size=256)
+        for i in range(20):
+            self.history.append('#room', f'message {i}', i)
+            self.history.flush()
+        self.assertGreater(len(os.listdir(self.dir.name)), 1)
+        self.reopen(segment_size=256)
+        self.assertEqual([s for s, _ in self.history.query('#room', 100)], list(range(20)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import io
+import json
+import logging
+import unittest
+from unittest.mock import patch
+
+from common import logs
+
+
+def make_record(level=logging.INFO, msg='value %s', args=(1,)):
+    return logging.LogRecord('test', level, __file__, 1, msg, args, None)
+
+
+class TestRateLimitFilter(unittest.TestCase):
+    def test_sample(self):
+        limiter = logs.RateLimitFilter(sample={logging.DEBUG: 3})
+        passed = [limiter.filter(make_record(logging.DEBUG)) for _ in range(9)]
+        self.assertEqual(passed.count(True), 3)
+        self.assertTrue(limiter.filter(make_record(logging.WARNING)))
+
+    def test_rate_and_suppressed_count(self):
+        with patch('common.logs.monotonic', return_value=100.0):
+            limiter = logs.RateLimitFilter(rate={logging.INFO: 5})
+            passed = [limiter.filter(make_record()) for _ in range(8)]
+        self.assertEqual(passed.count(True), 5)
+        with patch('common.logs.monotonic', return_value=101.0):
+            record = make_record()
+            self.assertTrue(limiter.filter(record))
+        self.assertEqual(record.suppressed, 3)
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stream = io.StringIO()
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        logs.stop('test.logs')
+        return super().tearDown()
+
+    def test_lazy_formatting(self):
+        class Value:
+            formatted = 0
+
+            def __str__(self):
+                Value.formatted += 1
+                return 'value'
+
+        handler = logs.LazyQueueHandler(logs.SimpleQueue())
+        handler.handle(make_record(args=(Value(),)))
+        self.assertEqual(Value.formatted, 0)
+
+    def test_json_lines(self):
+        logs.configure('test.logs', logging.StreamHandler(self.stream), json_lines=True)
+        logging.getLogger('test.logs').info('hello %s', 'world')
+        logs.stop('test.logs')
+        entry = json.loads(self.stream.getvalue())
+        self.assertEqual(entry['message'], 'hello world')
+        self.assertEqual(entry['level'], 'INFO')
+
+    def test_text(self):
+        logs.configure('test.logs', logging.StreamHandler(self.stream), use_queue=False)
+        logging.getLogger('test.logs').warning('plain %d', 42)
+        self.assertIn('WARNING | test_logs | plain 42', self.stream.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
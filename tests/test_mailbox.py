@@ -0,0 +1,38 @@
+import unittest
+
+from src.mailbox import Mailboxes
+
+
+class TestMailboxes(unittest.TestCase):
+    def test_take_in_order_and_empties(self):
+        boxes = Mailboxes()
+        for i in range(3):
+            boxes.put('bob', i, now=0)
+        self.assertEqual(boxes.take('bob', now=1), [0, 1, 2])
+        self.assertEqual(boxes.take('bob', now=1), [])
+        self.assertNotIn('bob', boxes)
+
+    def test_size_keeps_newest(self):
+        boxes = Mailboxes(size=2)
+        for i in range(5):
+            boxes.put('bob', i, now=0)
+        self.assertEqual(boxes.take('bob', now=0), [3, 4])
+
+    def test_ttl(self):
+        boxes = Mailboxes(ttl=10)
+        boxes.put('bob', 'old', now=0)
+        boxes.put('bob', 'new', now=8)
+        self.assertEqual(boxes.take('bob', now=15), ['new'])
+
+    def test_user_limit_expires_then_evicts_oldest(self):
+        boxes = Mailboxes(ttl=10, limit=2)
+        boxes.put('a', 1, now=0)
+        boxes.put('b', 2, now=5)
+        boxes.put('c', 3, now=12)  # ящик a просрочен
+        self.assertEqual(sorted(boxes.boxes), ['b', 'c'])
+        boxes.put('d', 4, now=13)  # просроченных нет - вытесняется самый старый
+        self.assertEqual(sorted(boxes.boxes), ['c', 'd'])
+
+
+if __name__ == "__main__":
+    unittest.main()
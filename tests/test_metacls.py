@@ -0,0 +1,60 @@
+import unittest
+from socket import AF_INET, SOCK_STREAM, socket
+
+from common.metacls import ClientVerifier, ServerVerifier, check_code, disassemble
+
+
+class TestVerifier(unittest.TestCase):
+    def test_socket_without_arguments(self):
+        def bad(self):
+            return socket()
+
+        with self.assertRaisesRegex(TypeError, 'Incorrect socket usage'):
+            disassemble({'bad': bad}, ServerVerifier.black_list)
+
+    def test_socket_with_arguments(self):
+        def good(self, args):
+            return socket(AF_INET, SOCK_STREAM), socket(*args), socket(family=AF_INET)
+
+        disassemble({'good': good}, ServerVerifier.black_list)
+
+    def test_black_list(self):
+        def server(self, sock):
+            sock.connect(('localhost', 7777))
+
+        def client(self, sock):
+            sock.listen(5)
+
+        with self.assertRaisesRegex(TypeError, 'black list'):
+            disassemble({'server': server}, ServerVerifier.black_list)
+        with self.assertRaisesRegex(TypeError, 'black list'):
+            disassemble({'client': client}, ClientVerifier.black_list)
+        disassemble({'server': server}, ClientVerifier.black_list)
+
+    def test_nested_code(self):
+        def outer(self):
+            return lambda: socket()
+
+        with self.assertRaises(TypeError):
+            disassemble({'outer': outer}, ServerVerifier.black_list)
+
+    def test_cached_by_code(self):
+        def method(self, sock):
+            return sock.send(b'')
+
+        black_list = frozenset(ServerVerifier.black_list)
+        check_code(method.__code__, black_list)
+        hits = check_code.cache_info().hits
+        disassemble({'method': method}, black_list)
+        self.assertEqual(check_code.cache_info().hits, hits + 1)
+
+    def test_project_classes(self):
+        from src.client import Client
+        from src.server import Server
+
+        disassemble(vars(Server), ServerVerifier.black_list)
+        disassemble(vars(Client), ClientVerifier.black_list)
+
+
+if __name__ == "__main__":
+    unittest.main()
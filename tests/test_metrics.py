@@ -0,0 +1,47 @@
+import random
+import unittest
+
+from src.metrics import Histogram, Metrics
+
+
+class TestHistogram(unittest.TestCase):
+    def test_small_values_are_exact(self):
+        histogram = Histogram('h', 'test')
+        for value in range(10):
+            histogram.record(value)
+        self.assertEqual(histogram.count, 10)
+        self.assertEqual(histogram.total, 45)
+        self.assertEqual(histogram.percentile(0.5), 4)
+        self.assertEqual(histogram.percentile(1.0), 9)
+
+    def test_relative_error(self):
+        histogram = Histogram('h', 'test')
+        values = sorted(random.randint(1, 10 ** 9) for _ in range(10000))
+        for value in values:
+            histogram.record(value)
+        for q in (0.5, 0.9, 0.99):
+            exact = values[int(len(values) * q) - 1]
+            self.assertAlmostEqual(histogram.percentile(q) / exact, 1, delta=1 / 16)
+
+    def test_empty(self):
+        self.assertEqual(Histogram('h', 'test').percentile(0.99), 0)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_render(self):
+        metrics = Metrics('test')
+        requests = metrics.counter('requests_total', 'Requests', 'action')
+        requests.inc('msg')
+        requests.inc('msg', 2)
+        metrics.gauge('sessions', 'Sessions', lambda: 7)
+        metrics.histogram('latency_seconds', 'Latency', 1e-9).record(1000)
+        text = metrics.render()
+        self.assertIn('# TYPE test_requests_total counter\n', text)
+        self.assertIn('test_requests_total{action="msg"} 3\n', text)
+        self.assertIn('test_sessions 7\n', text)
+        self.assertIn('test_latency_seconds_count 1\n', text)
+        self.assertIn('test_sessions 7', metrics.summary())
+
+
+if __name__ == "__main__":
+    unittest.main()
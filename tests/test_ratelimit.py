@@ -0,0 +1,61 @@
+import unittest
+
+from src.ratelimit import FANOUT, SESSION, RateLimiter
+
+LIMITS = {
+    SESSION: (10, 5),
+    'msg': (1, 3),
+    FANOUT: (100, 50),
+}
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(LIMITS)
+        self.state = self.limiter.new(0)
+
+    def test_burst_then_refill(self):
+        allowed = [self.limiter.allow(self.state, 'msg', 0) for _ in range(5)]
+        self.assertEqual(allowed, [True, True, True, False, False])
+        self.assertFalse(self.limiter.allow(self.state, 'msg', 0.5))
+        self.assertTrue(self.limiter.allow(self.state, 'msg', 1))
+
+    def test_refill_capped_by_burst(self):
+        for _ in range(3):
+            self.limiter.allow(self.state, 'msg', 0)
+        allowed = [self.limiter.allow(self.state, 'msg', 100) for _ in range(4)]
+        self.assertEqual(allowed, [True, True, True, False])
+
+    def test_session_bucket_shared_by_actions(self):
+        allowed = [self.limiter.allow(self.state, 'join', 0) for _ in range(6)]
+        self.assertEqual(allowed, [True] * 5 + [False])
+        self.assertFalse(self.limiter.allow(self.state, 'msg', 0))
+
+    def test_rejected_request_takes_nothing(self):
+        for _ in range(3):
+            self.limiter.allow(self.state, 'msg', 0)
+        self.assertFalse(self.limiter.allow(self.state, 'msg', 0))
+        # общее ведро не тронуто отказом: осталось 5 - 3 = 2 токена
+        self.assertEqual([self.limiter.allow(self.state, 'join', 0) for _ in range(3)], [True, True, False])
+
+    def test_fanout_cost(self):
+        self.assertTrue(self.limiter.allow_fanout(self.state, 30, 0))
+        self.assertFalse(self.limiter.allow_fanout(self.state, 30, 0))
+        self.assertTrue(self.limiter.allow_fanout(self.state, 30, 0.1))
+
+    def test_fanout_larger_than_burst_needs_full_bucket(self):
+        self.assertTrue(self.limiter.allow_fanout(self.state, 1000, 0))
+        self.assertFalse(self.limiter.allow_fanout(self.state, 1000, 0.1))
+        self.assertTrue(self.limiter.allow_fanout(self.state, 1000, 0.5))
+
+    def test_missing_buckets_do_not_limit(self):
+        limiter = RateLimiter({'msg': (1, 1)})
+        state = limiter.new(0)
+        self.assertTrue(limiter.allow(state, 'join', 0))
+        self.assertTrue(limiter.allow_fanout(state, 10 ** 6, 0))
+        self.assertTrue(limiter.allow(state, 'msg', 0))
+        self.assertFalse(limiter.allow(state, 'msg', 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from common.request_body import Msg, MsgRoom, User, target_of
+from common.variables import TARGET, MessageTarget
+
+
+class TestMessageTarget(unittest.TestCase):
+    def parse(self, cls, text):
+        msg = cls(text, User('alice'))
+        msg.parse_msg()
+        return msg
+
+    def test_user(self):
+        msg = self.parse(Msg, '@bob hi')
+        self.assertEqual((msg.to, msg.text, msg.target), ('bob', ' hi', MessageTarget.USER))
+
+    def test_all(self):
+        self.assertEqual(self.parse(Msg, 'hi all').target, MessageTarget.ALL)
+        self.assertEqual(self.parse(Msg, '@all hi').target, MessageTarget.ALL)
+
+    def test_room(self):
+        msg = self.parse(MsgRoom, '#room hi')
+        self.assertEqual((msg.to, msg.text, msg.target), ('#room', ' hi', MessageTarget.ROOM))
+
+    def test_at_inside_text(self):
+        msg = self.parse(Msg, 'write to alice@example.com')
+        self.assertEqual((msg.to, msg.target), ('ALL', MessageTarget.ALL))
+
+    def test_target_in_frame(self):
+        body = self.parse(MsgRoom, '#room hi').get_dict()
+        self.assertEqual(body[TARGET], MessageTarget.ROOM)
+        self.assertEqual(Msg.from_dict(body).target, MessageTarget.ROOM)
+
+    def test_body_without_target(self):
+        body = {'sender': 'alice', 'to': '#room', 'text': 'hi'}  # клиент старой версии
+        self.assertEqual(Msg.from_dict(body).target, MessageTarget.ROOM)
+        self.assertEqual(target_of('bob'), MessageTarget.USER)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,360 @@
+import selectors
+import socket
+import time
+import unittest
+from unittest.mock import patch
+
+from common.codecs import REQUEST_HEAD, V_LIST, V_NONE, decode_message, encode_message, get_codec
+from common.codes import ACCESS, ANSWER, BASIC, CONFLICT, DELIVERED, INCORRECT_REQUEST, NOT_FOUND, OK, QUEUED, RESUMED, \
+    SESSION_EXPIRED, TOO_MANY_REQUESTS
+from common.package import Request
+from common.request_body import Msg, MsgRoom, User
+from common.utils import FrameBuffer, pack_frame
+from common.variables import LOST, SEQ, TARGET, TOKEN, USERNAME, RequestAction
+from src.connection import DETACHED, SocketClient
+from src.server import Server
+
+CODEC = get_codec('binary')
+
+
+class SinkClient:
+    """ Клиент без сокета: принятые сервером кадры копятся в буфере, incoming - байты для recv сервера """
+    __slots__ = ('addr', 'buffer', 'shed', 'incoming')
+
+    def __init__(self, addr):
+        self.addr = addr
+        self.buffer = FrameBuffer()
+        self.shed = 0
+        self.incoming = b''
+
+    def recv(self, size):
+        if not self.incoming:
+            raise BlockingIOError
+        data, self.incoming = self.incoming[:size], self.incoming[size:]
+        return data
+
+    def send(self, data):
+        self.buffer.feed(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pending(self):
+        return 0
+
+    def close(self):
+        pass
+
+    def messages(self):
+        frames = list(self.buffer.frames)
+        self.buffer.frames.clear()
+        return [decode_message(frame) for frame in frames]
+
+
+class ServerCase(unittest.TestCase):
+    """ Сервер без сети: кадры подаются в __read_requests, ответы копятся у SinkClient """
+    resume_grace = 0
+    rate_limits = None
+    idle_timeout = 0
+
+    def setUp(self):
+        self.server = Server('127.0.0.1', 7777, rate_limits=self.rate_limits, idle_timeout=self.idle_timeout,
+                             resume_grace=self.resume_grace)
+        self.alice = self.connect('alice')
+        self.bob = self.connect('bob')
+        self.alice.client.messages()
+
+    def connect(self, name):
+        session = self.server._Server__open_session(SinkClient(name))
+        self.send(session, Request(RequestAction.PRESENCE, User(name)))
+        session.client.messages()
+        return session
+
+    def send(self, session, request, body=None):
+        request.id = 1
+        message = request.get_dict()
+        if body is not None:
+            message['body'] = body
+        server = self.server
+        server._Server__send_responses(server._Server__read_requests(session, [encode_message(message, CODEC)]))
+
+    def message(self, session, text):
+        msg = MsgRoom(text, User(session.username)) if text.startswith('#') else Msg(text, User(session.username))
+        msg.parse_msg()
+        self.send(session, Request(RequestAction.MESSAGE, msg))
+
+
+class TestRouting(ServerCase):
+    def test_user(self):
+        self.message(self.alice, '@bob hi')
+        self.assertEqual([m['message'] for m in self.bob.client.messages()], ['alice to @bob:  hi'])
+        self.assertEqual(self.alice.client.messages()[0]['code'], DELIVERED.code)
+        self.message(self.alice, '@carol hi')
+        self.assertEqual(self.alice.client.messages()[0]['code'], QUEUED.code)
+
+    def test_all(self):
+        self.message(self.alice, 'hi all')
+        self.assertEqual([m['message'] for m in self.bob.client.messages()], ['alice to @ALL: hi all'])
+
+    def test_room(self):
+        self.message(self.alice, '#room create')
+        self.message(self.bob, '#room hi')
+        self.assertEqual(self.bob.client.messages()[-1]['code'], ACCESS.code)
+        self.send(self.bob, Request(RequestAction.JOIN, '#room'))
+        self.alice.client.messages()
+        self.message(self.bob, '#room hi')
+        self.assertEqual([m['message'] for m in self.alice.client.messages()], ['bob to #room:  hi'])
+
+    def test_body_without_target(self):
+        body = {'sender': 'alice', 'to': 'bob', 'text': 'old client'}
+        self.send(self.alice, Request(RequestAction.MESSAGE), body)
+        self.assertEqual([m['message'] for m in self.bob.client.messages()], ['alice to @bob: old client'])
+
+    def test_unknown_target(self):
+        body = {'sender': 'alice', 'to': 'bob', 'text': 'hi', TARGET: 'planet'}
+        self.send(self.alice, Request(RequestAction.MESSAGE), body)
+        self.assertEqual(self.alice.client.messages()[0]['code'], INCORRECT_REQUEST.code)
+        self.assertEqual(self.bob.client.messages(), [])
+
+    def test_malformed_frame_contained(self):
+        """ Испорченные кадры одного клиента не теряют запросы других клиентов, прочитанные в том же такте """
+        json = get_codec('json')
+        nested = bytes([CODEC.tag]) + REQUEST_HEAD.pack(0, 2, 0) + bytes([V_LIST, 1]) * 5000 + bytes([V_NONE])
+        bad = [encode_message({'body': '', 'time': 0, 'type': 'request'}, json),
+               encode_message({'code': 200, 'message': None, 'time': 0, 'type': 'response'}, json),
+               encode_message({'action': RequestAction.PRESENCE, 'body': {}, 'time': 0, 'type': 'request'}, json),
+               nested]
+        msg = Msg('@bob hi', User('alice'))
+        msg.parse_msg()
+        self.bob.client.incoming = b''.join(map(pack_frame, bad))
+        self.alice.client.incoming = pack_frame(encode_message(Request(RequestAction.MESSAGE, msg).get_dict(), CODEC))
+        requests = self.server._Server__get_requests([self.bob, self.alice])
+        self.assertEqual([(session.username, request.action) for session, request in requests],
+                         [('alice', RequestAction.MESSAGE)])
+        self.assertEqual([m['code'] for m in self.bob.client.messages()], [INCORRECT_REQUEST.code] * len(bad))
+        self.server._Server__send_responses(requests)
+        self.assertEqual([m['message'] for m in self.bob.client.messages()], ['alice to @bob:  hi'])
+        self.assertIs(self.server.sessions.find('bob'), self.bob)
+
+    def test_presence_requires_username(self):
+        json = get_codec('json')
+        for body in (None, '', 42, {'name': 'x'}):
+            session = self.server._Server__open_session(SinkClient('anon'))
+            frame = encode_message({'action': RequestAction.PRESENCE, 'body': body, 'time': 0, 'type': 'request', 'id': 2}, json)
+            self.server._Server__send_responses(self.server._Server__read_requests(session, [frame]))
+            self.assertEqual([(m['code'], m['id']) for m in session.client.messages()], [(INCORRECT_REQUEST.code, 2)])
+            self.assertIsNone(session.username)
+        self.assertNotIn(None, self.server.sessions.by_name)
+        self.assertEqual(self.alice.client.messages(), [])
+
+    def test_unknown_actions_share_label(self):
+        json = get_codec('json')
+        for action in ('x1', 'x2'):
+            frame = encode_message({'action': action, 'body': '', 'time': 0, 'type': 'request'}, json)
+            self.server._Server__send_responses(self.server._Server__read_requests(self.alice, [frame]))
+        counted = self.server.metrics.requests.values
+        self.assertEqual(counted['unknown'], 2)
+        self.assertNotIn('x1', counted)
+
+    def test_bad_request_does_not_abort_batch(self):
+        json = get_codec('json')
+        msg = Msg('@alice still here', User('bob'))
+        msg.parse_msg()
+        direct = encode_message(Request(RequestAction.MESSAGE, msg).get_dict(), CODEC)
+        for action, body in ((RequestAction.COMMAND, ''), (RequestAction.MESSAGE, 'text'), (RequestAction.JOIN, [])):
+            frame = encode_message({'action': action, 'body': body, 'time': 0, 'type': 'request', 'id': 5}, json)
+            server = self.server
+            requests = server._Server__read_requests(self.alice, [frame]) + server._Server__read_requests(self.bob, [direct])
+            server._Server__send_responses(requests)
+            self.assertEqual([(m['code'], m.get('id')) for m in self.alice.client.messages()],
+                             [(INCORRECT_REQUEST.code, 5), (BASIC.code, None)])
+            self.assertEqual(self.bob.client.messages()[0]['code'], DELIVERED.code)
+
+
+class TestCommands(ServerCase):
+    def tearDown(self):
+        self.server.pool.close()
+
+    def command(self, session, text):
+        """ Ответы команды: она выполняется в пуле, ответы отправляет поток цикла """
+        self.send(session, Request(RequestAction.COMMAND, text))
+        while self.server.pool.inflight:
+            time.sleep(0.001)
+            self.server._Server__on_commands()
+        return session.client.messages()
+
+    def test_users(self):
+        self.assertEqual(self.command(self.alice, 'users')[-1]['message'], ['alice', 'bob'])
+
+    def test_rooms_and_who(self):
+        self.message(self.alice, '#room create')
+        self.alice.client.messages()
+        self.assertEqual(self.command(self.alice, 'rooms')[-1]['message'], ['#room 1'])
+        self.assertEqual(self.command(self.alice, 'who #room')[-1]['message'], ['alice'])
+        self.assertEqual(self.command(self.alice, 'who #nope')[-1]['code'], NOT_FOUND.code)
+
+    def test_unknown_command(self):
+        self.assertEqual(self.command(self.alice, 'nope')[-1]['code'], INCORRECT_REQUEST.code)
+
+    def test_malformed_command(self):
+        json = get_codec('json')
+        for body in ('', '   ', 42, ['users']):
+            frame = encode_message({'action': RequestAction.COMMAND, 'body': body, 'time': 0, 'type': 'request', 'id': 3}, json)
+            self.server._Server__send_responses(self.server._Server__read_requests(self.alice, [frame]))
+            reply = self.alice.client.messages()[-1]
+            self.assertEqual((reply['code'], reply['message'], reply['id']), (INCORRECT_REQUEST.code, 'Command not found', 3))
+
+    def test_answer_after_disconnect_dropped(self):
+        self.send(self.alice, Request(RequestAction.COMMAND, 'users'))
+        self.server._Server__client_disconnect(self.alice, resumable=False)
+        while self.server.pool.inflight:
+            time.sleep(0.001)
+            self.server._Server__on_commands()
+        self.assertEqual([m for m in self.alice.client.messages() if m.get('code') == ANSWER.code], [])
+
+    def test_kick(self):
+        self.assertEqual(self.command(self.alice, 'kick bob')[-1]['code'], ACCESS.code)
+        self.assertEqual(self.server._Server__kick(None, 'bob', 'spam'), 'bob kicked')
+        notice, quit_ = self.bob.client.messages()
+        self.assertEqual((notice['code'], notice['message']), (BASIC.code, 'Kicked by the server: spam'))
+        self.assertEqual(quit_['action'], RequestAction.QUIT)
+        self.assertIsNone(self.server.sessions.find('bob'))
+
+
+class TestPresenceLimit(ServerCase):
+    rate_limits = {'session': (0.001, 3), 'fanout': (1000, 1000)}
+
+    def test_repeated_presence_limited(self):
+        for _ in range(10):
+            self.send(self.alice, Request(RequestAction.PRESENCE, User('alice')))
+        codes = [m['code'] for m in self.alice.client.messages() if m.get('id') == 1]
+        self.assertEqual(codes, [OK.code] * 3 + [TOO_MANY_REQUESTS.code] * 7)
+        notices = [m for m in self.bob.client.messages() if m.get('message') == 'alice connected']
+        self.assertEqual(len(notices), 3)
+
+    def test_login_not_limited(self):
+        for i in range(5):
+            self.assertEqual(self.connect(f'user{i}').username, f'user{i}')
+
+
+class TestIdle(ServerCase):
+    """ Время колеса таймеров передаётся в __reap явно: таймеры сессий стоят от last_seen входа """
+    idle_timeout = 3
+
+    def test_probe_then_disconnect(self):
+        start = max(self.alice.last_seen, self.bob.last_seen)
+        self.bob.client.messages()
+        self.server._Server__reap(start + 0.5)
+        self.assertEqual(self.alice.client.messages(), [])
+        self.server._Server__reap(start + 1.1)  # треть idle_timeout: PROBE
+        self.assertEqual([m['action'] for m in self.alice.client.messages()], [RequestAction.PROBE])
+        self.assertEqual([m['action'] for m in self.bob.client.messages()], [RequestAction.PROBE])
+        self.send(self.bob, Request(RequestAction.PROBE))
+        self.bob.last_seen = start + 2  # ответ bob пришёл на второй секунде
+        self.server._Server__reap(start + 3.1)  # alice молчит весь idle_timeout
+        self.assertNotIn(self.alice.client, self.server.sessions)
+        self.assertIn(self.bob.client, self.server.sessions)
+        self.assertIn('alice disconnected', [m.get('message') for m in self.bob.client.messages()])
+        self.assertEqual(self.server.stats['idle_reaped'], 1)
+
+
+class TestResume(ServerCase):
+    """ Счёт кадров клиента (номер из ответа на PRESENCE + полученные после него) должен совпадать с серверным """
+    resume_grace = 30
+
+    def login(self, client):
+        """ Сессия и номер последнего полученного клиентом кадра """
+        session = self.server._Server__open_session(client)
+        self.send(session, Request(RequestAction.PRESENCE, User(client.addr)))
+        ok, *rest = self.receive(client)
+        self.assertEqual(ok['code'], OK.code)
+        return session, ok['message'][SEQ] + len(rest)
+
+    def receive(self, client):
+        return client.messages()
+
+    def resume(self, session, seq):
+        client = SinkClient(session.username)
+        resumed = self.server._Server__open_session(client)
+        self.send(resumed, Request(RequestAction.RESUME), {USERNAME: session.username, TOKEN: session.token, SEQ: seq})
+        return client.messages()
+
+    def test_detach_and_resume(self):
+        carol, seq = self.login(SinkClient('carol'))
+        self.message(self.bob, 'one')
+        seq += len(carol.client.messages())
+        self.message(self.bob, 'two')
+        carol.client.messages()  # кадр не дошёл до клиента: соединение оборвалось
+        self.server._Server__client_disconnect(carol)
+        self.assertIs(carol.client, DETACHED)
+        self.assertIs(self.server.sessions.find('carol'), carol)
+        self.message(self.bob, 'three')
+        self.message(self.bob, '@carol direct')
+        self.assertEqual(self.bob.client.messages()[-1]['code'], QUEUED.code)
+        resumed, *frames = self.resume(carol, seq)
+        self.assertEqual((resumed['code'], resumed['message'][LOST]), (RESUMED.code, 0))
+        self.assertEqual([m['message'] for m in frames],
+                         ['bob to @ALL: two', 'bob to @ALL: three', 'bob to @carol:  direct'])
+        self.assertIs(self.server.sessions.find('carol'), carol)
+        self.assertNotIn('carol disconnected', [m.get('message') for m in self.alice.client.messages()])
+
+    def test_resume_expired(self):
+        carol, seq = self.login(SinkClient('carol'))
+        self.server._Server__client_disconnect(carol)
+        self.server._Server__reap(time.monotonic() + self.resume_grace + 2)
+        self.assertIsNone(self.server.sessions.find('carol'))
+        self.assertIn('carol disconnected', [m.get('message') for m in self.alice.client.messages()])
+        self.assertEqual([m['code'] for m in self.resume(carol, seq)], [SESSION_EXPIRED.code])
+
+    def test_early_replies_counted(self):
+        """ Отказ в смене имени и в незнакомом кодеке - кадры сессии: после RESUME они не повторяются """
+        carol, seq = self.login(SinkClient('carol'))
+        self.send(carol, Request(RequestAction.PRESENCE, User('bob')))
+        self.server._Server__send_responses(self.server._Server__read_requests(carol, [b'\xff{}']))
+        replies = carol.client.messages()
+        self.assertEqual([m['code'] for m in replies], [CONFLICT.code, INCORRECT_REQUEST.code])
+        self.message(self.bob, 'lost in flight')
+        carol.client.messages()
+        self.server._Server__client_disconnect(carol)
+        resumed, *frames = self.resume(carol, seq + len(replies))
+        self.assertEqual(resumed['code'], RESUMED.code)
+        self.assertEqual([m['message'] for m in frames], ['bob to @ALL: lost in flight'])
+
+    @patch('src.connection.OUTBOX_LOW_WATER', 200)
+    @patch('src.connection.OUTBOX_HIGH_WATER', 600)
+    def test_shed_frames_reported_lost(self):
+        selector = selectors.DefaultSelector()
+        sock, peer = socket.socketpair()
+        self.addCleanup(selector.close)
+        self.addCleanup(peer.close)
+        frames = FrameBuffer()
+
+        def receive(client):
+            client.flush()
+            frames.feed(peer.recv(65536))
+            received = [decode_message(frame) for frame in frames.frames]
+            frames.frames.clear()
+            return received
+
+        self.receive = receive
+        client = SocketClient(sock, 'carol', selector, policy='shed', dirty=set())
+        carol, seq = self.login(client)
+        client.writing = True  # медленный клиент: сокет не принимает данные, очередь ждёт EVENT_WRITE
+        for i in range(40):
+            self.message(self.bob, f'm{i}')
+        received = [m['message'] for m in receive(client)]
+        self.assertGreater(client.shed, 0)
+        seq += len(received)
+        client.writing = True
+        for i in range(40, 45):
+            self.message(self.bob, f'm{i}')  # хвост остался в очереди: соединение закрыто до отправки
+        self.server._Server__client_disconnect(carol)
+        resumed, *replayed = self.resume(carol, seq)
+        self.assertEqual(resumed['message'][LOST], client.shed)
+        self.assertEqual([m['message'] for m in replayed], [f'bob to @ALL: m{i}' for i in range(40, 45)])
+        self.assertEqual(len(received) + client.shed, 40)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from src.shard import ALL, DRAIN, MAILBOX, ROOM, USER, ShardBus, ShardHub
+
+PACKAGE = {'code': 100, 'message': 'alice to @ALL: hi', 'type': 'response'}
+
+
+class TestShardBus(unittest.TestCase):
+    """ Шина в потоке теста, шарды - ShardBus на временном Unix-сокете """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='py_chat_test_')
+        self.path = os.path.join(self.dir, 'bus.sock')
+        self.hub = ShardHub(self.path)
+        self.hub.start()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+        self.buses = []
+        self.a = self.bus(0)
+        self.b = self.bus(1)
+
+    def tearDown(self):
+        self.stopped.set()
+        self.thread.join()
+        for bus in self.buses:
+            bus.sock.close()
+        for link in list(self.hub.buffers):
+            link.close()
+        self.hub.selector.close()
+        self.hub.sock.close()
+        shutil.rmtree(self.dir)
+
+    def serve(self):
+        while not self.stopped.is_set():
+            self.hub.poll(0.01)
+
+    def bus(self, shard):
+        """ Шард подключён, когда пришёл справочник - ответ на HELLO """
+        bus = ShardBus(self.path, shard)
+        bus.open()
+        bus.sock.settimeout(2)
+        self.buses.append(bus)
+        self.assertEqual(bus.read(readable=True), [])
+        return bus
+
+    @staticmethod
+    def read_until(bus, done):
+        """ Операции доставки, пока не выполнится условие (справочник bus.read обновляет сам) """
+        deliveries = []
+        while not done(deliveries):
+            deliveries += bus.read(readable=not bus.pending())
+        return deliveries
+
+    def test_claim_conflict_and_release(self):
+        self.assertTrue(self.a.claim('alice'))
+        self.assertFalse(self.b.claim('alice'))
+        self.assertEqual(self.b.read(), [])  # BIND, принятый во время claim
+        self.assertTrue(self.b.remote('alice'))
+        self.assertFalse(self.a.remote('alice'))
+        self.a.release('alice')
+        self.read_until(self.b, lambda _: 'alice' not in self.b.directory)
+        self.assertTrue(self.b.claim('alice'))
+
+    def test_directory_for_new_shard(self):
+        self.a.claim('alice')
+        self.b.claim('bob')
+        self.assertEqual(self.bus(2).directory, {'alice': 0, 'bob': 1})
+
+    def test_delivery_to_other_shards(self):
+        self.a.claim('alice')
+        self.b.claim('bob')
+        self.a.publish(USER, to='bob', sender='alice', package=PACKAGE)
+        self.a.publish(ALL, package=PACKAGE)
+        self.a.publish(ROOM, room='#room', package=PACKAGE)
+        deliveries = self.read_until(self.b, lambda d: len(d) == 3)
+        self.assertEqual([(m['op'], m['shard'], m['package']) for m in deliveries],
+                         [(USER, 0, PACKAGE), (ALL, 0, PACKAGE), (ROOM, 0, PACKAGE)])
+        self.assertEqual((deliveries[0]['to'], deliveries[2]['room']), ('bob', '#room'))
+        self.a.claim('sync')  # ответ на claim идёт после всего, что шина приняла от шарда раньше
+        self.assertEqual(self.a.read(), [])
+
+    def test_mailbox_drained_on_claim(self):
+        self.a.publish(MAILBOX, to='carol', sender='alice', package=PACKAGE)
+        self.a.claim('alice')
+        self.assertIn('carol', self.hub.mailboxes)
+        self.assertTrue(self.b.claim('carol'))
+        drain, = self.read_until(self.b, len)
+        self.assertEqual((drain['op'], drain['to']), (DRAIN, 'carol'))
+        self.assertEqual(drain['messages'], [{'sender': 'alice', 'shard': 0, 'package': PACKAGE}])
+        # имя уже занято: сообщение в почтовый ящик уходит шарду адресата как личное
+        self.a.publish(MAILBOX, to='carol', sender='alice', package=PACKAGE)
+        delivery, = self.read_until(self.b, len)
+        self.assertEqual((delivery['op'], delivery['to']), (USER, 'carol'))
+
+    def test_lost_shard_releases_names(self):
+        self.a.claim('alice')
+        self.read_until(self.b, lambda _: 'alice' in self.b.directory)
+        self.a.sock.close()
+        self.read_until(self.b, lambda _: 'alice' not in self.b.directory)
+        self.assertTrue(self.b.claim('alice'))
+
+
+if __name__ == "__main__":
+    unittest.main()
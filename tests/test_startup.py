@@ -0,0 +1,98 @@
+"""
+Регрессия времени запуска: процесс клиента от старта интерпретатора до ответа на PRESENCE
+и набор модулей, которые загружает импорт точек входа.
+
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from common.variables import LOGGER_NAME
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Процессы работают во временном каталоге: журналы (logs/ от текущего каталога) не пишутся в репозиторий
+RUN_DIR = tempfile.TemporaryDirectory(prefix='py_chat_test_')
+ENV = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (ROOT, os.environ.get('PYTHONPATH')))))
+# С запасом для медленных машин CI: обычно запуск укладывается в 0.1-0.2 с
+STARTUP_BUDGET = 2.0
+
+# Не нужны select-серверу при импорте: отладочные помощники, asyncio, HTTP метрик, временные каталоги шардов
+SERVER_LAZY = ('icecream', 'pdb', 'asyncio', 'ssl', 'http.server', 'tempfile')
+CLIENT_LAZY = ('icecream', 'pdb', 'http.server', 'tempfile', 'ipaddress')
+
+CLIENT = '''
+import asyncio, sys
+import src.client
+from src.async_client import AsyncClient
+
+async def main():
+    client = AsyncClient('127.0.0.1', int(sys.argv[1]), 'startup')
+    print((await client.connect()).code)
+    await client.close()
+
+asyncio.run(main())
+'''
+
+
+def python(*args, **kwargs):
+    return subprocess.run([sys.executable, *args], cwd=RUN_DIR.name, env=ENV, capture_output=True, text=True, timeout=30,
+                          **kwargs)
+
+
+def loaded(module, names):
+    code = f'import sys, logging, {module}; print([n for n in {names!r} if n in sys.modules]);' \
+           f'print(logging.getLogger({LOGGER_NAME!r}).handlers)'
+    return python('-c', code).stdout.splitlines()
+
+
+class TestImports(unittest.TestCase):
+    def test_server_import_is_lean(self):
+        modules, handlers = loaded('src.server', SERVER_LAZY)
+        self.assertEqual(modules, '[]')
+        self.assertEqual(handlers, '[]')  # лог настраивает run(), а не импорт
+
+    def test_client_import_is_lean(self):
+        modules, _ = loaded('src.client', CLIENT_LAZY)
+        self.assertEqual(modules, '[]')
+
+
+class TestColdStart(unittest.TestCase):
+    def setUp(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+        start = time.perf_counter()
+        self.server = subprocess.Popen([sys.executable, '-m', 'src.server', '-p', str(self.port), '--no-rate-limit'],
+                                       cwd=RUN_DIR.name, env=ENV, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+        deadline = start + 10
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                break
+            except OSError:
+                if time.perf_counter() > deadline:
+                    raise
+                time.sleep(0.01)
+        self.server_start = time.perf_counter() - start
+
+    def tearDown(self):
+        self.server.kill()
+        self.server.wait()
+
+    def test_server_accepts_within_budget(self):
+        self.assertLess(self.server_start, STARTUP_BUDGET)
+
+    def test_client_presence_within_budget(self):
+        start = time.perf_counter()
+        result = python('-c', CLIENT, str(self.port))
+        elapsed = time.perf_counter() - start
+        self.assertEqual(result.stdout.strip(), '200', result.stderr)
+        self.assertLess(elapsed, STARTUP_BUDGET)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from src.timers import TimerWheel
+
+
+class TestTimerWheel(unittest.TestCase):
+    def test_fires_after_deadline(self):
+        wheel = TimerWheel(0, tick=1, slots=8)
+        wheel.schedule('a', 2.5)
+        wheel.schedule('b', 5)
+        self.assertEqual(wheel.advance(2), [])
+        self.assertEqual(wheel.advance(2.5), ['a'])
+        self.assertEqual(wheel.advance(4.9), [])
+        self.assertEqual(wheel.advance(5), ['b'])
+        self.assertEqual(len(wheel), 0)
+
+    def test_same_tick_rescanned(self):
+        wheel = TimerWheel(0, tick=1, slots=8)
+        wheel.schedule('a', 3.7)
+        self.assertEqual(wheel.advance(3.2), [])
+        self.assertEqual(wheel.advance(3.8), ['a'])
+
+    def test_cancel_and_reschedule(self):
+        wheel = TimerWheel(0, tick=1, slots=8)
+        wheel.schedule('a', 2)
+        wheel.schedule('b', 2)
+        wheel.cancel('b')
+        wheel.cancel('missing')
+        wheel.schedule('a', 6)  # перенос заменяет прежний срок
+        self.assertEqual(wheel.advance(3), [])
+        self.assertNotIn('b', wheel)
+        self.assertEqual(wheel.advance(6), ['a'])
+
+    def test_past_deadline_fires_next_advance(self):
+        wheel = TimerWheel(10, tick=1, slots=8)
+        wheel.schedule('a', 3)
+        self.assertEqual(wheel.advance(10), ['a'])
+
+    def test_beyond_one_revolution(self):
+        wheel = TimerWheel(0, tick=1, slots=4)
+        wheel.schedule('a', 9)  # тот же слот, что и тик 1 и 5
+        self.assertEqual(wheel.advance(1), [])
+        self.assertEqual(wheel.advance(5), [])
+        self.assertEqual(wheel.advance(9), ['a'])
+
+    def test_long_pause(self):
+        wheel = TimerWheel(0, tick=1, slots=4)
+        for i in range(20):
+            wheel.schedule(i, i + 0.5)
+        self.assertEqual(sorted(wheel.advance(100)), list(range(20)))
+        self.assertEqual(len(wheel), 0)
+
+    def test_advance_touches_only_due_slots(self):
+        wheel = TimerWheel(0, tick=1, slots=512)
+        for i in range(10000):
+            wheel.schedule(i, 100 + i % 50)
+        wheel.schedule('soon', 1)
+        self.assertEqual(wheel.advance(1), ['soon'])
+        self.assertEqual(len(wheel), 10000)
+        self.assertEqual(len(wheel.advance(100)), 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
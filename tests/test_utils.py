@@ -0,0 +1,65 @@
+import socket
+import unittest
+
+from common.codes import OK
+from common.package import Request, Response
+from common.utils import FrameBuffer, get_all_data, get_data, pack_frame, send_data
+from common.variables import MAX_FRAME_SIZE, RequestAction
+
+
+class TestFrameBuffer(unittest.TestCase):
+    def test_split_frame(self):
+        frame = pack_frame(b'hello world')
+        buffer = FrameBuffer()
+        self.assertEqual(buffer.feed(frame[:3]), 0)
+        self.assertEqual(buffer.feed(frame[3:7]), 0)
+        self.assertEqual(buffer.feed(frame[7:]), 1)
+        self.assertEqual(buffer.pop(), b'hello world')
+        self.assertEqual(len(buffer.data), 0)
+
+    def test_coalesced_frames(self):
+        buffer = FrameBuffer()
+        data = pack_frame(b'a') + pack_frame(b'') + pack_frame(b'ccc') + pack_frame(b'dd')[:3]
+        self.assertEqual(buffer.feed(data), 3)
+        self.assertEqual([buffer.pop() for _ in range(3)], [b'a', b'', b'ccc'])
+        self.assertEqual(len(buffer.data), 3)
+
+    def test_frame_too_large(self):
+        buffer = FrameBuffer()
+        with self.assertRaises(ValueError):
+            buffer.feed((MAX_FRAME_SIZE + 1).to_bytes(4, 'big'))
+
+
+class TestSocketFraming(unittest.TestCase):
+    def setUp(self) -> None:
+        self.left, self.right = socket.socketpair()
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.left.close()
+        self.right.close()
+        return super().tearDown()
+
+    def test_pipelined_packages(self):
+        requests = [Request(RequestAction.COMMAND, f'cmd {i}') for i in range(50)]
+        for request in requests:
+            send_data(self.left, request)
+        buffer = FrameBuffer()
+        received = []
+        while len(received) < len(requests):
+            received.extend(get_all_data(self.right, buffer))
+        self.assertEqual(received, requests)
+
+    def test_large_package(self):
+        response = Response(OK, 'x' * 100000)
+        send_data(self.left, response)
+        self.assertEqual(get_data(self.right, FrameBuffer()), response)
+
+    def test_closed_connection(self):
+        self.left.close()
+        with self.assertRaises(ConnectionError):
+            get_data(self.right, FrameBuffer())
+
+
+if __name__ == "__main__":
+    unittest.main()
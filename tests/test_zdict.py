@@ -0,0 +1,28 @@
+import random
+import unittest
+
+from common.zdict import train
+
+
+class TestTrain(unittest.TestCase):
+    def setUp(self) -> None:
+        rnd = random.Random(0)
+        self.samples = [
+            f'{rnd.randrange(10 ** 6)} to @{rnd.randrange(10 ** 6)}: {rnd.random()} Message delivered'.encode()
+            for _ in range(500)
+        ]
+        return super().setUp()
+
+    def test_common_fragments_kept(self):
+        dictionary = train(self.samples, size=256)
+        self.assertIn(b'Message delivered', dictionary)
+        self.assertIn(b' to @', dictionary)
+        self.assertLessEqual(len(dictionary), 256)
+
+    def test_rare_fragments_dropped(self):
+        dictionary = train(self.samples + [b'unique fragment seen once'], size=256)
+        self.assertNotIn(b'unique', dictionary)
+
+
+if __name__ == "__main__":
+    unittest.main()